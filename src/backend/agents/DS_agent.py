@@ -1,23 +1,237 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from openai import OpenAI
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from db.bulk import BulkWriter
+from db.mongo import db
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 DEEP_SEEK_API_KEY = os.getenv("DEEP_SEEK_API_KEY")
-client = OpenAI(api_key=DEEP_SEEK_API_KEY, base_url="https://api.deepseek.com")
+DEEP_SEEK_BASE_URL = os.getenv("DEEP_SEEK_BASE_URL", "https://api.deepseek.com")
+DEEP_SEEK_MODEL = os.getenv("DEEP_SEEK_MODEL", "deepseek-chat")
+
+# Severity scoring
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+SEVERITY_BATCH_SIZE = int(os.getenv("SEVERITY_BATCH_SIZE", "20"))
+SEVERITY_CACHE_TTL_DAYS = int(os.getenv("SEVERITY_CACHE_TTL_DAYS", "30"))
+SEVERITY_CACHE_MAX_ENTRIES = int(os.getenv("SEVERITY_CACHE_MAX_ENTRIES", "50000"))
+SEVERITY_MEMORY_CACHE_SIZE = int(os.getenv("SEVERITY_MEMORY_CACHE_SIZE", "5000"))
+
+# Without a key the service falls back to keyword scoring instead of failing at import
+client = OpenAI(api_key=DEEP_SEEK_API_KEY, base_url=DEEP_SEEK_BASE_URL) if DEEP_SEEK_API_KEY else None
+async_client = AsyncOpenAI(api_key=DEEP_SEEK_API_KEY, base_url=DEEP_SEEK_BASE_URL) if DEEP_SEEK_API_KEY else None
+_llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
 
 
 def query_deepseek(prompt: str, system_config: str = "You are a helpful assistant") -> str:
+    if client is None:
+        raise RuntimeError("DEEP_SEEK_API_KEY is not set")
     response = client.chat.completions.create(
-        model="deepseek-chat",
+        model=DEEP_SEEK_MODEL,
         messages=[
             {"role": "system", "content": system_config},
             {"role": "user", "content": prompt},
         ],
         stream=False
     )
-    print("Response from DeepSeek:")
-    print(response.usage)
-    print(response.choices[0].message.content)
-    return response.choices[0].message.content
\ No newline at end of file
+    logger.debug("DeepSeek usage: %s", response.usage)
+    return response.choices[0].message.content
+
+
+# ---------------------------
+# Severity scoring (1-5)
+# ---------------------------
+_SEVERITY_SYSTEM = "You are a threat intelligence analyst. You rate threat severity on a scale of 1 to 5."
+_SEVERITY_PROMPT = (
+    "On a scale of 1 to 5, how severe is each threat described below? "
+    "Reply with only a JSON array of integers, one per threat, in the same order.\n\n"
+)
+_MAX_SUMMARY_CHARS = 600
+
+# Deterministic fallback when the API is unavailable: highest matching level wins
+_SEVERITY_KEYWORDS = [
+    (5, ["ransomware", "wiper", "remote code execution", "rce", "zero-day", "0day", "apt", "supply chain"]),
+    (4, ["exploit", "backdoor", "c2", "command and control", "botnet", "trojan", "rat", "credential", "exfiltration", "stealer"]),
+    (3, ["malware", "phishing", "brute", "bruteforce", "cve", "miner", "cryptojacking", "webshell", "dropper"]),
+    (2, ["scan", "scanning", "scanner", "suspicious", "spam", "adware", "tor", "proxy"]),
+]
+_SEVERITY_KEYWORD_PATS = [
+    (level, re.compile(r"\b(?:" + "|".join(re.escape(w) for w in words) + r")\b", re.I))
+    for level, words in _SEVERITY_KEYWORDS
+]
+
+
+def normalize_summary(summary: str) -> str:
+    return " ".join((summary or "").lower().split())
+
+
+def summary_key(summary: str) -> str:
+    """Cache key: sha256 of the normalized summary."""
+    return hashlib.sha256(normalize_summary(summary).encode("utf-8")).hexdigest()
+
+
+def keyword_severity(summary: str) -> int:
+    for level, pat in _SEVERITY_KEYWORD_PATS:
+        if pat.search(summary or ""):
+            return level
+    return 1
+
+
+def _parse_severities(text: str, expected: int) -> list[int] | None:
+    """Parse the model reply into `expected` ints in 1..5, or None if it doesn't fit."""
+    text = (text or "").strip()
+    try:
+        values = json.loads(text[text.index("["): text.rindex("]") + 1])
+    except ValueError:
+        values = re.findall(r"\b[1-5]\b", text)
+    try:
+        values = [max(1, min(5, int(v))) for v in values]
+    except (TypeError, ValueError):
+        return None
+    return values if len(values) == expected else None
+
+
+async def _llm_score_batch(summaries: list[str], llm=None) -> list[int] | None:
+    """Score several summaries in one prompt. Returns None if the API is unavailable."""
+    llm = llm or async_client
+    if llm is None:
+        return None
+    numbered = "\n".join(f"{i}. {s[:_MAX_SUMMARY_CHARS]}" for i, s in enumerate(summaries, start=1))
+    try:
+        async with _llm_semaphore:
+            response = await llm.chat.completions.create(
+                model=DEEP_SEEK_MODEL,
+                messages=[
+                    {"role": "system", "content": _SEVERITY_SYSTEM},
+                    {"role": "user", "content": _SEVERITY_PROMPT + numbered},
+                ],
+                stream=False,
+            )
+    except Exception as e:
+        logger.warning("Severity scoring call failed, using keyword fallback: %s", e)
+        return None
+    return _parse_severities(response.choices[0].message.content, len(summaries))
+
+
+class _MemoryLRU:
+    """Small in-process LRU with TTL in front of the severity_cache collection."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[str, tuple[int, float]] = OrderedDict()
+
+    def get(self, key: str) -> int | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, stored_at = item
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: int) -> None:
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+
+_memory_cache = _MemoryLRU(SEVERITY_MEMORY_CACHE_SIZE, SEVERITY_CACHE_TTL_DAYS * 86400)
+
+
+async def _cache_lookup(keys: list[str]) -> dict[str, int]:
+    """Read fresh entries from severity_cache and bump their last_used_at (LRU)."""
+    now = datetime.utcnow()
+    docs = await db["severity_cache"].find(
+        {"_id": {"$in": keys}, "created_at": {"$gte": now - timedelta(days=SEVERITY_CACHE_TTL_DAYS)}},
+        {"severity": 1},
+    ).to_list(length=None)
+    if docs:
+        await db["severity_cache"].update_many(
+            {"_id": {"$in": [d["_id"] for d in docs]}},
+            {"$set": {"last_used_at": now}},
+        )
+    return {d["_id"]: d["severity"] for d in docs}
+
+
+async def _cache_store(scored: dict[str, int]) -> None:
+    now = datetime.utcnow()
+    async with BulkWriter(db["severity_cache"]) as writer:
+        for key, severity in scored.items():
+            await writer.add(UpdateOne(
+                {"_id": key},
+                {"$set": {"severity": severity, "created_at": now, "last_used_at": now}},
+                upsert=True,
+            ))
+
+    # LRU eviction once the collection grows past its cap (TTL index handles age)
+    overflow = await db["severity_cache"].estimated_document_count() - SEVERITY_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        stale = await db["severity_cache"].find({}, {"_id": 1}).sort("last_used_at", 1).limit(overflow).to_list(length=overflow)
+        await db["severity_cache"].delete_many({"_id": {"$in": [d["_id"] for d in stale]}})
+
+
+async def score_severities(summaries: list[str]) -> list[int]:
+    """
+    Return a 1-5 severity for each summary, in order.
+
+    Lookups go memory LRU -> severity_cache collection -> batched LLM prompts
+    (SEVERITY_BATCH_SIZE summaries per call, LLM_CONCURRENCY calls in flight).
+    Summaries the LLM can't score get the keyword fallback, which is not cached.
+    """
+    keys = [summary_key(s) for s in summaries]
+    results: dict[str, int] = {}
+
+    for key in keys:
+        cached = _memory_cache.get(key)
+        if cached is not None:
+            results[key] = cached
+
+    missing = list(dict.fromkeys(k for k in keys if k not in results))
+    if missing:
+        for key, severity in (await _cache_lookup(missing)).items():
+            results[key] = severity
+            _memory_cache.set(key, severity)
+
+    # One summary per distinct key still unscored
+    pending = {}
+    for key, summary in zip(keys, summaries):
+        if key not in results:
+            pending.setdefault(key, summary)
+
+    if pending:
+        pending_keys = list(pending)
+        batches = [pending_keys[i:i + SEVERITY_BATCH_SIZE] for i in range(0, len(pending_keys), SEVERITY_BATCH_SIZE)]
+        replies = await asyncio.gather(*(_llm_score_batch([pending[k] for k in batch]) for batch in batches))
+
+        scored = {}
+        for batch, severities in zip(batches, replies):
+            for i, key in enumerate(batch):
+                if severities is None:
+                    results[key] = keyword_severity(pending[key])
+                else:
+                    results[key] = scored[key] = severities[i]
+                    _memory_cache.set(key, severities[i])
+        if scored:
+            await _cache_store(scored)
+
+    return [results[k] for k in keys]
+
+
+async def score_severity(summary: str) -> int:
+    return (await score_severities([summary]))[0]
@@ -1,19 +1,26 @@
 import os
-from typing import List, Dict, Any, Iterable
+import re
+from collections import deque
+from typing import List, Dict, Any, Iterable, Optional
 from itertools import groupby
 from operator import itemgetter
 from datetime import datetime, timedelta
 
+from bson import ObjectId
 from dotenv import load_dotenv
-import httpx
+from pymongo import InsertOne, UpdateOne
+from db.bulk import BulkWriter
 from db.mongo import db
 from db.models import Detection
+from services.alerts.notifier import alert_dispatcher
+from services.detect_rollups import record_detection_changes
+from services.response_cache import response_cache
 
 
 load_dotenv()
 
 TIME_MULTIPLIER = int(os.getenv("TIME_MULTIPLIER", "1"))
-TEAMS_WEBHOOK_URL = os.getenv("TEAMS_WEBHOOK_URL")
+DETECT_CURSOR_BATCH_SIZE = int(os.getenv("DETECT_CURSOR_BATCH_SIZE", "500"))
 FRONTEND_URL = os.getenv("FRONTEND_URL")
 
 # --- Source bias & TTP keyword map (tune later) ---
@@ -153,9 +160,66 @@ TTP_KEYWORDS = {
     "certificate": ["T1588.003"],
 }
 
+_TOKEN_PAT = re.compile(r"[a-z0-9]+")
+
+
+class _TTPMatcher:
+    """
+    Aho–Corasick automaton over the word tokens of TTP_KEYWORDS.
+    Matching on whole tokens gives word boundaries for free ("cmd" does not
+    hit "command") and one pass finds every keyword, including overlaps
+    such as "password" / "password spray".
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]]):
+        self.ttps = list(keywords.values())
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[tuple] = [()]
+
+        for idx, keyword in enumerate(keywords):
+            node = 0
+            for word in _TOKEN_PAT.findall(keyword.lower()):
+                nxt = self.goto[node].get(word)
+                if nxt is None:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                    nxt = self.goto[node][word] = len(self.goto) - 1
+                node = nxt
+            self.out[node] += (idx,)
+
+        # Breadth-first failure links; each node also inherits its fallback's outputs
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and word not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(word, 0)
+                self.out[child] += self.out[self.fail[child]]
+
+    def match(self, text: str) -> List[str]:
+        goto, fail, out = self.goto, self.fail, self.out
+        node, hits = 0, set()
+        for word in _TOKEN_PAT.findall(text.lower()):
+            while node and word not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word, 0)
+            if out[node]:
+                hits.update(out[node])
+
+        # De-duplicated, in TTP_KEYWORDS order
+        return list(dict.fromkeys(ttp for idx in sorted(hits) for ttp in self.ttps[idx]))
+
+
+_TTP_MATCHER = _TTPMatcher(TTP_KEYWORDS)
+
+
 def match_ttp(text: str) -> List[str]:
-    text = text.lower()
-    return [ttp for keyword, ttps in TTP_KEYWORDS.items() for ttp in ttps if keyword in text]
+    return _TTP_MATCHER.match(text)
 
 def group_by_dedup_key(intel_events: List[Dict[str, Any]]) -> Iterable[List[Dict[str, Any]]]:
     """
@@ -170,14 +234,44 @@ def group_by_dedup_key(intel_events: List[Dict[str, Any]]) -> Iterable[List[Dict
     for _, group in groupby(sorted_events, key=itemgetter("asset_id", "indicator", "source")):
         yield list(group)
 
+def stream_dedup_groups(match: Dict[str, Any]):
+    """
+    Group intel by (asset_id, indicator, source) inside MongoDB and stream the groups
+    with a bounded cursor batch, so memory is O(groups in flight) instead of O(events).
+    Each group carries the oldest event's severity/summary and the ids of all its events.
+    """
+    pipeline = [
+        {"$match": match},
+        # $first needs a defined order; oldest first, as the in-memory grouping saw them
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": {"asset_id": "$asset_id", "indicator": "$indicator", "source": "$source"},
+            "severity": {"$first": "$severity"},
+            "summary": {"$first": "$summary"},
+            "intel_ids": {"$push": "$_id"},
+        }},
+    ]
+    return db["intel_events"].aggregate(pipeline, allowDiskUse=True, batchSize=DETECT_CURSOR_BATCH_SIZE)
+
 def compute_detection(group: List[Dict[str, Any]]) -> Detection:
     """
     Compute severity, confidence, TTPs, and analyst note from a group of intel events.
     """
     if not group:
         raise ValueError("Empty group")
+    return _build_detection(group[0], [ev["_id"] for ev in group])
+
+def compute_group_detection(group: Dict[str, Any]) -> Detection:
+    """
+    Same as compute_detection, for a group document from stream_dedup_groups.
+    """
+    base = dict(group["_id"])
+    for field in ("severity", "summary"):
+        if group.get(field) is not None:
+            base[field] = group[field]
+    return _build_detection(base, group["intel_ids"])
 
-    base = group[0]
+def _build_detection(base: Dict[str, Any], intel_ids: List[Any]) -> Detection:
     source = base["source"]
     indicator = base["indicator"]
     asset_id = base["asset_id"]
@@ -188,7 +282,7 @@ def compute_detection(group: List[Dict[str, Any]]) -> Detection:
 
     # Confidence
     confidence = 60
-    if len(group) > 1:
+    if len(intel_ids) > 1:
         confidence += 20
     confidence = min(100, confidence)
 
@@ -215,89 +309,166 @@ def compute_detection(group: List[Dict[str, Any]]) -> Detection:
         analyst_note=note,
         first_seen=datetime.utcnow(),
         last_seen=datetime.utcnow(),
-        hit_count=len(group),
-        raw_ref={"intel_ids": [str(ev["_id"]) for ev in group]}
+        hit_count=len(intel_ids),
+        raw_ref={"intel_ids": [str(i) for i in intel_ids]}
     )
     
-async def create_or_update_risk_item(detection: Dict[str, Any]) -> None:
+async def upsert_detection_batch(groups: List[Dict[str, Any]], cutoff: datetime) -> Dict[str, Any]:
     """
-    Upsert a risk item if detection meets threshold:
-    - severity >= 4 OR (severity >= 3 AND confidence >= 70)
+    Batch stage for a chunk of dedup groups from stream_dedup_groups:
+    - one $or query for detections already open in the window,
+    - one $in query for the assets of new detections,
+    - one unordered bulk_write for all inserts and hit_count increments.
+
+    Returns {"new": [detection dicts], "deduped": int, "assets": {asset_id: asset}}.
     """
-    sev = detection["severity"]
-    conf = detection["confidence"]
+    if not groups:
+        return {"new": [], "deduped": 0, "assets": {}}
 
-    if not (sev >= 4 or (sev >= 3 and conf >= 70)):
-        return  # No risk
+    keys = [(g["_id"]["asset_id"], g["_id"]["indicator"], g["_id"]["source"]) for g in groups]
+    existing_by_key: Dict[tuple, Dict[str, Any]] = {}
+    async for doc in db["detections"].find(
+        {
+            "$or": [{"asset_id": a, "indicator": i, "source": s} for a, i, s in dict.fromkeys(keys)],
+            "last_seen": {"$gte": cutoff},
+        },
+        {"asset_id": 1, "indicator": 1, "source": 1, "severity": 1, "last_seen": 1},
+    ):
+        existing_by_key.setdefault((doc["asset_id"], doc["indicator"], doc["source"]), doc)
 
-    asset_id = detection["asset_id"]
-    
-    # Convert asset_id to ObjectId if it's a string
-    if isinstance(asset_id, str):
-        from bson import ObjectId
-        try:
-            asset_id = ObjectId(asset_id)
-        except Exception:
-            print(f"Invalid asset_id: {asset_id}")
-            return
-
-    # Await the async find_one operation
-    asset = await db["assets"].find_one({"_id": asset_id})
-
-    if not asset:
-        print(f"Asset not found: {asset_id}")
-        return
+    now = datetime.utcnow()
+    ops, new_detections, deduped = [], [], 0
+    changes = []  # last_seen moves, for the dashboard rollups
+    for key, group in zip(keys, groups):
+        existing = existing_by_key.get(key)
+        if existing:
+            # --- DEDUP: update hit_count & last_seen ---
+            ops.append(UpdateOne(
+                {"_id": existing["_id"]},
+                {"$inc": {"hit_count": len(group["intel_ids"])}, "$set": {"last_seen": now}},
+            ))
+            changes.append({**existing, "prev_last_seen": existing.get("last_seen"), "last_seen": now})
+            deduped += 1
+        else:
+            # --- NEW: insert (id assigned here so later stages can reference it) ---
+            detection_dict = compute_group_detection(group).model_dump(by_alias=True, exclude={"id"})
+            detection_dict["_id"] = ObjectId()
+            ops.append(InsertOne(detection_dict))
+            new_detections.append(detection_dict)
+            changes.append({**detection_dict, "prev_last_seen": None})
 
-    title = f"Detection: {detection['source']} {detection['indicator']}"
-    
-    criticality = asset.get("criticality", 3)  # 1-5
-    score = int(criticality) * int(sev)
-
-    # Upsert key
-    upsert_filter = {"asset_id": asset_id, "title": title}
-
-    # New or updated data
-    update_data = {
-        "$set": {
-            "status": "Open",
-            "owner": asset.get("owner", "security-team@smb.com"),
-            "due": datetime.utcnow() + timedelta(days=14),
-            "score": score,
-            "updated_at": datetime.utcnow()
-        },
-        "$setOnInsert": {
-            "title": title,
-            "asset_id": asset_id,
-            "created_at": datetime.utcnow()
-        }
-    }
+    if ops:
+        await db["detections"].bulk_write(ops, ordered=False)
+        await record_detection_changes(changes)
+        await response_cache.invalidate("detections")
 
-    # Await the async update operation
-    await db["risk_items"].update_one(
-        upsert_filter,
-        update_data,
-        upsert=True
-    )
+    asset_ids = list({d["asset_id"] for d in new_detections})
+    assets = {}
+    if asset_ids:
+        async for asset in db["assets"].find({"_id": {"$in": asset_ids}}):
+            assets[asset["_id"]] = asset
 
-    # Update asset risk_score (7-day max severity)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7 * TIME_MULTIPLIER)
-    recent_high = await db["detections"].find_one(
-        {"asset_id": asset_id, "last_seen": {"$gte": seven_days_ago}},
-        sort=[("severity", -1)]
-    )
+    return {"new": new_detections, "deduped": deduped, "assets": assets}
     
-    if recent_high:
-        max_sev = recent_high["severity"]
-        asset_risk_score = int(max_sev) * int(criticality)
-        await db["assets"].update_one(
-            {"_id": asset_id},
-            {"$set": {"risk_score": asset_risk_score}}
+def _qualifies_as_risk(detection: Dict[str, Any]) -> bool:
+    sev = detection["severity"]
+    return sev >= 4 or (sev >= 3 and detection["confidence"] >= 70)
+
+
+async def create_or_update_risk_items(
+    detections: List[Dict[str, Any]],
+    assets: Optional[Dict[ObjectId, Dict[str, Any]]] = None,
+) -> int:
+    """
+    Batch risk-item upsert for the new detections of one detect run.
+
+    Upserts a risk item for every detection that meets the threshold
+    (severity >= 4 OR (severity >= 3 AND confidence >= 70)), then recomputes
+    each affected asset's risk_score from its 7-day max severity.
+    Round trips: one $in asset lookup (skipped when `assets` covers them),
+    one $group aggregation, one bulk_write to risk_items, one to assets.
+
+    Returns the number of risk items upserted.
+    """
+    assets = dict(assets or {})
+    qualifying = []
+    for detection in detections:
+        if not _qualifies_as_risk(detection):
+            continue  # No risk
+        asset_id = detection["asset_id"]
+        # Convert asset_id to ObjectId if it's a string
+        if isinstance(asset_id, str):
+            try:
+                asset_id = ObjectId(asset_id)
+            except Exception:
+                print(f"Invalid asset_id: {asset_id}")
+                continue
+        qualifying.append((asset_id, detection))
+    if not qualifying:
+        return 0
+
+    missing = list({a for a, _ in qualifying if a not in assets})
+    if missing:
+        async for asset in db["assets"].find({"_id": {"$in": missing}}):
+            assets[asset["_id"]] = asset
+
+    # Upsert key (asset_id, title); a later detection for the same key wins, as it did one-by-one
+    now = datetime.utcnow()
+    risk_ops: Dict[tuple, UpdateOne] = {}
+    for asset_id, detection in qualifying:
+        asset = assets.get(asset_id)
+        if not asset:
+            print(f"Asset not found: {asset_id}")
+            continue
+        title = f"Detection: {detection['source']} {detection['indicator']}"
+        criticality = asset.get("criticality", 3)  # 1-5
+        risk_ops[(asset_id, title)] = UpdateOne(
+            {"asset_id": asset_id, "title": title},
+            {
+                "$set": {
+                    "status": "Open",
+                    "owner": asset.get("owner", "security-team@smb.com"),
+                    "due": now + timedelta(days=14),
+                    "score": int(criticality) * int(detection["severity"]),
+                    "updated_at": now,
+                },
+                "$setOnInsert": {"title": title, "asset_id": asset_id, "created_at": now},
+            },
+            upsert=True,
         )
-      
+    if not risk_ops:
+        return 0
+
+    async with BulkWriter(db["risk_items"]) as writer:
+        await writer.extend(risk_ops.values())
+
+    # Update asset risk_score (7-day max severity), all assets in one aggregation
+    asset_ids = list({asset_id for asset_id, _ in risk_ops})
+    seven_days_ago = now - timedelta(days=7 * TIME_MULTIPLIER)
+    async with BulkWriter(db["assets"]) as writer:
+        async for row in db["detections"].aggregate([
+            {"$match": {"asset_id": {"$in": asset_ids}, "last_seen": {"$gte": seven_days_ago}}},
+            {"$group": {"_id": "$asset_id", "max_sev": {"$max": "$severity"}}},
+        ]):
+            criticality = assets[row["_id"]].get("criticality", 3)
+            await writer.add(UpdateOne(
+                {"_id": row["_id"]},
+                {"$set": {"risk_score": int(row["max_sev"]) * int(criticality)}},
+            ))
+
+    await response_cache.invalidate("risk", "assets")
+    return len(risk_ops)
+
+
+async def create_or_update_risk_item(detection: Dict[str, Any]) -> None:
+    """Single-detection form of create_or_update_risk_items."""
+    await create_or_update_risk_items([detection])
+
 def send_teams_alert(detection: dict, asset: dict) -> bool:
     """
-    Sends URGENT Teams MessageCard with @channel mention for high-severity.
-    Triggers push notification.
+    Queues URGENT Teams MessageCard with @channel mention for high-severity.
+    Delivery (retry, per-asset digest) is handled by the alert dispatcher,
+    so this never blocks the detect run. Returns True if the alert was queued.
     """
     try:
         link = f"{FRONTEND_URL}/detection/{detection['_id']}"
@@ -330,13 +501,13 @@ def send_teams_alert(detection: dict, asset: dict) -> bool:
             }]
         }
 
-        response = httpx.post(TEAMS_WEBHOOK_URL, json=card, timeout=10.0)
-        if response.status_code == 200:
-            print(f"Teams URGENT alert sent: {detection['indicator']} (severity {detection['severity']})")
-            return True
-        else:
-            print(f"Teams alert failed: {response.status_code}")
-            return False
+        return alert_dispatcher.enqueue({
+            "key": str(detection["asset_id"]),
+            "label": asset.get("name"),
+            "title": f"{detection['severity']}/5 {detection['source']} {detection['indicator']}",
+            "urgent": is_urgent,
+            "card": card,
+        })
 
     except Exception as e:
         print(f"Teams alert error: {e}")
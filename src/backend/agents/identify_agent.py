@@ -1,20 +1,78 @@
 
+import hashlib
+import os
 import re
-from agents.DS_agent import query_deepseek
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from agents.DS_agent import score_severities
 from db.mongo import db
-from datetime import datetime
-from agents.osint.otx_client import otx_intel_events
+from datetime import datetime, timedelta
+from agents.osint.otx_client import iter_otx_intel_events
+from db.bulk import BulkWriter
+from services.response_cache import response_cache
 
-_HW_PAT = re.compile(r"server|srv|vm|host|router|switch|firewall|loadbalancer|nas|san|laptop|desktop|printer|device|hardware|hw|physical|machine|tablet|phone|mobile", re.I)
-_SW_PAT = re.compile(r"app|application|software|program|tool|system|platform|website|webapp|portal|cms|database|db|mysql|postgres|oracle|mongodb", re.I)
-_SERVICE_PAT = re.compile(r"api|endpoint|gateway|proxy|microservice|webservice|rest|soap|graphql|interface|connector|adapter", re.I)
-_DATA_PAT = re.compile(r"dataset|data|file|repository|archive|backup|log|audit|record|document|report|table|schema|collection|bucket|config|setting|secret|certificate", re.I)
-_USER_PAT = re.compile(r"user|account|employee|staff|personnel|admin|administrator|team|group|department|division|customer|client", re.I)
+# Name keyword families in priority order (first family with a substring hit wins)
+_TYPE_KEYWORDS = [
+    ("HW", ["server", "srv", "vm", "host", "router", "switch", "firewall", "loadbalancer", "nas", "san", "laptop", "desktop", "printer", "device", "hardware", "hw", "physical", "machine", "tablet", "phone", "mobile"]),
+    ("Service", ["api", "endpoint", "gateway", "proxy", "microservice", "webservice", "rest", "soap", "graphql", "interface", "connector", "adapter"]),
+    ("Data", ["dataset", "data", "file", "repository", "archive", "backup", "log", "audit", "record", "document", "report", "table", "schema", "collection", "bucket", "config", "setting", "secret", "certificate"]),
+    ("User", ["user", "account", "employee", "staff", "personnel", "admin", "administrator", "team", "group", "department", "division", "customer", "client"]),
+    ("SW", ["app", "application", "software", "program", "tool", "system", "platform", "website", "webapp", "portal", "cms", "database", "db", "mysql", "postgres", "oracle", "mongodb"]),
+]
+
+
+def _keyword_trie(words: list) -> str:
+    """Regex alternation factored by common prefix (server|srv -> s(?:erver|rv))."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node: dict) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 and "" not in node else "(?:" + "|".join(alts) + ")"
+        return body + ("?" if "" in node else "")
+
+    return emit(trie)
+
+
+# One pass over the name for all families: a zero-width lookahead at each position
+# reports the best family starting there (named group), behind a first-letter guard.
+_TYPE_RANK = {t: i for i, (t, _) in enumerate(_TYPE_KEYWORDS)}
+_TYPE_PAT = re.compile(
+    "(?=[" + "".join(sorted({w[0] for _, words in _TYPE_KEYWORDS for w in words})) + "])"
+    "(?=" + "|".join(f"(?P<{t}>{_keyword_trie(words)})" for t, words in _TYPE_KEYWORDS) + ")",
+    re.I,
+)
+
+
+def _name_type(n: str) -> str | None:
+    """Highest-priority keyword family found anywhere in the name, or None."""
+    best = None
+    for m in _TYPE_PAT.finditer(n):
+        rank = _TYPE_RANK[m.lastgroup]
+        if best is None or rank < best:
+            best = rank
+            if rank == 0:
+                break
+    return None if best is None else _TYPE_KEYWORDS[best][0]
 
 # Email pattern
 _EMAIL_PAT = re.compile(r"@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
 _UNWANTED_UPDATES = ["203.0.113.10", "web01.acmeretail.local", "203.0.113.20", "db01.acmeretail.local", "10.10.20.15", "pos01.store1.local", "203.0.113.50", "vpn.acmeretail.local", "cms.acmeretail.local", "portal.mediclinic.local", "198.51.100.25", "emrdb.mediclinic.local", "198.51.100.40", "vpn.mediclinic.local", "10.20.30.40", "lab01.mediclinic.local", "10.20.99.10", "backup.mediclinic.local"]
 
+# Asset ↔ intel linking
+LINK_BATCH_SIZE = int(os.getenv("LINK_BATCH_SIZE", "1000"))
+_LINK_STATE_ID = "asset_intel_links"
+_HOST_INDICATOR_TYPES = ["hostname", "domain"]
+_ASSET_LINK_PROJECTION = {"name": 1, "ip": 1, "hostname": 1}
+_INTEL_LINK_PROJECTION = {"indicator": 1, "indicator_type": 1}
+TIME_MULTIPLIER = int(os.getenv("TIME_MULTIPLIER", "1"))
+
 def infer_type(name: str | None, hostname: str | None = None, owner: str | None = None) -> str:
     """
     Simple asset type inference using nested if-else logic
@@ -41,24 +99,8 @@ def infer_type(name: str | None, hostname: str | None = None, owner: str | None
         if h.startswith(('user-', 'account-', 'admin-', 'team-')):
             return "User"
     
-    # Check name patterns in priority order
-    if _HW_PAT.search(n):
-        return "HW"
-    
-    if _SERVICE_PAT.search(n):
-        return "Service"
-    
-    if _DATA_PAT.search(n):
-        return "Data"
-    
-    if _USER_PAT.search(n):
-        return "User"
-    
-    if _SW_PAT.search(n):
-        return "SW"
-    
-    # Default fallback
-    return "SW"
+    # Check name patterns in priority order (HW, Service, Data, User, SW); default SW
+    return _name_type(n) or "SW"
 
 def crit_from_sens(s: str | None) -> int:
     s = (s or "Low").lower()
@@ -68,151 +110,408 @@ def crit_from_sens(s: str | None) -> int:
         return 3
     return 2
 
-async def generate_asset_intel_links():
-    """
-    Efficiently link assets ↔ intel_events using MongoDB aggregation
-    based on matching IP or hostname (depending on indicator_type).
-    Also updates intel_events with matched asset_id.
-    """
-
-    # ---- 1) Match IP-based intel ----
-    ip_matches = db["intel_events"].aggregate([
-        {"$match": {"indicator_type": "ip"}},
-        {"$lookup": {
-            "from": "assets",
-            "localField": "indicator",
-            "foreignField": "ip",
-            "as": "matched_assets"
-        }},
-        {"$unwind": "$matched_assets"},
-        {"$project": {
-            "intel_id": "$_id",
-            "asset_id": "$matched_assets._id",
-            "asset_name": "$matched_assets.name",
-            "intel_indicator": "$indicator",
-            "match_type": {"$literal": "ip"}
-        }}
-    ])
-
-    # ---- 2) Match hostname-based intel ----
-    host_matches = db["intel_events"].aggregate([
-        {"$match": {"indicator_type": {"$in": ["hostname", "domain"]}}},
-        {"$lookup": {
-            "from": "assets",
-            "localField": "indicator",
-            "foreignField": "hostname",
-            "as": "matched_assets"
-        }},
-        {"$unwind": "$matched_assets"},
-        {"$project": {
-            "intel_id": "$_id",
-            "asset_id": "$matched_assets._id",
-            "asset_name": "$matched_assets.name",
-            "intel_indicator": "$indicator",
-            "match_type": {"$literal": "hostname"}
-        }}
-    ])
-
-    # ---- 3) Insert combined results into bridge table and update intel_events ----
-    inserted = 0
-
-    async for match in ip_matches:
-        # Update asset_intel_links bridge table
-        await db["asset_intel_links"].update_one(
-            {"asset_id": match["asset_id"], "intel_id": match["intel_id"]},
-            {"$setOnInsert": {
-                **match,
-                "created_at": datetime.utcnow(),
-            }},
-            upsert=True
-        )
-        
-        # Add asset_id to the intel_event entry
-        await db["intel_events"].update_one(
-            {"_id": match["intel_id"]},
-            {"$set": {"asset_id": match["asset_id"]}}
-        )
-        
-        inserted += 1
-
-    async for match in host_matches:
-        # Update asset_intel_links bridge table
-        await db["asset_intel_links"].update_one(
+class _LinkWriter:
+    """
+    Queues the two writes for each asset ↔ intel match (bridge-table upsert +
+    asset_id back-reference on the intel event) on two BulkWriters.
+    """
+
+    def __init__(self):
+        self.links = BulkWriter(db["asset_intel_links"], LINK_BATCH_SIZE)
+        self.backrefs = BulkWriter(db["intel_events"], LINK_BATCH_SIZE)
+        self.linked = 0
+        self.asset_ids = set()  # assets whose risk summary is stale
+
+    async def add(self, intel: dict, asset: dict, match_type: str) -> None:
+        match = {
+            "intel_id": intel["_id"],
+            "asset_id": asset["_id"],
+            "asset_name": asset.get("name"),
+            "intel_indicator": intel.get("indicator"),
+            "match_type": match_type,
+        }
+        await self.links.add(UpdateOne(
             {"asset_id": match["asset_id"], "intel_id": match["intel_id"]},
-            {"$setOnInsert": {
-                **match,
-                "created_at": datetime.utcnow(),
-            }},
-            upsert=True
-        )
-        
-        # Add asset_id to the intel_event entry
-        await db["intel_events"].update_one(
+            {"$setOnInsert": {**match, "created_at": datetime.utcnow()}},
+            upsert=True,
+        ))
+        await self.backrefs.add(UpdateOne(
             {"_id": match["intel_id"]},
-            {"$set": {"asset_id": match["asset_id"]}}
-        )
-        
-        inserted += 1
+            {"$set": {"asset_id": match["asset_id"]}},
+        ))
+        self.asset_ids.add(match["asset_id"])
+        self.linked += 1
 
-    return inserted
-    
-async def infere_asset_fields():
+    async def flush(self) -> int:
+        await self.links.flush()
+        await self.backrefs.flush()
+        if self.asset_ids:
+            await refresh_asset_risk_summary(list(self.asset_ids))
+            self.asset_ids = set()
+        return self.linked
+
+
+def _match_intel(intel: dict, assets_by_ip: dict, assets_by_host: dict) -> list:
+    """Return [(asset, match_type)] for one intel event."""
+    indicator = intel.get("indicator")
+    indicator_type = intel.get("indicator_type")
+    if indicator_type == "ip":
+        return [(a, "ip") for a in assets_by_ip.get(indicator, [])]
+    if indicator_type in _HOST_INDICATOR_TYPES:
+        return [(a, "hostname") for a in assets_by_host.get(indicator, [])]
+    return []
+
+
+def _index_assets(assets: list) -> tuple[dict, dict]:
+    assets_by_ip, assets_by_host = {}, {}
+    for a in assets:
+        if a.get("ip"):
+            assets_by_ip.setdefault(a["ip"], []).append(a)
+        if a.get("hostname"):
+            assets_by_host.setdefault(a["hostname"], []).append(a)
+    return assets_by_ip, assets_by_host
+
+
+async def _link_intel_batch(intel_batch: list, writer: _LinkWriter) -> None:
+    """Match a batch of intel events against assets with one indexed $in query."""
+    ips = {i["indicator"] for i in intel_batch if i.get("indicator_type") == "ip" and i.get("indicator")}
+    hosts = {i["indicator"] for i in intel_batch if i.get("indicator_type") in _HOST_INDICATOR_TYPES and i.get("indicator")}
+    if not ips and not hosts:
+        return
+
+    assets = await db["assets"].find(
+        {"$or": [{"ip": {"$in": list(ips)}}, {"hostname": {"$in": list(hosts)}}]},
+        _ASSET_LINK_PROJECTION,
+    ).to_list(length=None)
+    assets_by_ip, assets_by_host = _index_assets(assets)
+
+    for intel in intel_batch:
+        for asset, match_type in _match_intel(intel, assets_by_ip, assets_by_host):
+            await writer.add(intel, asset, match_type)
+
+
+async def link_assets(asset_ids: list) -> int:
     """
-    Process assets table and infer missing type/criticality fields.
+    Link only the given assets against existing intel (used after create/edit/import).
+    Intel is looked up by (indicator_type, indicator), so cost scales with the
+    number of matching events, not with the size of intel_events.
+    The risk summary of every given asset is recomputed, matched or not.
     """
+    if not asset_ids:
+        return 0
+    writer = _LinkWriter()
+    # Refresh every given asset, not only newly linked ones: criticality/name
+    # may have changed, or an edit may have dropped all of its links
+    writer.asset_ids.update(asset_ids)
+
+    assets = await db["assets"].find({"_id": {"$in": list(asset_ids)}}, _ASSET_LINK_PROJECTION).to_list(length=None)
+    assets_by_ip, assets_by_host = _index_assets(assets)
+    if assets_by_ip or assets_by_host:
+        cursor = db["intel_events"].find(
+            {"$or": [
+                {"indicator_type": "ip", "indicator": {"$in": list(assets_by_ip)}},
+                {"indicator_type": {"$in": _HOST_INDICATOR_TYPES}, "indicator": {"$in": list(assets_by_host)}},
+            ]},
+            _INTEL_LINK_PROJECTION,
+        ).batch_size(LINK_BATCH_SIZE)
+        async for intel in cursor:
+            for asset, match_type in _match_intel(intel, assets_by_ip, assets_by_host):
+                await writer.add(intel, asset, match_type)
+    return await writer.flush()
+
+
+async def unlink_asset(asset_id) -> int:
+    """
+    Drop an asset's links (its match keys changed). Each intel event that
+    pointed back at it moves to another asset it is still linked to, or
+    loses asset_id when none is left. Returns the number of links dropped.
+    """
+    links = db["asset_intel_links"]
+    intel_ids = [link["intel_id"] async for link in links.find({"asset_id": asset_id}, {"intel_id": 1})]
+    await links.delete_many({"asset_id": asset_id})
+    if not intel_ids:
+        return 0
+
+    remaining = {}
+    async for link in links.find({"intel_id": {"$in": intel_ids}}, {"intel_id": 1, "asset_id": 1}):
+        remaining.setdefault(link["intel_id"], link["asset_id"])
+    async with BulkWriter(db["intel_events"], LINK_BATCH_SIZE) as writer:
+        for intel_id in intel_ids:
+            other = remaining.get(intel_id)
+            update = {"$set": {"asset_id": other}} if other is not None else {"$unset": {"asset_id": ""}}
+            await writer.add(UpdateOne({"_id": intel_id, "asset_id": asset_id}, update))
+    return len(intel_ids)
+
+
+async def link_new_intel() -> int:
+    """
+    Link intel events added since the last run.
+    Progress is kept as a high-water mark on intel_events._id in link_state,
+    so each event is only scanned once.
+    """
+    state = await db["link_state"].find_one({"_id": _LINK_STATE_ID}) or {}
+    query = {}
+    if state.get("last_intel_id"):
+        query["_id"] = {"$gt": state["last_intel_id"]}
+
+    cursor = db["intel_events"].find(query, _INTEL_LINK_PROJECTION).sort("_id", 1).batch_size(LINK_BATCH_SIZE)
+
+    writer, batch = _LinkWriter(), []
+    async for intel in cursor:
+        batch.append(intel)
+        if len(batch) >= LINK_BATCH_SIZE:
+            await _link_intel_batch(batch, writer)
+            # Only advance the mark once this batch's links are written
+            await writer.flush()
+            await _save_link_state(batch[-1]["_id"])
+            batch = []
+    if batch:
+        await _link_intel_batch(batch, writer)
+        await writer.flush()
+        await _save_link_state(batch[-1]["_id"])
+    return writer.linked
+
+
+async def _save_link_state(last_intel_id) -> None:
+    await db["link_state"].update_one(
+        {"_id": _LINK_STATE_ID},
+        {"$set": {"last_intel_id": last_intel_id, "updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+async def generate_asset_intel_links(asset_ids: list | None = None, full: bool = False) -> int:
+    """
+    Link assets ↔ intel_events on IP or hostname (depending on indicator_type)
+    and set the matched asset_id on intel_events.
+
+    - asset_ids given: link only those assets.
+    - full=True: drop the high-water mark and re-scan all intel (e.g. after a re-seed).
+    - otherwise: link only intel added since the last run.
+    """
+    if asset_ids is not None:
+        return await link_assets(asset_ids)
+    if full:
+        await db["link_state"].delete_one({"_id": _LINK_STATE_ID})
+        linked = await link_new_intel()
+        await refresh_asset_risk_summary()
+        return linked
+    return await link_new_intel()
+
+
+# ---------------------------
+# Materialized asset risk summary
+# ---------------------------
+# Seeded intel stores severity as a string, OTX intel as an int; BSON orders
+# every string above every number, so compare them as ints
+_SEVERITY_INT = {"$convert": {"input": "$intel.severity", "to": "int", "onError": None, "onNull": None}}
+
+
+async def refresh_asset_risk_summary(asset_ids: list | None = None) -> int:
+    """
+    Recompute asset_risk_summary for the given assets (all assets if None).
+
+    One document per asset (_id = asset _id) with max intel severity over 7
+    and 30 days, intel count, last intel time and risk_score =
+    criticality × max_sev_7d. Called for the touched assets whenever links are
+    written; a full refresh (services/risk_refresher, re-seed) lets the windows
+    age out.
+    """
+    now = datetime.utcnow()
+    since_7d = now - timedelta(days=7 * TIME_MULTIPLIER)
+    since_30d = now - timedelta(days=30 * TIME_MULTIPLIER)
+    refreshed = 0
+
+    async with BulkWriter(db["asset_risk_summary"], LINK_BATCH_SIZE) as writer:
+        async for assets in _asset_chunks(asset_ids):
+            stats = {}
+            async for row in db["asset_intel_links"].aggregate([
+                {"$match": {"asset_id": {"$in": list(assets)}}},
+                {"$lookup": {"from": "intel_events", "localField": "intel_id", "foreignField": "_id", "as": "intel"}},
+                {"$unwind": "$intel"},
+                {"$group": {
+                    "_id": "$asset_id",
+                    "intel_count": {"$sum": 1},
+                    "last_intel_at": {"$max": "$intel.created_at"},
+                    "max_sev_7d": {"$max": {"$cond": [{"$gte": ["$intel.created_at", since_7d]}, _SEVERITY_INT, None]}},
+                    "max_sev_30d": {"$max": {"$cond": [{"$gte": ["$intel.created_at", since_30d]}, _SEVERITY_INT, None]}},
+                }},
+            ]):
+                stats[row["_id"]] = row
+
+            for asset_id, asset in assets.items():
+                row = stats.get(asset_id, {})
+                crit = int(asset.get("criticality") or 0)
+                max_sev_7d = int(row.get("max_sev_7d") or 0)
+                await writer.add(UpdateOne(
+                    {"_id": asset_id},
+                    {"$set": {
+                        "name": asset.get("name"),
+                        "criticality": crit,
+                        "max_sev_7d": max_sev_7d,
+                        "max_sev_30d": int(row.get("max_sev_30d") or 0),
+                        "intel_count": row.get("intel_count", 0),
+                        "last_intel_at": row.get("last_intel_at"),
+                        "risk_score": crit * max_sev_7d,
+                        "updated_at": now,
+                    }},
+                    upsert=True,
+                ))
+                refreshed += 1
+    await response_cache.invalidate("assets")
+    return refreshed
+
+
+async def _asset_chunks(asset_ids: list | None):
+    """{_id: asset} for LINK_BATCH_SIZE assets at a time; all assets are paged by _id."""
+    projection = {"name": 1, "criticality": 1}
+    if asset_ids is not None:
+        asset_ids = list(dict.fromkeys(asset_ids))
+        for i in range(0, len(asset_ids), LINK_BATCH_SIZE):
+            chunk = asset_ids[i:i + LINK_BATCH_SIZE]
+            yield {a["_id"]: a async for a in db["assets"].find({"_id": {"$in": chunk}}, projection)}
+        return
+
+    query = {}
+    while True:
+        page = await db["assets"].find(query, projection).sort("_id", 1).limit(LINK_BATCH_SIZE).to_list(length=LINK_BATCH_SIZE)
+        if not page:
+            return
+        yield {a["_id"]: a for a in page}
+        query = {"_id": {"$gt": page[-1]["_id"]}}
     
-    # Get all assets
-    assets = [asset async for asset in db["assets"].find()]
-    
-    updated_count = 0
-    
-    # Process each asset
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "1000"))
+_CLASSIFY_PROJECTION = {"name": 1, "hostname": 1, "owner": 1, "type": 1, "criticality": 1, "data_sensitivity": 1}
+# Falsy type/criticality (None also matches a missing field)
+_UNCLASSIFIED_QUERY = {"$or": [{"type": {"$in": [None, ""]}}, {"criticality": {"$in": [None, "", 0]}}]}
+
+
+def classify_assets(assets: list) -> list:
+    """
+    Infer missing type/criticality for a batch of assets.
+    Returns one {"_id", "name", "changes": {field: {"from", "to"}}} per asset that changes.
+    """
+    diffs = []
     for asset in assets:
-        update_fields = {}
-        
+        changes = {}
         # Infer type only if it doesn't exist or is empty
         if not asset.get("type"):
-            inferred_type = infer_type(
-                name=asset.get("name"), 
-                hostname=asset.get("hostname"), 
-                owner=asset.get("owner")
-            )
-            update_fields["type"] = inferred_type
-        
+            changes["type"] = infer_type(name=asset.get("name"), hostname=asset.get("hostname"), owner=asset.get("owner"))
         # Infer criticality only if it doesn't exist
         if not asset.get("criticality"):
-            inferred_criticality = crit_from_sens(asset.get("data_sensitivity"))
-            update_fields["criticality"] = inferred_criticality
-        
-        # Update asset only if we have fields to update
-        if update_fields:
-            await db["assets"].update_one(
-                {"_id": asset["_id"]},
-                {"$set": update_fields}
-            )
-            updated_count += 1
-    
-    return updated_count
+            changes["criticality"] = crit_from_sens(asset.get("data_sensitivity"))
+        if changes:
+            diffs.append({
+                "_id": asset["_id"],
+                "name": asset.get("name"),
+                "changes": {f: {"from": asset.get(f), "to": v} for f, v in changes.items()},
+            })
+    return diffs
+
+
+async def classify_asset_fields(dry_run: bool = False, diff_limit: int = 1000) -> dict:
+    """
+    Bulk classification of assets missing type/criticality.
+    Only unclassified assets are read, CLASSIFY_BATCH_SIZE at a time, and changes
+    are written with unordered bulk_write. dry_run returns the diff without writing.
+    """
+    cursor = db["assets"].find(_UNCLASSIFIED_QUERY, _CLASSIFY_PROJECTION).batch_size(CLASSIFY_BATCH_SIZE)
+    changed, diff, batch = 0, [], []
+
+    async with BulkWriter(db["assets"], CLASSIFY_BATCH_SIZE) as writer:
+        async def process(batch):
+            nonlocal changed
+            for d in classify_assets(batch):
+                changed += 1
+                if len(diff) < diff_limit:
+                    diff.append({**d, "_id": str(d["_id"])})
+                if not dry_run:
+                    await writer.add(UpdateOne(
+                        {"_id": d["_id"]},
+                        {"$set": {f: c["to"] for f, c in d["changes"].items()}},
+                    ))
+
+        async for asset in cursor:
+            batch.append(asset)
+            if len(batch) >= CLASSIFY_BATCH_SIZE:
+                await process(batch)
+                batch = []
+        if batch:
+            await process(batch)
+
+    if changed and not dry_run:
+        await response_cache.invalidate("assets")
+    return {"changed": changed, "dry_run": dry_run, "diff": diff, "diff_truncated": changed > len(diff)}
+
+
+async def infere_asset_fields() -> int:
+    """
+    Process assets table and infer missing type/criticality fields.
+    """
+    return (await classify_asset_fields(diff_limit=0))["changed"]
 
 async def fetch_pulses():
-    assets = await db.assets.find().to_list(length=None)
+    assets = await db.assets.find({}, {"ip": 1, "hostname": 1}).to_list(length=None)
+    assets_by_ip = {}
     for asset in assets:
         if asset.get("ip") is None or asset.get("ip") == "" or asset.get("ip") in _UNWANTED_UPDATES or asset.get("hostname") in _UNWANTED_UPDATES:
             continue
-        pulses = otx_intel_events(asset.get("ip"))
-        for p in pulses:
-            summary = p["name"] + ' ' + p["description"]
-            exists = await db.intel_events.find_one({"summary": summary}) is not None
-            if exists:
-                continue
-            intel_event = {
+        assets_by_ip.setdefault(asset["ip"], []).append(asset)
+
+    # OTX lookups run concurrently off the event loop; pulses are stored as each IP finishes
+    async for ip, pulses in iter_otx_intel_events(assets_by_ip):
+        for asset in assets_by_ip[ip]:
+            await _store_pulses(asset, pulses)
+
+
+def intel_fingerprint(source: str, pulse_id, indicator: str) -> str:
+    """Content fingerprint for intel_events: sha256 of (source, pulse id, indicator)."""
+    raw = f"{source}|{pulse_id}|{indicator}".lower()
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def _store_pulses(asset: dict, pulses: list):
+    """
+    Insert the OTX pulses for one asset as intel_events.
+    Known pulses are filtered with one $in query on the fingerprint index;
+    anything that slips through a race is rejected by the unique index.
+    """
+    indicator = asset.get("ip")
+    candidates = {}
+    for p in pulses:
+        pulse_id = p.get("id") or p.get("name")
+        candidates.setdefault(intel_fingerprint("otx", pulse_id, indicator), (pulse_id, p))
+    if not candidates:
+        return
+
+    known = await db.intel_events.find(
+        {"fingerprint": {"$in": list(candidates)}}, {"fingerprint": 1, "_id": 0}
+    ).to_list(length=None)
+    for doc in known:
+        candidates.pop(doc["fingerprint"], None)
+    if not candidates:
+        return
+
+    # One cached/batched scoring call for all of this asset's new pulses
+    summaries = [p["name"] + ' ' + p["description"] for _, p in candidates.values()]
+    severities = await score_severities(summaries)
+
+    docs = []
+    for (fingerprint, (pulse_id, _)), summary, severity in zip(candidates.items(), summaries, severities):
+        docs.append({
             "source": "otx",
-            "indicator": asset.get("ip"),
+            "indicator": indicator,
             "indicator_type": "ip",
-            "severity": query_deepseek("on a scale of 1 to 5, how severe is the threat described as: (only return the number)" + summary),
+            "severity": severity,
             "summary": summary,
-            "created_at": datetime.now(), 
-            "asset_id": asset.get("_id")
-            }
-            await db.intel_events.insert_one(intel_event)
-            # print(intel_event)  
\ No newline at end of file
+            "pulse_id": pulse_id,
+            "fingerprint": fingerprint,
+            "created_at": datetime.utcnow(),
+            "asset_id": asset.get("_id"),
+        })
+    try:
+        await db.intel_events.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+    await response_cache.invalidate("intel")
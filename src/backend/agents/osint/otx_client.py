@@ -1,4 +1,6 @@
+import asyncio
 import os
+import time
 from OTXv2 import OTXv2, IndicatorTypes
 from dotenv import load_dotenv
 from db.mongo import db
@@ -13,8 +15,37 @@ IPv4New = IndicatorTypes.IndicatorTypes(
 )
 
 OTX_API_KEY = os.getenv("OSINT_OTX_API_KEY")
-RATE_LIMIT = 10
+RATE_LIMIT = 10  # OTX requests per second, shared by every caller in this process
+OTX_CONCURRENCY = int(os.getenv("OTX_CONCURRENCY", "8"))
 otx = OTXv2(OTX_API_KEY)
+
+
+class TokenBucket:
+    """
+    Async token-bucket limiter: `rate` tokens per second, bursts up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+otx_limiter = TokenBucket(RATE_LIMIT)
+
 # Get everything OTX knows about google.com
 def otx_intel_events(ip):
     try:
@@ -25,3 +56,29 @@ def otx_intel_events(ip):
 
     except Exception: 
         return []
+
+
+async def otx_intel_events_async(ip):
+    """Rate-limited otx_intel_events that runs the blocking OTXv2 call on a worker thread."""
+    await otx_limiter.acquire()
+    return await asyncio.to_thread(otx_intel_events, ip)
+
+
+async def iter_otx_intel_events(ips, concurrency: int = OTX_CONCURRENCY):
+    """
+    Fetch pulses for many IPs with at most `concurrency` calls in flight.
+    Yields (ip, pulses) as each lookup finishes; duplicate IPs are fetched once.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(ip):
+        async with sem:
+            return ip, await otx_intel_events_async(ip)
+
+    tasks = [asyncio.create_task(fetch(ip)) for ip in dict.fromkeys(ips)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for t in tasks:
+            t.cancel()
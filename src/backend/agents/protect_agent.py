@@ -7,6 +7,7 @@ from typing import List, Dict, Any
 from bson import ObjectId
 from agents.detect_agent import TIME_MULTIPLIER
 from db.mongo import db
+from services.response_cache import response_cache
 
 
 NIST_TITLES = {
@@ -141,6 +142,9 @@ async def run_protect_agent() -> Dict[str, Any]:
 
                         recommendations.append(control)
 
+    if recommendations:
+        await response_cache.invalidate("controls")
+
     # --- Simple coverage (for dashboard widget) ---
     unique_families = len({c["family"] for c in recommendations})
     coverage = {
@@ -5,7 +5,6 @@ from typing import Any, List, Literal, Optional, Union
 from bson import ObjectId
 from bson.errors import InvalidId
 from pydantic import BaseModel, Field, validator
-from pymongo.database import Database
 
 def _normalize_asset_id_for_query(raw: Union[str, int, ObjectId]):
     """
@@ -34,13 +33,13 @@ def _json_safe_asset_id(raw):
         return str(raw)
     return raw
 
-def get_backup_reports_by_asset_id(db, asset_id: Union[int, str]) -> List[dict]:
+async def get_backup_reports_by_asset_id(db, asset_id: Union[int, str]) -> List[dict]:
     col = db.get_collection("backup_sets")
 
     # Normalize incoming asset_id (string -> ObjectId/int/etc.)
     normalized_id = _normalize_asset_id_for_query(asset_id)
 
-    docs = list(col.find({"asset_id": normalized_id}))
+    docs = await col.find({"asset_id": normalized_id}).to_list(length=None)
 
     results = []
 
@@ -280,8 +279,8 @@ def _json_safe_id(raw):
 
 #     return response
 
-def get_restore_tests_by_asset_id(
-    db: Database,
+async def get_restore_tests_by_asset_id(
+    db,
     asset_id: Union[str, int],
 ) -> List[dict]:
     """
@@ -295,9 +294,7 @@ def get_restore_tests_by_asset_id(
     normalized_id = _normalize_id_for_query(asset_id)
 
     # Get tests for this asset, newest first (or change sort if you prefer)
-    docs = list(
-        col.find({"asset_id": normalized_id}).sort("test_started_at", -1)
-    )
+    docs = await col.find({"asset_id": normalized_id}).sort("test_started_at", -1).to_list(length=None)
 
     results: List[dict] = []
 
@@ -1,11 +1,14 @@
+import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 import os
 from dotenv import load_dotenv
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from db.mongo import db  # this should be your AsyncIOMotorDatabase
-
-import requests
+from services.alerts.notifier import alert_dispatcher
+from services.response_cache import response_cache
 
 load_dotenv()
 # 你的 webhook
@@ -57,38 +60,47 @@ async def add_incident_evidence(incident_id: ObjectId, payload: Dict[str, Any]):
 
     return result.inserted_id
 
-TEAMS_WEBHOOK_URL = os.getenv("TEAMS_WEBHOOK_URL")
-
-async def send_incident_notification(incident: Dict[str, Any]):     # step 4
-    """
-    Send Slack/Webhook alert and log a comms event to the timeline.
-    """
-    message = (
+def _incident_message(incident: Dict[str, Any]) -> str:
+    return (
         f"[{incident.get('severity')}] New Incident {incident.get('_id')} "
         f"Asset: {incident.get('primary_asset_id')} "
         f"Phase: {incident.get('status')} "
         f"SLA Due: {incident.get('sla_due_at')}"
     )
 
-    # Send Slack message
-    try:
-        requests.post(TEAMS_WEBHOOK_URL, json={"text": message})
-    except Exception as e:
-        print("Slack send failed:", e)
 
-    # Store comms event in timeline
-    await incident_timeline_col.insert_one(
-        {
-            "incident_id": incident["_id"],
-            "ts": datetime.utcnow(),
-            "actor": "system",
-            "event_type": "comms",
-            "detail": {
-                "message": message,
-                "channel": "slack",
-            },
-        }
-    )
+def _incident_comms_row(incident: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """The comms timeline row for a new incident's alert (no side effects)."""
+    return {
+        "incident_id": incident["_id"],
+        "ts": now,
+        "actor": "system",
+        "event_type": "comms",
+        "detail": {
+            "message": _incident_message(incident),
+            "channel": "slack",
+        },
+    }
+
+
+def _enqueue_incident_alert(incident: Dict[str, Any]) -> None:
+    """Queue the webhook alert for a stored incident (sent by the alert dispatcher, coalesced per asset)."""
+    message = _incident_message(incident)
+    alert_dispatcher.enqueue({
+        "key": str(incident.get("primary_asset_id")),
+        "label": incident.get("asset_name"),
+        "title": message,
+        "urgent": incident.get("severity") in ("P1", "P2"),
+        "card": {"text": message},
+    })
+
+
+async def send_incident_notification(incident: Dict[str, Any]):     # step 4
+    """
+    Send Slack/Webhook alert and log a comms event to the timeline.
+    """
+    _enqueue_incident_alert(incident)
+    await incident_timeline_col.insert_one(_incident_comms_row(incident, datetime.utcnow()))
 
 
 
@@ -100,6 +112,13 @@ detections_col = db["detections"]  # adjust name if your collection is different
 
 # ---- Config ----
 
+# Detections correlated per round trip, and per run
+RESPOND_BATCH_SIZE = int(os.getenv("RESPOND_BATCH_SIZE", "500"))
+RESPOND_MAX_DETECTIONS = int(os.getenv("RESPOND_MAX_DETECTIONS", "5000"))
+INCIDENT_WINDOW_HOURS = 12
+# Incidents whose SLA status the sweeper flips per update
+SLA_SWEEP_BATCH_SIZE = int(os.getenv("SLA_SWEEP_BATCH_SIZE", "1000"))
+
 SLA_HOURS: Dict[str, int] = {
     "P1": 4,
     "P2": 8,
@@ -117,6 +136,7 @@ INCIDENT_PHASES = [
     "Recovery",
     "Closed",
 ]
+OPEN_PHASES = [p for p in INCIDENT_PHASES if p != "Closed"]
 
 ALLOWED_TRANSITIONS = {
     "Open": {"Triage"},
@@ -127,11 +147,15 @@ ALLOWED_TRANSITIONS = {
 }
 
 
+# Share of the SLA window left when an incident becomes at_risk
+SLA_AT_RISK_REMAINING = 0.25
+
+
 def compute_sla_status(now: datetime, opened_at: datetime, sla_due_at: datetime) -> str:
     """
     Return: "ok" | "at_risk" | "breached"
     - breached: now >= sla_due_at
-    - at_risk: less than 25% of SLA window time remaining
+    - at_risk: less than SLA_AT_RISK_REMAINING of SLA window time remaining
     - ok: otherwise
     """
     total = (sla_due_at - opened_at).total_seconds()
@@ -142,7 +166,7 @@ def compute_sla_status(now: datetime, opened_at: datetime, sla_due_at: datetime)
     if remaining <= 0:
         return "breached"
 
-    if remaining / total < 0.25:
+    if remaining / total < SLA_AT_RISK_REMAINING:
         return "at_risk"
 
     return "ok"
@@ -152,6 +176,11 @@ def severity_to_sla(severity: str) -> timedelta:
     return timedelta(hours=hours)
 
 
+def sla_at_risk_at(opened_at: datetime, sla_due_at: datetime) -> datetime:
+    """The moment compute_sla_status turns "at_risk" (stored so the sweeper can range-query it)."""
+    return opened_at + (sla_due_at - opened_at) * (1 - SLA_AT_RISK_REMAINING)
+
+
 # --------- Helpers for dedup / grouping ---------
 
 
@@ -171,9 +200,13 @@ def _build_dedup_key(det: Dict[str, Any]) -> Dict[str, str]:
     }
 
 
+def _dedup_tuple(dedup_key: Dict[str, str]) -> tuple:
+    return (dedup_key["asset_id"], dedup_key["indicator"], dedup_key["source"])
+
+
 async def find_existing_incident(
     dedup_key: Dict[str, str],
-    window_hours: int = 12,
+    window_hours: int = INCIDENT_WINDOW_HOURS,
 ) -> Optional[Dict[str, Any]]:
     """
     Check if there is an open (non-Closed) incident within the time window
@@ -195,12 +228,11 @@ async def find_existing_incident(
 # --------- Playbook task generation ---------
 
 
-async def _generate_playbook_tasks(incident_id: ObjectId, severity: str) -> None:
+def _playbook_task_docs(incident_id: ObjectId, now: datetime) -> List[Dict[str, Any]]:
     """
     Very simple phase-based tasks for MVP.
     You can change titles later without breaking the rest of the code.
     """
-    now = datetime.utcnow()
     base_due = now + timedelta(hours=2)
 
     templates = [
@@ -227,19 +259,17 @@ async def _generate_playbook_tasks(incident_id: ObjectId, severity: str) -> None
                 "updated_at": now,
             }
         )
+    return docs
+
 
-    if docs:
-        await incident_tasks_col.insert_many(docs)
+async def _generate_playbook_tasks(incident_id: ObjectId, severity: str) -> None:
+    await incident_tasks_col.insert_many(_playbook_task_docs(incident_id, datetime.utcnow()))
 
 
 # --------- Incident creation / attachment ---------
 
 
-async def create_incident_from_detection(det: Dict[str, Any]) -> ObjectId:    # step 6
-    """
-    Create a new incident document from a detection.
-    """
-    now = datetime.utcnow()
+def _new_incident_doc(det: Dict[str, Any], asset: Optional[Dict[str, Any]], now: datetime) -> Dict[str, Any]:
     severity = det.get("severity", "P3")
     dedup_key = _build_dedup_key(det)
 
@@ -251,12 +281,8 @@ async def create_incident_from_detection(det: Dict[str, Any]) -> ObjectId:    #
         or det.get("summary")
         or f"Auto incident for detection {str(det.get('_id'))}"
     )
-    asset = {
-        "owner": "Unknown",
-    }
-    if det.get("asset_id"):
-        asset = await db.assets.find_one({"_id": det.get("asset_id")})
-    incident_doc: Dict[str, Any] = {
+    asset = asset or {"owner": "Unknown"}
+    return {
         "asset_refs": [det.get("asset_id")] if det.get("asset_id") else [],
 
         "title": title,
@@ -268,6 +294,7 @@ async def create_incident_from_detection(det: Dict[str, Any]) -> ObjectId:    #
         "owner": asset.get("owner"),
         "asset_name": asset.get("name"),
         "sla_due_at": sla_due_at,
+        "at_risk_at": sla_at_risk_at(now, sla_due_at),
         "sla_status": sla_status,
         "primary_asset_id": det.get("asset_id"),
         "detection_refs": [det["_id"]],
@@ -284,22 +311,34 @@ async def create_incident_from_detection(det: Dict[str, Any]) -> ObjectId:    #
         },
     }
 
+
+def _timeline_row(incident_id: ObjectId, det: Dict[str, Any], now: datetime, opened: bool) -> Dict[str, Any]:
+    return {
+        "incident_id": incident_id,
+        "ts": now,
+        "actor": "system",
+        "event_type": "opened" if opened else "link_added",
+        "detail": {
+            "note": "Incident auto-opened by Respond agent." if opened else "New detection attached by Respond agent.",
+            "detection_id": str(det["_id"]),
+        },
+    }
+
+
+async def create_incident_from_detection(det: Dict[str, Any]) -> ObjectId:    # step 6
+    """
+    Create a new incident document from a detection.
+    """
+    now = datetime.utcnow()
+    severity = det.get("severity", "P3")
+    asset = await db.assets.find_one({"_id": det.get("asset_id")}) if det.get("asset_id") else None
+    incident_doc = _new_incident_doc(det, asset, now)
+
     result = await incidents_col.insert_one(incident_doc)
     incident_id = result.inserted_id
 
     # Timeline: opened
-    await incident_timeline_col.insert_one(
-        {
-            "incident_id": incident_id,
-            "ts": now,
-            "actor": "system",
-            "event_type": "opened",
-            "detail": {
-                "note": "Incident auto-opened by Respond agent.",
-                "detection_id": str(det["_id"]),
-            },
-        }
-    )
+    await incident_timeline_col.insert_one(_timeline_row(incident_id, det, now, opened=True))
 
     # Generate tasks
     await _generate_playbook_tasks(incident_id, severity)
@@ -339,75 +378,291 @@ async def attach_detection_to_incident(   # step 6
         },
     )
 
-    await incident_timeline_col.insert_one(
-        {
-            "incident_id": incident["_id"],
-            "ts": now,
-            "actor": "system",
-            "event_type": "link_added",
-            "detail": {
-                "note": "New detection attached by Respond agent.",
-                "detection_id": str(det["_id"]),
-            },
-        }
-    )
+    await incident_timeline_col.insert_one(_timeline_row(incident["_id"], det, now, opened=False))
 
 
 # --------- Main Respond Agent function (async) ---------
 
 
-async def run_respond_agent(limit: int = 50) -> Dict[str, int]:
+def correlate_detections(
+    detections: List[Dict[str, Any]],
+    open_incidents: Dict[tuple, Dict[str, Any]],
+) -> tuple:
     """
-    MVP Respond Agent (async):
+    Group a batch of detections by dedup key, in memory.
 
-    - Look for detections that aren't yet linked to an incident
-      (incident_handled != True).
-    - For each detection:
-        * Build dedup key
-        * If existing open incident in window -> attach
-        * Else -> create new incident
-    - Mark detection as handled.
-    - Return counters.
+    Returns (new_keys, attach): new_keys maps each key with no open incident
+    to its detections (the first one opens the incident, the rest join it);
+    attach maps an open incident's _id to the detections joining it.
     """
+    new_keys: Dict[tuple, List[Dict[str, Any]]] = {}
+    attach: Dict[ObjectId, List[Dict[str, Any]]] = {}
+    for det in detections:
+        key = _dedup_tuple(_build_dedup_key(det))
+        existing = open_incidents.get(key)
+        if existing:
+            attach.setdefault(existing["_id"], []).append(det)
+        else:
+            new_keys.setdefault(key, []).append(det)
+    return new_keys, attach
 
-    counters = {
+
+async def _load_open_incidents(keys: List[tuple], now: datetime) -> Dict[tuple, Dict[str, Any]]:
+    """Open incidents in the dedup window for all keys, with one query (oldest wins, like find_one)."""
+    found: Dict[tuple, Dict[str, Any]] = {}
+    if not keys:
+        return found
+    cursor = incidents_col.find(
+        {
+            "status": {"$ne": "Closed"},
+            "opened_at": {"$gte": now - timedelta(hours=INCIDENT_WINDOW_HOURS)},
+            "$or": [
+                {"dedup_key.asset_id": a, "dedup_key.indicator": i, "dedup_key.source": s}
+                for a, i, s in keys
+            ],
+        },
+        {"dedup_key": 1},
+    ).sort("opened_at", 1)
+    async for incident in cursor:
+        found.setdefault(_dedup_tuple(incident["dedup_key"]), incident)
+    return found
+
+
+def new_counters() -> Dict[str, int]:
+    return {
         "incidents_opened": 0,
         "incidents_attached": 0,
         "alerts_sent": 0,           # "notifications", for MVP == opened
         "suppressed_duplicates": 0, # for now == attached
+        "detections_processed": 0,
     }
 
-    # Async cursor -> to_list(...)
-    detections: List[Dict[str, Any]] = await detections_col.find(
-        {"incident_handled": {"$ne": True}}
-    ).to_list(length=limit)
 
-    if not detections:
-        return counters
+async def ensure_incident_handled_flags() -> int:
+    """Set incident_handled=False on detections stored before it was written on insert."""
+    result = await detections_col.update_many(
+        {"incident_handled": {"$exists": False}}, {"$set": {"incident_handled": False}}
+    )
+    return result.modified_count
 
-    for det in detections:
-        dedup_key = _build_dedup_key(det)
-        existing = await find_existing_incident(dedup_key)
 
-        if existing:
-            await attach_detection_to_incident(existing, det)
-            counters["incidents_attached"] += 1
-            counters["suppressed_duplicates"] += 1
-        else:
-            await create_incident_from_detection(det)
-            counters["incidents_opened"] += 1
+# One correlator at a time per process (manual /run and the respond worker)
+_correlate_lock = asyncio.Lock()
 
-        # Mark detection as handled so we don't re-open incidents on next run
-        await detections_col.update_one(
-            {"_id": det["_id"]},
-            {"$set": {"incident_handled": True}},
-        )
 
-    # For MVP: each new incident → one alert
+async def respond_to_detections(detections: List[Dict[str, Any]], counters: Dict[str, int]) -> None:
+    """
+    Correlate one batch and write it with a handful of round trips:
+    assets $in, open-incident $or, incidents insert_many, attach bulk_write,
+    tasks insert_many, timeline insert_many, handled update_many.
+    """
+    async with _correlate_lock:
+        # Skip what the other path handled while this batch waited for the lock
+        pending = set(await detections_col.distinct(
+            "_id", {"_id": {"$in": [d["_id"] for d in detections]}, "incident_handled": False}
+        ))
+        detections = [d for d in detections if d["_id"] in pending]
+        if detections:
+            await _respond_batch(detections, counters)
+    counters["suppressed_duplicates"] = counters["incidents_attached"]
     counters["alerts_sent"] = counters["incidents_opened"]
 
+
+async def _respond_batch(detections: List[Dict[str, Any]], counters: Dict[str, int]) -> None:
+    now = datetime.utcnow()
+    keys = list(dict.fromkeys(_dedup_tuple(_build_dedup_key(d)) for d in detections))
+    new_keys, attach = correlate_detections(detections, await _load_open_incidents(keys, now))
+
+    asset_ids = list({dets[0]["asset_id"] for dets in new_keys.values() if dets[0].get("asset_id")})
+    assets = {a["_id"]: a async for a in db.assets.find({"_id": {"$in": asset_ids}})} if asset_ids else {}
+
+    incidents, timeline, tasks = [], [], []
+    dets_by_incident: Dict[ObjectId, List[Dict[str, Any]]] = {}
+    for dets in new_keys.values():
+        first = dets[0]
+        incident = _new_incident_doc(first, assets.get(first.get("asset_id")), now)
+        incident["_id"] = ObjectId()
+        incident["detection_refs"] = [d["_id"] for d in dets]
+        incidents.append(incident)
+        dets_by_incident[incident["_id"]] = dets
+        timeline.append(_timeline_row(incident["_id"], first, now, opened=True))
+        timeline.extend(_timeline_row(incident["_id"], d, now, opened=False) for d in dets[1:])
+        tasks.extend(_playbook_task_docs(incident["_id"], now))
+        timeline.append(_incident_comms_row(incident, now))
+        counters["incidents_opened"] += 1
+        counters["incidents_attached"] += len(dets) - 1
+
+    attach_ops = []
+    for incident_id, dets in attach.items():
+        attach_ops.append(UpdateOne(
+            {"_id": incident_id},
+            {"$addToSet": {"detection_refs": {"$each": [d["_id"] for d in dets]}}, "$set": {"updated_at": now}},
+        ))
+        timeline.extend(_timeline_row(incident_id, d, now, opened=False) for d in dets)
+        counters["incidents_attached"] += len(dets)
+
+    # An unordered insert stores every incident without a write error
+    insert_error, failed_ids = None, set()
+    if incidents:
+        try:
+            await incidents_col.insert_many(incidents, ordered=False)
+        except BulkWriteError as e:
+            insert_error = e
+            failed_ids = {incidents[err["index"]]["_id"] for err in e.details.get("writeErrors", [])}
+            counters["incidents_opened"] -= len(failed_ids)
+    # Only alert for incidents that were stored
+    for incident in incidents:
+        if incident["_id"] not in failed_ids:
+            _enqueue_incident_alert(incident)
+
+    # Tasks/timeline for stored incidents and attaches are written even when
+    # some inserts failed; otherwise the next run would attach to a stored
+    # incident that never got its playbook tasks or "opened" row
+    if failed_ids:
+        tasks = [t for t in tasks if t["incident_id"] not in failed_ids]
+        timeline = [r for r in timeline if r["incident_id"] not in failed_ids]
+    if attach_ops:
+        await incidents_col.bulk_write(attach_ops, ordered=False)
+    if tasks:
+        await incident_tasks_col.insert_many(tasks, ordered=False)
+    if timeline:
+        await incident_timeline_col.insert_many(timeline, ordered=False)
+
+    # Mark detections as handled so we don't re-open incidents on next run;
+    # those of incidents that failed to insert stay unhandled for a retry
+    unhandled = {d["_id"] for incident_id in failed_ids for d in dets_by_incident[incident_id]}
+    await detections_col.update_many(
+        {"_id": {"$in": [d["_id"] for d in detections if d["_id"] not in unhandled]}},
+        {"$set": {"incident_handled": True}},
+    )
+    if insert_error is not None:
+        raise insert_error
+
+
+async def run_respond_agent(limit: int = RESPOND_MAX_DETECTIONS) -> Dict[str, int]:
+    """
+    MVP Respond Agent (async):
+
+    - Look for detections that aren't yet linked to an incident
+      (incident_handled == False, a partial index), RESPOND_BATCH_SIZE at a
+      time, up to `limit`.
+    - For each batch (see _respond_batch):
+        * Build dedup keys and load matching open incidents in one query
+        * Attach to an open incident in the window, or create a new one;
+          detections sharing a key within the batch join the same new incident
+    - Mark detections as handled.
+    - Return counters.
+    """
+
+    counters = new_counters()
+
+    # Keyset over _id so a batch that failed to be marked is not re-read forever
+    last_id = None
+    processed = 0
+    while processed < limit:
+        query: Dict[str, Any] = {"incident_handled": False}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await detections_col.find(query).sort("_id", 1).limit(min(RESPOND_BATCH_SIZE, limit - processed)).to_list(length=None)
+        if not batch:
+            break
+        await respond_to_detections(batch, counters)
+        processed += len(batch)
+        last_id = batch[-1]["_id"]
+
+    counters["detections_processed"] = processed
+    # For MVP: each new incident → one alert (counted in respond_to_detections)
+    if processed:
+        await response_cache.invalidate("detections")
+
     return counters
 
+# --------- SLA sweep ---------
+
+
+def sla_transitions(now: datetime) -> List[tuple]:
+    """
+    (new_status, filter) pairs for the incidents whose stored sla_status is
+    behind `now`. Each filter is an equality on sla_status/status plus one
+    range on a stored threshold, matching the (sla_status, status, ...) indexes.
+    Breach runs first so an incident past both thresholds goes straight there.
+    """
+    open_ = {"$in": OPEN_PHASES}
+    return [
+        ("breached", {
+            "sla_status": {"$in": ["ok", "at_risk"]},
+            "status": open_,
+            "sla_due_at": {"$lte": now},
+        }),
+        ("at_risk", {
+            "sla_status": "ok",
+            "status": open_,
+            "at_risk_at": {"$lt": now},
+        }),
+    ]
+
+
+async def backfill_sla_thresholds() -> int:
+    """Store at_risk_at on incidents opened before it existed."""
+    result = await incidents_col.update_many(
+        {
+            "at_risk_at": {"$exists": False},
+            "opened_at": {"$type": "date"},
+            "sla_due_at": {"$type": "date"},
+        },
+        [{"$set": {"at_risk_at": {"$add": [
+            "$opened_at",
+            {"$multiply": [{"$subtract": ["$sla_due_at", "$opened_at"]}, 1 - SLA_AT_RISK_REMAINING]},
+        ]}}}],
+    )
+    return result.modified_count
+
+
+async def sweep_sla_status(now: Optional[datetime] = None, limit: int = SLA_SWEEP_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Move open incidents to at_risk/breached as their stored thresholds pass.
+
+    Per transition: read the matching ids (index range, _id/sla_status only),
+    flip them with one update_many, and log an "sla_status" timeline event for
+    each. Up to `limit` incidents per transition; the rest go on the next tick.
+    """
+    now = now or datetime.utcnow()
+    counts: Dict[str, int] = {}
+    timeline: List[Dict[str, Any]] = []
+
+    for new_status, query in sla_transitions(now):
+        rows = await incidents_col.find(query, {"sla_status": 1}).limit(limit).to_list(length=limit)
+        if not rows:
+            counts[new_status] = 0
+            continue
+        ids = [r["_id"] for r in rows]
+        # The range filter stays on so an incident closed meanwhile is left alone
+        result = await incidents_col.update_many(
+            {**query, "_id": {"$in": ids}},
+            {"$set": {"sla_status": new_status, "updated_at": now}},
+        )
+        counts[new_status] = result.modified_count
+        if result.modified_count < len(ids):
+            flipped = set(await incidents_col.distinct(
+                "_id", {"_id": {"$in": ids}, "sla_status": new_status, "updated_at": now}
+            ))
+            rows = [r for r in rows if r["_id"] in flipped]
+        timeline.extend(
+            {
+                "incident_id": r["_id"],
+                "ts": now,
+                "actor": "system",
+                "event_type": "sla_status",
+                "detail": {"from": r.get("sla_status"), "to": new_status},
+            }
+            for r in rows
+        )
+
+    if timeline:
+        await incident_timeline_col.insert_many(timeline, ordered=False)
+    return counts
+
+
 async def update_incident_status(
     incident_id: ObjectId,
     new_status: str,
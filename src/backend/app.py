@@ -4,16 +4,69 @@ from dotenv import load_dotenv
 from agents.identify_agent import fetch_pulses, generate_asset_intel_links
 from agents.osint.otx_client import otx_intel_events
 from agents.DS_agent import query_deepseek
+from db import mongo
+from db.dates import migrate_date_fields
+from db.indexes import index_usage_report
 from db.init_db import init_indexes
+from agents.respond_agent import ensure_incident_handled_flags
+from services.alerts.notifier import alert_dispatcher
+from services.detect_rollups import ensure_detection_rollups
+from services.response_cache import response_cache
+from services.respond_worker import respond_worker
+from services.risk_refresher import risk_refresher
+from services.sla_sweeper import sla_sweeper
 from routers import assets
 from routers import stats, osint, seed, identify, protect, detect, respond, recover, govern, sops, csf
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI(title="SMB Sec Platform", version="0.2.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 🚀 应用启动时执行
+    await mongo.connect()
+    try:
+        await init_indexes()
+    except Exception as e:
+        # A missing index slows queries down but should not keep the API from starting
+        print(f"⚠️ Index reconcile failed: {e}")
+    try:
+        # String/epoch timestamps fall outside the date range filters until converted (idempotent)
+        await migrate_date_fields(mongo.db)
+    except Exception as e:
+        print(f"⚠️ Date field migration failed: {e}")
+    try:
+        await ensure_detection_rollups()
+    except Exception as e:
+        # Dashboards read empty counts until the next rebuild; not worth failing startup
+        print(f"⚠️ Detection rollup backfill failed: {e}")
+    try:
+        # Detections stored before incident_handled was written on insert
+        await ensure_incident_handled_flags()
+    except Exception as e:
+        print(f"⚠️ incident_handled backfill failed: {e}")
+    await alert_dispatcher.start()
+    # Opens incidents as detections arrive (RESPOND_WORKER_ENABLED=true)
+    await respond_worker.start()
+    # Flips incidents to at_risk/breached as their SLA thresholds pass
+    await sla_sweeper.start()
+    # Full asset risk summary pass so the 7/30-day windows age out
+    await risk_refresher.start()
+
+    # yield 相当于应用运行期间
+    yield
+
+    await risk_refresher.stop()
+    await sla_sweeper.stop()
+    await respond_worker.stop()
+    # Send alerts still waiting in a coalescing window
+    await alert_dispatcher.stop()
+    mongo.close()
+
+app = FastAPI(title="SMB Sec Platform", version="0.2.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,19 +80,6 @@ app.add_middleware(
 async def root():
     return {"message": "FastAPI is running"}
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # 🚀 应用启动时执行
-    init_indexes()
-    print("Indexes initialized!")
-
-    # yield 相当于应用运行期间
-    yield
-
-    # # 🛑 应用关闭时（可选）
-    # print("App shutting down...")
-
-# app = FastAPI(lifespan=lifespan)
 
 @app.get("/generate-links")
 async def generate_links():
@@ -49,6 +89,41 @@ async def generate_links():
 def health():
     return {"version": "1.0", "status": "healthy"}
 
+@app.get("/health/db")
+async def health_db():
+    result = await mongo.health()
+    if not result["ok"]:
+        return JSONResponse(status_code=503, content=result)
+    return result
+
+@app.get("/health/db/pool")
+def health_db_pool():
+    return mongo.pool_stats()
+
+@app.get("/health/db/indexes")
+async def health_db_indexes():
+    """Declared indexes that are missing, and indexes unused since the server started ($indexStats)."""
+    try:
+        return await index_usage_report(mongo.db)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"ok": False, "error": str(e)})
+
+@app.get("/health/cache")
+def health_cache():
+    return response_cache.stats
+
+@app.get("/health/respond-worker")
+def health_respond_worker():
+    return respond_worker.status()
+
+@app.get("/health/sla-sweeper")
+def health_sla_sweeper():
+    return sla_sweeper.status()
+
+@app.get("/health/risk-refresher")
+def health_risk_refresher():
+    return risk_refresher.status()
+
 @app.get("/version")
 def version():
     return {"version": "Week2-Skeleton"}
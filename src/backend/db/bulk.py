@@ -0,0 +1,100 @@
+import logging
+import os
+from typing import Any, Dict, List
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+DUPLICATE_KEY = 11000
+
+
+class BulkWriter:
+    """
+    Collects write operations (UpdateOne, InsertOne, ...) for one collection
+    and sends them as unordered bulk_write batches of `batch_size`.
+
+    Failed operations are logged. Duplicate-key errors are only counted
+    (e.g. racing upserts, re-seeded rows); any other write error re-raises
+    the BulkWriteError once the batch's counts are recorded, so callers do
+    not move on as if the batch had been written.
+
+    Usage:
+        async with BulkWriter(db["asset_intel_links"]) as writer:
+            await writer.add(UpdateOne(...))
+        writer.batches  # per-batch counts
+    """
+
+    def __init__(self, collection, batch_size: int = BULK_BATCH_SIZE):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.ops: List[Any] = []
+        self.batches: List[Dict[str, int]] = []
+
+    async def __aenter__(self) -> "BulkWriter":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.flush()
+
+    async def add(self, op) -> None:
+        """Queue one operation; flushes automatically when the batch is full."""
+        self.ops.append(op)
+        if len(self.ops) >= self.batch_size:
+            ops, self.ops = self.ops, []
+            await self._write(ops)
+
+    async def extend(self, ops) -> None:
+        for op in ops:
+            await self.add(op)
+
+    async def flush(self) -> List[Dict[str, int]]:
+        """Write whatever is still queued and return the per-batch counts so far."""
+        if self.ops:
+            ops, self.ops = self.ops, []
+            await self._write(ops)
+        return self.batches
+
+    async def _write(self, ops: List[Any]) -> None:
+        try:
+            result = await self.collection.bulk_write(ops, ordered=False)
+            counts = {
+                "ops": len(ops),
+                "inserted": result.inserted_count,
+                "matched": result.matched_count,
+                "modified": result.modified_count,
+                "upserted": result.upserted_count,
+                "errors": 0,
+            }
+        except BulkWriteError as e:
+            # Unordered: every op without an error was still applied
+            details = e.details
+            errors = details.get("writeErrors", [])
+            self.batches.append({
+                "ops": len(ops),
+                "inserted": details.get("nInserted", 0),
+                "matched": details.get("nMatched", 0),
+                "modified": details.get("nModified", 0),
+                "upserted": details.get("nUpserted", 0),
+                "errors": len(errors),
+            })
+            fatal = [err for err in errors if err.get("code") != DUPLICATE_KEY]
+            logger.warning(
+                "bulk_write to %s: %d of %d ops failed (%d duplicate keys); first error: %s",
+                getattr(self.collection, "name", "?"), len(errors), len(ops), len(errors) - len(fatal),
+                (fatal or errors or [{}])[0].get("errmsg"),
+            )
+            if fatal or details.get("writeConcernErrors"):
+                raise
+            return
+        self.batches.append(counts)
+
+    def totals(self) -> Dict[str, int]:
+        """Sum of the per-batch counts."""
+        out = {"batches": len(self.batches)}
+        for batch in self.batches:
+            for k, v in batch.items():
+                out[k] = out.get(k, 0) + v
+        return out
@@ -0,0 +1,104 @@
+import logging
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Timestamp fields that are range-queried, by collection
+DATE_FIELDS = {
+    "intel_events": ("created_at",),
+    "detections": ("first_seen", "last_seen"),
+}
+
+
+# ---------------------------
+# Write path
+# ---------------------------
+def to_utc_datetime(value: Any) -> Optional[datetime]:
+    """
+    Coerce a timestamp to the naive-UTC datetime pymongo stores as a BSON date.
+
+    Accepts datetimes (aware ones are converted to UTC), dates, ISO 8601
+    strings ("...Z", "+hh:mm", date-only) and epoch seconds. Returns None for
+    empty values and raises ValueError for anything else.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, date):
+        dt = datetime(value.year, value.month, value.day)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        dt = datetime.fromtimestamp(value, tz=timezone.utc)
+    elif isinstance(value, str):
+        text = value.strip()
+        if text.endswith(("Z", "z")):
+            text = text[:-1] + "+00:00"
+        dt = datetime.fromisoformat(text)
+    else:
+        raise ValueError(f"Unsupported timestamp: {value!r}")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def normalize_dates(doc: Dict[str, Any], fields: Iterable[str] = ("created_at",)) -> Dict[str, Any]:
+    """Convert the given timestamp fields of `doc` in place; unparseable values are left as-is and logged."""
+    for field in fields:
+        if field in doc:
+            try:
+                doc[field] = to_utc_datetime(doc[field])
+            except ValueError:
+                logger.warning("Leaving unparseable %s=%r as-is", field, doc[field])
+    return doc
+
+
+# ---------------------------
+# Read path
+# ---------------------------
+def time_range(field: str, since: Any = None, until: Any = None) -> Dict[str, Any]:
+    """
+    Plain range predicate {field: {"$gte": since, "$lt": until}} on BSON dates,
+    which an index on `field` serves as a range scan (unlike $expr).
+    """
+    bounds = {}
+    if since is not None:
+        bounds["$gte"] = to_utc_datetime(since)
+    if until is not None:
+        bounds["$lt"] = to_utc_datetime(until)
+    return {field: bounds} if bounds else {}
+
+
+# ---------------------------
+# Migration
+# ---------------------------
+async def migrate_date_fields(db, collections: Dict[str, Iterable[str]] = DATE_FIELDS) -> Dict[str, Dict[str, int]]:
+    """
+    Rewrite string and epoch-number timestamps as BSON dates, server-side with
+    one pipeline update per field (no documents are pulled into Python).
+
+    Strings that $dateFromString cannot parse are left untouched and counted
+    as "unparsed". Safe to re-run: only non-date values are matched.
+    """
+    report = {}
+    for name, fields in collections.items():
+        for field in fields:
+            ref = f"${field}"
+            strings = await db[name].update_many(
+                {field: {"$type": "string"}},
+                [{"$set": {field: {"$dateFromString": {"dateString": ref, "onError": ref}}}}],
+            )
+            # Epoch seconds (seed files); $toDate expects milliseconds
+            numbers = await db[name].update_many(
+                {field: {"$type": ["int", "long", "double"]}},
+                [{"$set": {field: {"$toDate": {"$multiply": [ref, 1000]}}}}],
+            )
+            unparsed = await db[name].count_documents({field: {"$type": "string"}})
+            report[f"{name}.{field}"] = {
+                "strings_converted": strings.modified_count,
+                "numbers_converted": numbers.modified_count,
+                "unparsed": unparsed,
+            }
+            if unparsed:
+                logger.warning("%s.%s: %d values could not be parsed as dates", name, field, unparsed)
+    return report
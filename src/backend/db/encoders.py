@@ -0,0 +1,41 @@
+import base64
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+
+
+def bson_default(obj: Any) -> Any:
+    """
+    json.dumps `default` hook for the BSON types Motor returns.
+
+    json's C encoder handles dicts/lists/str/numbers itself and only calls
+    this for the rest, so documents are serialized in one pass instead of
+    walking them to stringify ObjectIds first.
+    """
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, (Decimal, uuid.UUID)):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bson(obj: Any) -> str:
+    return json.dumps(obj, default=bson_default, separators=(",", ":"))
+
+
+class BSONResponse(JSONResponse):
+    """JSONResponse that accepts raw Mongo documents (ObjectId, datetime, Decimal128)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bson(content).encode("utf-8")
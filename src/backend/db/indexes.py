@@ -0,0 +1,199 @@
+import logging
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from agents.DS_agent import SEVERITY_CACHE_TTL_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Options that make two indexes on the same keys different
+_INDEX_OPTIONS = ("unique", "partialFilterExpression", "expireAfterSeconds", "sparse", "weights")
+
+
+def _ix(*keys, **options) -> Dict[str, Any]:
+    return {"keys": list(keys), "options": options}
+
+
+# Every index the routers/agents rely on, by collection.
+# Key patterns are matched against what exists, so indexes created earlier
+# under other names (e.g. by scripts/setup_db_week7) count as present.
+INDEXES: Dict[str, List[Dict[str, Any]]] = {
+    "assets": [
+        _ix(("ip", ASCENDING)),
+        _ix(("hostname", ASCENDING)),
+        _ix(("asset_id", ASCENDING)),  # recover residual_risk
+    ],
+    "asset_intel_links": [
+        _ix(
+            ("asset_id", ASCENDING), ("intel_id", ASCENDING),
+            unique=True,
+            partialFilterExpression={"asset_id": {"$exists": True}, "intel_id": {"$exists": True}},
+        ),
+        _ix(("intel_id", ASCENDING)),  # remaining links of an intel event (unlink_asset)
+    ],
+    "asset_risk_summary": [
+        _ix(("risk_score", DESCENDING)),  # top-risky sorted scan
+    ],
+    "intel_events": [
+        _ix(("indicator_type", ASCENDING), ("indicator", ASCENDING)),  # asset-scoped linking
+        _ix(("created_at", DESCENDING)),  # detect window, recent events
+        # Pulse dedup: (source, pulse id, indicator) fingerprint; older events have none
+        _ix(("fingerprint", ASCENDING), unique=True, partialFilterExpression={"fingerprint": {"$exists": True}}),
+    ],
+    "severity_cache": [
+        # LLM severity cache: expire by age, evict least-recently-used past the cap
+        _ix(("created_at", ASCENDING), expireAfterSeconds=SEVERITY_CACHE_TTL_DAYS * 86400),
+        _ix(("last_used_at", ASCENDING)),
+    ],
+    "detections": [
+        _ix(("asset_id", ASCENDING), ("last_seen", DESCENDING)),  # recent per asset
+        _ix(("asset_id", ASCENDING), ("indicator", ASCENDING), ("source", ASCENDING)),  # dedup key
+        _ix(("last_seen", DESCENDING)),  # list sort, lastDay, trend
+        _ix(("source", ASCENDING), ("last_seen", DESCENDING)),  # source prefix filter
+        _ix(("severity", DESCENDING), ("last_seen", DESCENDING)),  # high-sev: sort severity -1, last_seen -1
+        _ix(("indicator", ASCENDING)),
+        _ix(("ttp", ASCENDING)),
+        # Respond catch-up/polling: only unhandled detections, in _id order
+        _ix(
+            ("incident_handled", ASCENDING), ("_id", ASCENDING),
+            partialFilterExpression={"incident_handled": False},
+        ),
+    ],
+    "detection_rollups": [
+        # Upsert key; reads filter granularity + bucket range (dashboard trend / 24h)
+        _ix(
+            ("granularity", ASCENDING), ("bucket", ASCENDING),
+            ("source", ASCENDING), ("severity", ASCENDING), ("asset_id", ASCENDING),
+            unique=True,
+        ),
+    ],
+    "risk_items": [
+        _ix(("asset_id", ASCENDING), ("title", ASCENDING)),  # upsert key
+        _ix(("asset_id", ASCENDING), ("due", ASCENDING)),  # per-asset panel
+        _ix(("status", ASCENDING)),
+    ],
+    "incidents": [
+        _ix(
+            ("status", ASCENDING),
+            ("dedup_key.asset_id", ASCENDING), ("dedup_key.indicator", ASCENDING), ("dedup_key.source", ASCENDING),
+            ("opened_at", DESCENDING),
+        ),
+        _ix(("opened_at", DESCENDING)),  # incident list
+        # getIncidents search: ranked $text over the fields the old regexes scanned
+        _ix(
+            ("title", TEXT), ("summary", TEXT), ("owner", TEXT),
+            name="incident_text", weights={"title": 10, "owner": 5, "summary": 2},
+        ),
+        # SLA sweeper ranges; an sla_status-only dashboard filter uses their prefix
+        _ix(("sla_status", ASCENDING), ("status", ASCENDING), ("at_risk_at", ASCENDING)),
+        _ix(("sla_status", ASCENDING), ("status", ASCENDING), ("sla_due_at", ASCENDING)),
+    ],
+    "incident_timeline": [
+        _ix(("incident_id", ASCENDING), ("ts", ASCENDING)),
+    ],
+    # Incident detail reads each child list in display order
+    "incident_tasks": [
+        _ix(("incident_id", ASCENDING), ("order", ASCENDING)),
+    ],
+    "incident_evidence": [
+        _ix(("incident_id", ASCENDING), ("submitted_at", ASCENDING)),
+    ],
+    "restore_tests": [
+        _ix(("asset_id", ASCENDING), ("test_completed_at", DESCENDING)),  # latest test per asset
+    ],
+    "resilience_findings": [
+        _ix(("asset_id", ASCENDING), ("type", ASCENDING), ("status", ASCENDING)),  # finding upsert key
+    ],
+    "controls": [
+        _ix(("control_id", ASCENDING)),
+    ],
+    "policy_assignments": [
+        _ix(("asset_id", ASCENDING)),
+        _ix(("control_id", ASCENDING)),
+    ],
+    "control_evidence": [
+        _ix(("control_assignment_id", ASCENDING)),
+    ],
+}
+
+
+def _key_pattern(keys) -> tuple:
+    # The server may report 1.0 for 1; "2dsphere" etc. stay as-is. Text fields
+    # are reported as ("_fts", "text"), ("_ftsx", 1), with the fields in weights.
+    pattern = []
+    for field, direction in keys:
+        if direction == TEXT or field in ("_fts", "_ftsx"):
+            if ("_fts", TEXT) not in pattern:
+                pattern += [("_fts", TEXT), ("_ftsx", 1)]
+            continue
+        pattern.append((field, int(direction) if isinstance(direction, (int, float)) else direction))
+    return tuple(pattern)
+
+
+async def reconcile_indexes(db) -> Dict[str, Dict[str, list]]:
+    """
+    Create every declared index that is missing (idempotent; one createIndexes
+    call per collection). Nothing is dropped: indexes that exist with other
+    options are reported as conflicts, undeclared ones as extra.
+    """
+    report = {}
+    for name, specs in INDEXES.items():
+        existing = await db[name].index_information()
+        by_keys = {_key_pattern(info["key"]): (ix_name, info) for ix_name, info in existing.items()}
+
+        to_create, result = [], {"created": [], "present": [], "conflicts": [], "extra": []}
+        declared = set()
+        for spec in specs:
+            keys = _key_pattern(spec["keys"])
+            declared.add(keys)
+            found = by_keys.get(keys)
+            if found is None:
+                to_create.append(IndexModel(spec["keys"], **spec["options"]))
+                continue
+            ix_name, info = found
+            if any(info.get(opt) != spec["options"].get(opt) for opt in _INDEX_OPTIONS):
+                result["conflicts"].append(ix_name)
+            else:
+                result["present"].append(ix_name)
+
+        if to_create:
+            try:
+                result["created"] = await db[name].create_indexes(to_create)
+            except OperationFailure:
+                # e.g. a unique index over existing duplicates, or a second text index:
+                # create the rest one at a time so a single bad spec does not block them
+                for model in to_create:
+                    try:
+                        result["created"] += await db[name].create_indexes([model])
+                    except OperationFailure as e:
+                        logger.error("Creating index %s on %s failed: %s", model.document["name"], name, e)
+                        result.setdefault("errors", []).append(str(e))
+
+        result["extra"] = [ix for keys, (ix, _) in by_keys.items() if keys not in declared and ix != "_id_"]
+        report[name] = result
+    return report
+
+
+async def index_usage_report(db) -> Dict[str, Dict[str, list]]:
+    """
+    Per collection, from $indexStats: declared indexes that are missing, and
+    existing indexes with no recorded use since the server last started.
+    """
+    report = {}
+    for name, specs in INDEXES.items():
+        stats = await db[name].aggregate([{"$indexStats": {}}]).to_list(length=None)
+        present = {_key_pattern(s["key"].items()) for s in stats}
+        report[name] = {
+            "missing": [
+                "_".join(f"{f}_{d}" for f, d in _key_pattern(spec["keys"]))
+                for spec in specs if _key_pattern(spec["keys"]) not in present
+            ],
+            "unused": [
+                {"name": s["name"], "since": s["accesses"]["since"]}
+                for s in stats if s["name"] != "_id_" and s["accesses"]["ops"] == 0
+            ],
+            "ops": {s["name"]: s["accesses"]["ops"] for s in stats},
+        }
+    return report
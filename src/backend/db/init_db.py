@@ -1,22 +1,18 @@
-from db.mongo import db
+import asyncio
 
-def init_indexes():
-    db["assets"].create_index("ip")
-    db["assets"].create_index("hostname")
+from db.indexes import reconcile_indexes
+from db.mongo import db
 
-    # ✅ 改进版：添加部分过滤条件
-    db["asset_intel_links"].create_index(
-        [("asset_id", 1), ("intel_id", 1)],
-        unique=True,
-        partialFilterExpression={"asset_id": {"$exists": True}, "intel_id": {"$exists": True}}
-    )
-    
-    db.detections.create_index([("asset_id", 1), ("last_seen", -1)])  # Recent per asset
-    db.detections.create_index("indicator")
-    db.detections.create_index("ttp")
-    db.detections.create_index([("asset_id", 1), ("indicator", 1), ("source", 1)])  # Dedup key
 
-    print("✅ MongoDB indexes initialized successfully.")
+async def init_indexes() -> dict:
+    """Create any missing index declared in db/indexes.py; returns the per-collection report."""
+    report = await reconcile_indexes(db)
+    created = sum(len(r["created"]) for r in report.values())
+    conflicts = {name: r["conflicts"] for name, r in report.items() if r["conflicts"]}
+    print(f"✅ MongoDB indexes initialized successfully ({created} created).")
+    if conflicts:
+        print(f"⚠️ Indexes with the right keys but different options (left as-is): {conflicts}")
+    return report
 
 if __name__ == "__main__":
-    init_indexes()
+    asyncio.run(init_indexes())
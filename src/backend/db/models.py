@@ -143,6 +143,7 @@ class Detection(BaseModel):
     hit_count: int = 1
     analyst_note: str  # ≤240 chars
     raw_ref: dict  # e.g., {"intel_ids": ["id1"]}
+    incident_handled: bool = False  # set by the respond agent once correlated
     
     model_config = {
         "populate_by_name": True,
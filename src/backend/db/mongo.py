@@ -1,6 +1,150 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, monitoring
 import os
+import threading
+import time
 
-MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGO_URL)
-db = client["smbsec"]
+MONGO_URL = os.getenv("MONGO_URL") or os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "smbsec")
+
+# Connection pool (shared by every request on this process)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+# The sync client only serves thread-pool code (sync routes, scripts), so it stays small
+MONGO_SYNC_MAX_POOL_SIZE = int(os.getenv("MONGO_SYNC_MAX_POOL_SIZE", "20"))
+
+
+class _PoolMonitor(monitoring.ConnectionPoolListener):
+    """Per-server connection counters fed by the driver's pool events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools = {}
+
+    def _bump(self, event, **deltas):
+        with self._lock:
+            pool = self.pools.setdefault(
+                f"{event.address[0]}:{event.address[1]}",
+                {"open": 0, "in_use": 0, "created": 0, "closed": 0, "checkout_failed": 0, "cleared": 0},
+            )
+            for key, delta in deltas.items():
+                pool[key] += delta
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self.pools.items()}
+
+    def pool_created(self, event):
+        self._bump(event)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump(event, checkout_failed=1)
+
+    def connection_checked_out(self, event):
+        self._bump(event, in_use=1)
+
+    def connection_checked_in(self, event):
+        self._bump(event, in_use=-1)
+
+
+pool_monitor = _PoolMonitor()
+_sync_pool_monitor = _PoolMonitor()
+
+_CLIENT_OPTIONS = dict(
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+)
+
+# Motor connects lazily, so importing this module does no I/O
+client = AsyncIOMotorClient(
+    MONGO_URL, maxPoolSize=MONGO_MAX_POOL_SIZE, event_listeners=[pool_monitor], **_CLIENT_OPTIONS
+)
+db = client[DB_NAME]
+
+_sync_client = None
+_sync_lock = threading.Lock()
+
+
+def get_sync_db():
+    """
+    Shared pymongo database for code that already runs in a worker thread
+    (sync FastAPI routes, CLI scripts). Created once, on first use.
+    """
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is None:
+            _sync_client = MongoClient(
+                MONGO_URL,
+                maxPoolSize=MONGO_SYNC_MAX_POOL_SIZE,
+                event_listeners=[_sync_pool_monitor],
+                **{**_CLIENT_OPTIONS, "minPoolSize": 0},
+            )
+    return _sync_client[DB_NAME]
+
+
+async def connect() -> None:
+    """Fail fast at startup if MongoDB is unreachable (also opens the first pooled connections)."""
+    await client.admin.command("ping")
+
+
+def close() -> None:
+    global _sync_client
+    client.close()
+    with _sync_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
+
+
+async def health() -> dict:
+    start = time.perf_counter()
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2), "db": DB_NAME}
+
+
+def pool_stats() -> dict:
+    return {
+        "config": {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "max_idle_time_ms": MONGO_MAX_IDLE_TIME_MS,
+            "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "sync_max_pool_size": MONGO_SYNC_MAX_POOL_SIZE,
+        },
+        "servers": pool_monitor.snapshot(),
+        "sync_client_open": _sync_client is not None,
+        "sync_servers": _sync_pool_monitor.snapshot(),
+    }
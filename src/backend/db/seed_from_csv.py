@@ -2,8 +2,12 @@ import csv
 import json
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne
 import os
 
+from db.bulk import BulkWriter
+from db.dates import DATE_FIELDS, normalize_dates
+
 MONGO_URI = "mongodb://localhost:27017"
 DB_NAME = "smbsec"
 
@@ -53,13 +57,30 @@ FIELD_MAP = {
     # },
 }
 
+INT_FIELDS = {"criticality", "severity", "likelihood", "impact"}
+
+
+def normalize_ints(doc):
+    """
+    Store numeric CSV columns as ints (in place), like the OTX/detect writers do.
+    Mixed string/int values compare wrongly in Mongo ($max, sorts, ranges).
+    """
+    for key in INT_FIELDS & doc.keys():
+        if isinstance(doc[key], str):
+            try:
+                doc[key] = int(doc[key])
+            except ValueError:
+                pass
+    return doc
+
+
 # ✅ 类型转换规则（按字段名自动转换）
 def normalize_value(key, value):
     if value == "" or value is None:
         return None
 
     # 整型字段
-    if key in {"criticality", "severity", "likelihood", "impact"}:
+    if key in INT_FIELDS:
         try:
             return int(value)
         except ValueError:
@@ -99,14 +120,22 @@ async def import_csv_to_mongo(collection_name, file_path):
             # await db[collection_name].insert_many(rows)
             # print(f"✅ Imported {len(rows)} records into '{collection_name}' collection.")
 
-            data = [row for row in reader]
-            if not data:
+            first = next(reader, None)
+            if first is None:
                 print(f"⚠️ {file_path} is empty, skipping.")
                 return
             # 插入前清空旧数据（避免重复）
             await db[collection_name].delete_many({})
-            await db[collection_name].insert_many(data)
-            print(f"✅ Imported {len(data)} records into '{collection_name}' collection.")
+            # Stream rows into unordered bulk batches instead of one big insert_many
+            # (CSV timestamps become BSON dates so time-window queries can use the index,
+            # severity/criticality become ints so they compare with OTX intel)
+            date_fields = DATE_FIELDS.get(collection_name, ())
+            async with BulkWriter(db[collection_name]) as writer:
+                await writer.add(InsertOne(normalize_dates(normalize_ints(first), date_fields)))
+                for row in reader:
+                    await writer.add(InsertOne(normalize_dates(normalize_ints(row), date_fields)))
+            totals = writer.totals()
+            print(f"✅ Imported {totals['inserted']} records into '{collection_name}' collection ({totals['batches']} batches).")
 
     except FileNotFoundError:
         print(f"❌ File not found: {file_path}")
@@ -1,16 +1,20 @@
 from datetime import datetime, timedelta
 import csv
-import io
-import json
 import os
+from typing import Optional
 
 from bson import ObjectId
 from dotenv import load_dotenv
 from fastapi import APIRouter, HTTPException, UploadFile, File, Query
 from fastapi.params import Body
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from agents.identify_agent import infer_type, crit_from_sens, generate_asset_intel_links
+from agents.identify_agent import infer_type, crit_from_sens, generate_asset_intel_links, unlink_asset
+from db.dates import time_range
+from db.encoders import dumps_bson
 from db.mongo import db
+from services.response_cache import cached_response, response_cache
+from services.asset_import import import_asset_rows, iter_csv_rows, iter_json_rows
 
 load_dotenv()
 
@@ -44,7 +48,8 @@ async def create_asset(asset: dict):
         asset["criticality"] = crit_from_sens(asset.get("data_sensitivity"))
     result = await db["assets"].insert_one(asset)
     asset["_id"] = str(result.inserted_id)
-    await generate_asset_intel_links()
+    await generate_asset_intel_links(asset_ids=[result.inserted_id])
+    await response_cache.invalidate("assets")
 
     return {"message": "Asset created successfully", "data": asset}
 
@@ -74,58 +79,95 @@ async def edit_asset(updated_asset: dict = Body(...)):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Asset not found")
 
-    # Optionally regenerate links if key fields changed
-    await generate_asset_intel_links()
+    # Relink this asset only; drop stale links if the match keys changed
+    if (existing.get("ip"), existing.get("hostname")) != (updated_asset.get("ip"), updated_asset.get("hostname")):
+        await unlink_asset(_id)
+    await generate_asset_intel_links(asset_ids=[_id])
+    await response_cache.invalidate("assets")
 
     serialize_asset(updated_asset)
     return {"message": "Asset updated successfully", "data": updated_asset}
 
-@router.get("/", response_model=dict)
-async def list_assets():
-    days_ago = datetime.utcnow() - timedelta(days=7 * TIME_MULTIPLIER)
-    pipeline = [
-        # Lookup bridge table links
-        {'$lookup': {
-            'from': 'asset_intel_links',
-            'localField': '_id',
-            'foreignField': 'asset_id',
-            'as': 'links'
-        }},
-        {'$unwind': {'path': '$links', 'preserveNullAndEmptyArrays': True}},
-        
-        # Lookup linked intel events
-        {'$lookup': {
-            'from': 'intel_events',
-            'let': {'intel_id': '$links.intel_id'},
-            'pipeline': [
-                {'$match': {'$expr': {'$and': [
-                    {'$eq': ['$_id', '$$intel_id']},
-                    {'$gte': ['$created_at', days_ago.isoformat() + 'Z']}
-                ]}}},
-                {'$project': {'severity': 1, '_id': 0}}
-            ],
-            'as': 'intel_event'
-        }},
-        {'$unwind': {'path': '$intel_event', 'preserveNullAndEmptyArrays': True}},        
-        # Group all severities under each asset
-        {'$group': {
-            "_id": "$_id",
-            "org": {"$first": "$org"},
-            "owner": {"$first": "$owner"},
-            "business_unit": {"$first": "$business_unit"},
-            "criticality": {"$first": "$criticality"},
-            "data_sensitivity": {"$first": "$data_sensitivity"},
-            "name": {"$first": "$name"},
-            "type": {"$first": "$type"},
-            "ip": {"$first": "$ip"},
-            "hostname": {"$first": "$hostname"},
-            'intel_events': {'$push': '$intel_event.severity'}
-        }},
-    ]
-    assets = [x async for x in db["assets"].aggregate(pipeline)]
+_LIST_FIELDS = ["org", "owner", "business_unit", "criticality", "data_sensitivity", "name", "type", "ip", "hostname"]
+ASSET_PAGE_BATCH_SIZE = int(os.getenv("ASSET_PAGE_BATCH_SIZE", "500"))
+
+
+async def _attach_risk(assets: list) -> None:
+    """Set intel_events from asset_risk_summary with one $in query per batch."""
+    summaries = {
+        s["_id"]: s
+        async for s in db["asset_risk_summary"].find(
+            {"_id": {"$in": [a["_id"] for a in assets]}}, {"max_sev_7d": 1}
+        )
+    }
     for asset in assets:
-        asset["_id"] = str(asset["_id"])
-    return {"count": len(assets), "data": assets}
+        max_sev = summaries.get(asset["_id"], {}).get("max_sev_7d", 0)
+        asset["intel_events"] = [max_sev] if max_sev else []
+
+
+async def _iter_asset_batches(query: dict, fields: list, limit: Optional[int], with_risk: bool):
+    """Yield serialized assets in _id order, ASSET_PAGE_BATCH_SIZE at a time."""
+    # An empty projection would return every field; fields=_id / intel_events only need _id
+    projection = {f: 1 for f in fields} or {"_id": 1}
+    cursor = db["assets"].find(query, projection).sort("_id", 1).batch_size(ASSET_PAGE_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+    batch = []
+    async for asset in cursor:
+        batch.append(asset)
+        if len(batch) >= ASSET_PAGE_BATCH_SIZE:
+            if with_risk:
+                await _attach_risk(batch)
+            yield [serialize_asset(a) for a in batch]
+            batch = []
+    if batch:
+        if with_risk:
+            await _attach_risk(batch)
+        yield [serialize_asset(a) for a in batch]
+
+
+@router.get("/", response_model=dict)
+async def list_assets(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (omit for all assets)"),
+    after: Optional[str] = Query(None, description="Keyset cursor: return assets with _id after this one"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (default: all list fields)"),
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$", description="ndjson streams one asset per line"),
+):
+    """
+    Assets with their 7-day risk, read from the asset_risk_summary collection.
+    intel_events keeps its old shape (list of 7-day severities); it now holds
+    just the max, which is all the list view uses.
+
+    Pages are keyset-paginated on _id: pass the returned next_after as `after`
+    to get the following page. format=ndjson streams the result instead of
+    building one JSON body.
+    """
+    query = {}
+    if after:
+        try:
+            query["_id"] = {"$gt": ObjectId(after)}
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    selected = _LIST_FIELDS + ["intel_events"]
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(selected) - set(_LIST_FIELDS) - {"_id", "intel_events"}
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    with_risk = "intel_events" in selected
+    projection = [f for f in selected if f in _LIST_FIELDS]
+    batches = _iter_asset_batches(query, projection, limit, with_risk)
+
+    if fmt == "ndjson":
+        async def ndjson():
+            async for batch in batches:
+                yield "".join(dumps_bson(a) + "\n" for a in batch)
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    assets = [a async for batch in batches for a in batch]
+    next_after = assets[-1]["_id"] if limit and len(assets) == limit else None
+    return {"count": len(assets), "data": assets, "next_after": next_after}
 
 @router.get("/{asset_id}", response_model=dict)
 async def get_asset(asset_id: str):
@@ -135,56 +177,30 @@ async def get_asset(asset_id: str):
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid asset id")
 
-    days_ago = datetime.now() - timedelta(days=30 * TIME_MULTIPLIER)
-
-    pipeline = [
-        {"$match": {"_id": _id}},
-        {"$lookup": {
-            "from": "asset_intel_links",
-            "localField": "_id",
-            "foreignField": "asset_id",
-            "as": "links"
-        }},
-        {"$unwind": {"path": "$links", "preserveNullAndEmptyArrays": True}},
-        {"$lookup": {
-            "from": "intel_events",
-            "let": {"intel_id": "$links.intel_id"},
-            "pipeline": [
-                {"$match": {"$expr": {
-                    "$and": [
-                        {"$eq": ["$_id", "$$intel_id"]},
-                        {"$gte": ["$created_at", days_ago.isoformat() + "Z"]}
-                    ]
-                }}}
-            ],
-            "as": "intel_event"
-        }},
-        {"$unwind": {"path": "$intel_event", "preserveNullAndEmptyArrays": True}},
-        {"$group": {
-            "_id": "$_id",
-            "org": {"$first": "$org"},
-            "owner": {"$first": "$owner"},
-            "business_unit": {"$first": "$business_unit"},
-            "criticality": {"$first": "$criticality"},
-            "data_sensitivity": {"$first": "$data_sensitivity"},
-            "name": {"$first": "$name"},
-            "type": {"$first": "$type"},
-            "ip": {"$first": "$ip"},
-            "hostname": {"$first": "$hostname"},
-            "intel_events": {"$push": "$intel_event"}
-        }}
-    ]
-    results = [x async for x in db.assets.aggregate(pipeline)]
-    single_asset = results[0] if results else None
+    single_asset = await db["assets"].find_one({"_id": _id}, {f: 1 for f in _LIST_FIELDS})
+    if not single_asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+
+    # 2) Linked intel from the last 30 days (asset_id index on links, _id lookup on intel)
+    days_ago = datetime.utcnow() - timedelta(days=30 * TIME_MULTIPLIER)
+    intel_ids = [link["intel_id"] async for link in db["asset_intel_links"].find({"asset_id": _id}, {"intel_id": 1})]
+    single_asset["intel_events"] = [
+        event async for event in db["intel_events"].find({
+            "_id": {"$in": intel_ids},
+            **time_range("created_at", since=days_ago),
+        })
+    ] if intel_ids else []
 
     single_asset["_id"] = str(single_asset["_id"])
-    for event in single_asset.get("intel_events", []):
+    for event in single_asset["intel_events"]:
         event["_id"] = str(event["_id"])
-        event["asset_id"] = str(event["asset_id"])
-    
-    
+        # Unset when the intel lost its last link
+        event["asset_id"] = str(event["asset_id"]) if event.get("asset_id") else None
+
+    # 3) Risk from the materialized summary (max over the same 30-day window shown above)
+    summary = await db["asset_risk_summary"].find_one({"_id": _id}) or {}
     crit = int(single_asset["criticality"])
-    max_sev = int(max((ie["severity"] for ie in single_asset["intel_events"]), default=0))
+    max_sev = int(summary.get("max_sev_30d", 0))
     risk = {
             "score": crit * max_sev,
             "explain": f"criticality ({crit}) × intel event ({max_sev})",
@@ -204,6 +220,8 @@ async def delete_asset(asset_id: str):
         raise HTTPException(status_code=404, detail="Asset not found")
     # Delete all links for this asset
     result = await db["asset_intel_links"].delete_many({"asset_id": asset_id})
+    await db["asset_risk_summary"].delete_one({"_id": ObjectId(asset_id)})
+    await response_cache.invalidate("assets")
 
     return {"message": "Asset deleted successfully"}
 
@@ -211,132 +229,86 @@ async def delete_asset(asset_id: str):
 # ---------------------------
 # 批量导入功能
 # ---------------------------
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+
 @router.post("/import", response_model=dict)
 async def import_assets(
     file: UploadFile = File(...),
     dry_run: bool = Query(False, description="If true, only validate without inserting"),
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$", description="ndjson streams one progress line per chunk"),
 ):
     """
     批量导入资产数据（支持 CSV / JSON）
     - dry_run=true 时只校验数据，不写入数据库
+    - The upload is parsed incrementally and imported IMPORT_CHUNK_SIZE rows at a
+      time (one duplicate query, one insert_many and one link pass per chunk).
+    - format=ndjson streams each chunk's progress, then the summary line.
     """
     filename = file.filename.lower()
-    content = await file.read()
 
-    # --- 1️⃣ 解析文件内容 ---
+    # --- 1️⃣ 解析文件内容 (incremental, from the spooled upload) ---
     if filename.endswith(".csv"):
-        text = content.decode("utf-8")
-        reader = csv.DictReader(io.StringIO(text))
-        assets = list(reader)
-    elif filename.endswith(".json"):
-        assets = json.loads(content)
+        rows = iter_csv_rows(file.file)
+    elif filename.endswith((".json", ".ndjson", ".jsonl")):
+        rows = iter_json_rows(file.file)
     else:
         raise HTTPException(
             status_code=400, detail="Unsupported file format (only CSV or JSON)"
         )
 
-    inserted, duplicates, errors = 0, 0, []
+    summary = {"inserted": 0, "duplicates_skipped": 0, "errors": [], "error_count": 0, "chunks": 0, "dry_run": dry_run}
 
-    # --- 2️⃣ 校验并去重 ---
-    for i, asset in enumerate(assets):
+    # --- 2️⃣ 校验、去重并写入 (per chunk) ---
+    async def run():
         try:
-            # 必填字段检查
-            if not asset.get("name"):
-                errors.append(
-                    {"row": i + 1, "error": "Missing required fields: name"}
-                )
-                continue
-            if not asset.get("type"):
-                asset["type"] = infer_type(name=asset["name"], hostname=asset.get("hostname"), owner=asset.get("owner"))
-            if not asset.get("criticality"):
-                asset["criticality"] = crit_from_sens(asset.get("data_sensitivity"))
-            # 设置时间戳
-            asset["created_at"] = datetime.utcnow()
-            asset["updated_at"] = datetime.utcnow()
-
-            # 检查重复资产（根据 name 或 IP+hostname）
-            query = {
-                "$or": [
-                    {"name": asset["name"]},
-                    {"ip": asset.get("ip"), "hostname": asset.get("hostname")},
-                ]
-            }
-            existing = await db["assets"].find_one(query)
-            if existing:
-                duplicates += 1
-                continue
-
-            if not dry_run:
-                await db["assets"].insert_one(asset)
-                inserted += 1
-        except Exception as e:
-            errors.append({"row": i + 1, "error": str(e)})
-    
-    await generate_asset_intel_links()
+            async for progress in import_asset_rows(rows, dry_run=dry_run):
+                summary["chunks"] = progress["chunk"]
+                summary["inserted"] += progress["inserted"]
+                summary["duplicates_skipped"] += progress["duplicates"]
+                summary["error_count"] += len(progress["errors"])
+                room = IMPORT_MAX_ERRORS - len(summary["errors"])
+                summary["errors"].extend(progress["errors"][:max(room, 0)])
+                yield progress
+        except (ValueError, csv.Error) as e:
+            # JSON and UTF-8 decode errors are ValueErrors; rows before the bad input are already imported
+            summary["parse_error"] = str(e)
+
+    if fmt == "ndjson":
+        async def ndjson():
+            async for progress in run():
+                yield dumps_bson(progress) + "\n"
+            yield dumps_bson(summary) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    async for _ in run():
+        pass
+    if "parse_error" in summary and not summary["chunks"]:
+        raise HTTPException(status_code=400, detail=f"Could not parse file: {summary['parse_error']}")
+
     # --- 3️⃣ 返回导入结果 ---
-    return {
-        "inserted": inserted,
-        "duplicates_skipped": duplicates,
-        "errors": errors,
-        "dry_run": dry_run,
-    }
+    return summary
 
 class TopRiskRequest(BaseModel):
     limit: int = 5
 
 @router.post("/top-risky", response_model=dict)
+@cached_response("assets", "intel")
 async def get_top_risky_assets(req: TopRiskRequest = Body(...)):
     """
     Return the top N risky assets, sorted by risk score (descending).
     Risk score = criticality × intel_max_severity_7d
     """
-    limit = req.limit
-    days_ago = datetime.now() - timedelta(days=7 * TIME_MULTIPLIER)
-    
-    pipeline = [
-        {'$lookup': {
-            'from': 'asset_intel_links',
-            'localField': '_id',
-            'foreignField': 'asset_id',
-            'as': 'links'
-        }},
-        {'$unwind': {'path': '$links', 'preserveNullAndEmptyArrays': True}},
-        {'$lookup': {
-            'from': 'intel_events',
-            'let': {'intel_id': '$links.intel_id'},
-            'pipeline': [
-                {'$match': {'$expr': {'$and': [
-                    {'$eq': ['$_id', '$$intel_id']},
-                    {'$gte': ['$created_at', days_ago.isoformat() + 'Z']}
-                ]}}},
-                {'$project': {'severity': 1, '_id': 0}}
-            ],
-            'as': 'intel_event'
-        }},
-        {'$unwind': {'path': '$intel_event', 'preserveNullAndEmptyArrays': True}},
-        {'$match': {'intel_event': {'$exists': True}}},
-        {'$group': {
-            "_id": "$_id",
-            "criticality": {"$first": "$criticality"},
-            "name": {"$first": "$name"},
-            'intel_events': {'$push': '$intel_event.severity'}
-        }},
-        {'$project': {'_id': 0, 'name': 1, 'criticality': 1, 'intel_events': 1}}
+    # Sorted scan of the risk_score index on the materialized summary
+    cursor = db["asset_risk_summary"].find(
+        {"max_sev_7d": {"$gt": 0}},
+        {"_id": 0, "name": 1, "criticality": 1, "max_sev_7d": 1, "risk_score": 1},
+    ).sort("risk_score", -1).limit(req.limit)
+    top_assets = [
+        {
+            "name": s.get("name"),
+            "risk": {"score": s["risk_score"], "criticality": s["criticality"], "intel_max_severity_7d": s["max_sev_7d"]},
+        }
+        async for s in cursor
     ]
-
-    # Execute the query
-    assets = [x async for x in db["assets"].aggregate(pipeline)]
-    risky_assets = []
-    for asset in assets:
-        max_sev = max(map(int, asset.get("intel_events", [0])))
-        crit = int(asset.get("criticality") or 0)
-        score = crit * max_sev
-        risky_assets.append({
-            "name": asset.get("name"),
-            "risk": {"score": score, "criticality": crit, "intel_max_severity_7d": max_sev},
-        })
-    # Sort descending and take top N
-    risky_assets.sort(key=lambda x: x["risk"]["score"], reverse=True)
-    top_assets = risky_assets[:limit]
     return {"count": len(top_assets), "data": top_assets}
-
@@ -11,15 +11,11 @@ STEP 3: CSF → 800-53 Mapping & Coverage Metrics Generator
   python scripts/csf.py
 """
 
-import os
 from datetime import datetime
-from pymongo import MongoClient
+from db.mongo import get_sync_db
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-DB_NAME = os.getenv("DB_NAME", "smbsec")
-
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+# Sync code (called from sync routes, i.e. the thread pool). The shared pymongo
+# client is resolved per call with get_sync_db(): mongo.close() discards it.
 
 
 # ==========================================================
@@ -46,6 +42,7 @@ def default_subcategory(csf_category):
 # ==========================================================
 
 def update_control_mappings():
+    db = get_sync_db()
     controls = list(db.controls.find({}))
     updated = 0
 
@@ -86,6 +83,7 @@ def update_control_mappings():
 # ==========================================================
 
 def generate_coverage_metrics():
+    db = get_sync_db()
     db.csf_metrics.drop()  # 重建
 
     pipeline = [
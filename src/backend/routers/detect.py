@@ -6,7 +6,17 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from fastapi import APIRouter, Query
 
-from agents.detect_agent import compute_detection, create_or_update_risk_item, group_by_dedup_key, send_teams_alert
+from agents.detect_agent import (
+    DETECT_CURSOR_BATCH_SIZE,
+    create_or_update_risk_items,
+    send_teams_alert,
+    stream_dedup_groups,
+    upsert_detection_batch,
+)
+from db.dates import time_range
+from services.detect_rollups import count_detections_since, daily_detection_counts
+from services.response_cache import cached_response
+from services.search import count_matches, id_match, prefix_match
 from db.mongo import db
 
 load_dotenv()
@@ -23,22 +33,13 @@ async def ping_detect():
 async def run_detect():
     """
     MVP Detect Agent:
-    - Pull intel from last 24h
-    - Dedup by (asset_id, indicator, source)
+    - Pull intel from last 24h, grouped by (asset_id, indicator, source) in MongoDB
     - Create or update detection
     - Return summary
     """
     window_hours = 24 * TIME_MULTIPLIER
     cutoff = datetime.utcnow() - timedelta(hours=window_hours)
 
-    # 1. Get recent intel
-    recent_intel = []
-    async for doc in db["intel_events"].find({"created_at": {"$gte": cutoff.isoformat() + 'Z'}}):
-        recent_intel.append(doc)
-    print(f"Recent intel count: {len(recent_intel)}")
-    if not recent_intel:
-        return {"new_detections": 0, "deduped": 0, "alerts_sent": 0, "risk_items_opened": 0}
-
     summary = {
         "new_detections": 0,
         "deduped": 0,
@@ -46,54 +47,37 @@ async def run_detect():
         "risk_items_opened": 0,
     }
 
-    # 2. Process each dedup group
-    for group in group_by_dedup_key(recent_intel):
-        if not group:
-            continue
-        dedup_key = (
-            group[0]["asset_id"],
-            group[0]["indicator"],
-            group[0]["source"]
-        )
-
-        # 3. Check for existing detection in window
-        existing = await db["detections"].find_one({
-            "asset_id": dedup_key[0],
-            "indicator": dedup_key[1],
-            "source": dedup_key[2],
-            "last_seen": {"$gte": cutoff}
-        })
-
-        detection = compute_detection(group)
-        if existing:
-            # --- DEDUP: update hit_count & last_seen ---
-            await db["detections"].update_one(
-                {"_id": existing["_id"]},
-                {
-                    "$inc": {"hit_count": len(group)},
-                    "$set": {"last_seen": datetime.utcnow()}
-                }
-            )
-            summary["deduped"] += 1
-        else:
-            # --- NEW: insert ---
-            detection_dict = detection.model_dump(by_alias=True, exclude={"id"})
-            result = await db.detections.insert_one(detection_dict)
-            detection_dict["_id"] = result.inserted_id
-            summary["new_detections"] += 1
-            await create_or_update_risk_item(detection_dict)
-            summary["risk_items_opened"] += 1  # Even if upsert, count as "handled"
-            # Send alert only on NEW qualifying detection
-            asset = db.assets.find_one({"_id": detection_dict["asset_id"]})
-            # --- SEND TEAMS ALERT ONLY ON NEW ---
-            asset = await db.assets.find_one({"_id": detection_dict["asset_id"]})
-            if asset and detection_dict["severity"] >= 4:
-                if send_teams_alert(detection_dict, asset):
-                    summary["alerts_sent"] += 1
+    # 1-2. Group recent intel by dedup key in MongoDB and process the groups as they stream in
+    batch = []
+    async for group in stream_dedup_groups(time_range("created_at", since=cutoff)):
+        batch.append(group)
+        if len(batch) >= DETECT_CURSOR_BATCH_SIZE:
+            await _process_detect_batch(batch, cutoff, summary)
+            batch = []
+    if batch:
+        await _process_detect_batch(batch, cutoff, summary)
 
     return summary
 
 
+async def _process_detect_batch(groups, cutoff, summary):
+    # 3. Existing-detection lookup, asset lookup and all detection writes in a few round trips
+    result = await upsert_detection_batch(groups, cutoff)
+    summary["deduped"] += result["deduped"]
+
+    # 4. Risk items and asset risk_score for the whole batch
+    await create_or_update_risk_items(result["new"], result["assets"])
+
+    for detection_dict in result["new"]:
+        summary["new_detections"] += 1
+        summary["risk_items_opened"] += 1  # Even if upsert, count as "handled"
+        # --- SEND TEAMS ALERT ONLY ON NEW ---
+        asset = result["assets"].get(detection_dict["asset_id"])
+        if asset and detection_dict["severity"] >= 4:
+            if send_teams_alert(detection_dict, asset):
+                summary["alerts_sent"] += 1
+
+
 @router.get("/detections", response_model=dict)
 async def get_detections(
     skip: int = Query(0, ge=0, description="Pagination: skip N records"),
@@ -103,25 +87,27 @@ async def get_detections(
     asset_id: Optional[str] = Query(None),
     ttp: Optional[str] = Query(None),
     since: Optional[str] = Query(None),  # ISO format
+    count: str = Query("exact", pattern="^(exact|estimated)$"),
 ):
     """
     Returns paginated detections.
+    source and ttp match by prefix (case-insensitive input), asset_id exactly.
     Frontend does client-side filtering → we return full page.
     """
     query: dict = {}
 
     if severity is not None:
         query["severity"] = severity
+    # Index-friendly filters: prefix ranges and exact ids instead of /i substring regexes
     if source:
-        query["source"] = {"$regex": source, "$options": "i"}
+        query["source"] = prefix_match(source, lower=True)
     if asset_id:
-        query["asset_id"] = {"$regex": asset_id, "$options": "i"}
+        query["asset_id"] = id_match(asset_id)
     if ttp:
-        query["ttp"] = {"$regex": ttp, "$options": "i"}
+        query["ttp"] = prefix_match(ttp, upper=True)
     if since:
         try:
-            since_dt = datetime.fromisoformat(since.replace("Z", "+00:00"))
-            query["first_seen"] = {"$gte": since_dt}
+            query.update(time_range("first_seen", since=since))
         except ValueError:
             raise HTTPException(
                 400,
@@ -129,7 +115,7 @@ async def get_detections(
             )
 
     # 1. Count total
-    total = await db.detections.count_documents(query)
+    total, total_is_lower_bound = await count_matches(db.detections, query, count)
 
     # 2. Fetch paginated docs using to_list()
     cursor = db.detections.find(query).sort("last_seen", -1).skip(skip).limit(limit)
@@ -151,7 +137,7 @@ async def get_detections(
         # Add asset_name field
         doc["asset_name"] = asset_names_map.get(str(doc["asset_id"]), "Unknown")
 
-    return {"data": docs, "total": total, "skip": skip, "limit": limit}
+    return {"data": docs, "total": total, "total_is_lower_bound": total_is_lower_bound, "skip": skip, "limit": limit}
 
 @router.get("/detections/{det_id}", response_model=dict)
 async def get_detection_detail(det_id: str):
@@ -222,17 +208,18 @@ async def get_risk_items(
     }
 
 @router.get("/lastDay", response_model=int)
+@cached_response("detections")
 async def get_detections_24h():
     """
     Returns count of detections in last 24 hours.
     Used by Dashboard → Detections (24h) widget.
     """
     cutoff = datetime.utcnow() - timedelta(hours=24 * TIME_MULTIPLIER)
-    count = await db["detections"].count_documents({"last_seen": {"$gte": cutoff}})
-    return count
+    return await count_detections_since(cutoff)
 
 
 @router.get("/trend", response_model=dict)
+@cached_response("detections")
 async def get_detections_trend(days: int = Query(7, ge=1, le=30)):
     """
     Returns daily detection counts for last N days.
@@ -240,28 +227,12 @@ async def get_detections_trend(days: int = Query(7, ge=1, le=30)):
     """
     end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     start_date = end_date - timedelta(days=abs(days - 1 * TIME_MULTIPLIER))
-    pipeline = [
-        {"$match": {"last_seen": {"$gte": start_date}}},
-        {
-            "$group": {
-                "_id": {
-                    "$dateToString": {
-                        "format": "%Y-%m-%d",
-                        "date": {"$toDate": "$last_seen"}
-                    }
-                },
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"_id": 1}}
-    ]
-
-    result = await db.detections.aggregate(pipeline).to_list(length=None)
-    data = [{"date": r["_id"], "count": r["count"]} for r in result]
-    return {"data": data}
+    # Daily rollup buckets kept current by the detect run (services/detect_rollups.py)
+    return {"data": await daily_detection_counts(start_date)}
 
 
 @router.get("/high-sev", response_model=dict)
+@cached_response("detections", "assets")
 async def get_top_high_sev_detections(
     limit: int = Query(5, ge=1, le=10),
     min_severity: int = Query(4, ge=1, le=5)
@@ -1,6 +1,6 @@
 # routers/identify.py
-from fastapi import APIRouter
-from agents.identify_agent import fetch_pulses, generate_asset_intel_links, infere_asset_fields
+from fastapi import APIRouter, Query
+from agents.identify_agent import classify_asset_fields, fetch_pulses, generate_asset_intel_links, infere_asset_fields
 
 router = APIRouter(prefix="/api/identify", tags=["identify"])
 
@@ -22,3 +22,12 @@ async def run_identify():
     }
 
     return {"ok": True, **result}
+
+
+@router.post("/classify")
+async def classify_assets(
+    dry_run: bool = Query(False, description="If true, return the changes without writing them"),
+    limit: int = Query(1000, ge=0, le=10000, description="Max diff entries returned"),
+):
+    result = await classify_asset_fields(dry_run=dry_run, diff_limit=limit)
+    return {"ok": True, **result}
@@ -4,6 +4,7 @@ from fastapi import APIRouter
 from datetime import datetime
 from db.mongo import db
 from db.models import IntelEvent
+from services.response_cache import response_cache
 
 router = APIRouter()
 
@@ -19,6 +20,7 @@ async def osint_test():
     )
     # 插入数据
     res = await db.intel_events.insert_one(item.model_dump(by_alias=True, exclude_none=True))
+    await response_cache.invalidate("intel")
 
     # 查询刚插入的文档
     inserted = await db.intel_events.find_one({"_id": res.inserted_id})
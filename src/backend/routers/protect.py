@@ -4,6 +4,7 @@ from bson import ObjectId
 from fastapi import APIRouter, HTTPException, Query
 from agents.protect_agent import get_coverage, run_protect_agent
 from db.mongo import db
+from services.response_cache import cached_response
 import markdown2
 
 
@@ -19,6 +20,7 @@ async def trigger_protect_agent():
     return result
 
 @router.get("/coverage", response_model=Dict[str, float])
+@cached_response("controls")
 async def get_protect_coverage() -> Dict[str, float]:
     return await get_coverage()
 
@@ -1,8 +1,10 @@
+import asyncio
 import os
 from typing import Optional
 from fastapi import APIRouter, Header, HTTPException
+from pymongo import UpdateOne
 from scripts.setup_db_week7 import ensure_recover_indexes, seed_recover_data, get_db
-from pymongo import MongoClient
+from db.mongo import db
 from agents.recover_agent import get_backup_reports_by_asset_id
 # from agents.recover_agent import RestoreTestIn, record_restore_test
 from agents.recover_agent import get_restore_tests_by_asset_id
@@ -12,25 +14,23 @@ from datetime import datetime, timezone, timedelta
 
 
 router = APIRouter(prefix="/api/recover", tags=["recover"])
+RECOVER_BATCH_SIZE = int(os.getenv("RECOVER_BATCH_SIZE", "1000"))
 
 @router.get("/ping")
 def ping_recover():
     return {"area": "recover", "ok": True}
 
 @router.get("/create")
-def create_recover_tables():
+async def create_recover_tables():
     """
     Initializes Week 7 Recover / Resilience collections,
     creates indexes, and seeds sample data.
     """
-    MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-    client = MongoClient(MONGO_URI)
-    db = get_db()
+    # Setup helpers are sync: run them on the shared sync client, off the event loop
+    db_sync = get_db()
 
-    ensure_recover_indexes(db)
-    seed_recover_data(db)
-
-    client.close()
+    await asyncio.to_thread(ensure_recover_indexes, db_sync)
+    await asyncio.to_thread(seed_recover_data, db_sync)
 
     return {
         "status": "success",
@@ -78,7 +78,7 @@ class BackupReportIn(BaseModel):
 
 
 @router.post("/backup/report")
-def report_backup(payload: BackupReportIn):
+async def report_backup(payload: BackupReportIn):
     """
     Step 3 - Backup intake & validation
 
@@ -87,8 +87,6 @@ def report_backup(payload: BackupReportIn):
     c) Writes/updates backup_sets collection.
     """
 
-    db = get_db()
-
     # -----------------------------
     # Basic validation rules
     # -----------------------------
@@ -131,7 +129,7 @@ def report_backup(payload: BackupReportIn):
     # -----------------------------
     # Upsert backup metadata
     # -----------------------------
-    db.backup_sets.update_one(
+    await db.backup_sets.update_one(
         {"asset_id": payload.asset_id},
         {"$set": update},
         upsert=True
@@ -145,7 +143,7 @@ def report_backup(payload: BackupReportIn):
     }
 
 
-def record_restore_test(db, payload: RestoreTestIn, reported_by=None):     #Step 4-------- restore_tests  resilience_findings
+async def record_restore_test(payload: RestoreTestIn, reported_by=None):     #Step 4-------- restore_tests  resilience_findings
     """
     Records a restore test, computes duration, evaluates RTO compliance,
     stores next-due test date, and opens findings if needed.
@@ -175,38 +173,34 @@ def record_restore_test(db, payload: RestoreTestIn, reported_by=None):     #Step
         "reported_at": datetime.now(timezone.utc),
     }
 
-    # Insert restore test document
-    res = db.restore_tests.insert_one(restore_doc)
-    restore_id = res.inserted_id
-
     # 2) Determine RTO compliance
     rto_ok = payload.result == "pass" and duration <= payload.rto_target_minutes
 
-    # 3) Compute next_due_test_date (default: 30 days)
+    # 3) Compute next_due_test_date (default: 30 days), stored with the insert
     next_due = payload.test_completed_at + timedelta(days=30)
-    db.restore_tests.update_one(
-        {"_id": restore_id},
-        {"$set": {"next_due_test_at": next_due}},
-    )
+    restore_doc["next_due_test_at"] = next_due
+
+    # Insert restore test document
+    res = await db.restore_tests.insert_one(restore_doc)
+    restore_id = res.inserted_id
 
     # 4) Open finding if needed
     if not rto_ok:
         finding_type = "restore_failed" if payload.result == "fail" else "rto_breach"
-        _open_or_update_restore_finding(db, payload.asset_id, finding_type, duration, payload.rto_target_minutes)
+        await _open_or_update_restore_finding(payload.asset_id, finding_type, duration, payload.rto_target_minutes)
 
     # Return stored record to client
     restore_doc["_id"] = restore_id
-    restore_doc["next_due_test_at"] = next_due
     restore_doc["rto_ok"] = rto_ok
     return convert_objectid(restore_doc)
 
 
-def _open_or_update_restore_finding(db, asset_id, finding_type, duration, target):
+async def _open_or_update_restore_finding(asset_id, finding_type, duration, target):
     now = datetime.now(timezone.utc)
 
     detail_text = f"RTO target={target} min, actual duration={duration} min"
 
-    db.resilience_findings.update_one(
+    await db.resilience_findings.update_one(
         {
             "asset_id": asset_id,
             "type": finding_type,
@@ -230,15 +224,14 @@ def _open_or_update_restore_finding(db, asset_id, finding_type, duration, target
 
 
 @router.get("/report/{asset_id}")
-def get_backup_reports(asset_id: str):
+async def get_backup_reports(asset_id: str):
     """
     Get all backup reports for a specific asset_id.
 
     Example:
     GET /api/backups/report/12
     """
-    db = get_db()
-    results = get_backup_reports_by_asset_id(db, asset_id)
+    results = await get_backup_reports_by_asset_id(db, asset_id)
 
     return results
 
@@ -252,9 +245,8 @@ def get_backup_reports(asset_id: str):
 #     return test
 
 @router.get("/test/{asset_id}")
-def get_restore_tests(asset_id: str):
-    db = get_db()
-    tests = get_restore_tests_by_asset_id(db, asset_id)
+async def get_restore_tests(asset_id: str):
+    tests = await get_restore_tests_by_asset_id(db, asset_id)
     return {
         "asset_id": asset_id,
         "count": len(tests),
@@ -263,17 +255,16 @@ def get_restore_tests(asset_id: str):
 
 
 @router.post("/test")
-def post_restore_test(
+async def post_restore_test(
     payload: RestoreTestIn,
     x_reported_by: Optional[str] = Header(default=None, alias="X-Reported-By"),
 ):
-    db = get_db()
-    test_doc = record_restore_test(db, payload, reported_by=x_reported_by)
+    test_doc = await record_restore_test(payload, reported_by=x_reported_by)
     return test_doc
 
 @router.get("/run")
-def run_recover_agent_get():
-    return run_recover_agent()
+async def run_recover_agent_get():
+    return await run_recover_agent()
 
 def ensure_aware(dt):
     """Ensure DB-loaded datetime is timezone aware."""
@@ -285,7 +276,7 @@ def ensure_aware(dt):
 
 
 @router.post("/run")
-def run_recover_agent():
+async def run_recover_agent():
     """
     Week 7 - Resilience Agent:
     - Evaluate RPO/RTO
@@ -297,12 +288,12 @@ def run_recover_agent():
     and based on the evaluation results, it updates the assets table by adjusting residual_risk and
     updates the resilience_findings table by creating or modifying findings.
 
+    backup_sets is streamed in RECOVER_BATCH_SIZE chunks; per chunk there is one
+    $sort/$group aggregation for the latest restore tests, one assets lookup
+    and one bulk_write each for findings and residual risk.
     """
-    db = get_db()
     now = datetime.now(timezone.utc)
 
-    assets = list(db.backup_sets.find())  # assets with backup info
-
     summary = {
         "assets_evaluated": 0,
         "rpo_compliant": 0,
@@ -311,6 +302,40 @@ def run_recover_agent():
         "findings_updated": 0,
     }
 
+    batch = []
+    async for asset in db.backup_sets.find().batch_size(RECOVER_BATCH_SIZE):  # assets with backup info
+        batch.append(asset)
+        if len(batch) >= RECOVER_BATCH_SIZE:
+            await _evaluate_backup_batch(batch, now, summary)
+            batch = []
+    if batch:
+        await _evaluate_backup_batch(batch, now, summary)
+
+    return summary
+
+
+async def _latest_restore_tests(asset_ids):
+    """Newest restore test per asset (uses the asset_last_test index)."""
+    latest = {}
+    async for row in db.restore_tests.aggregate([
+        {"$match": {"asset_id": {"$in": asset_ids}}},
+        {"$sort": {"asset_id": 1, "test_completed_at": -1}},
+        {"$group": {"_id": "$asset_id", "test": {"$first": "$$ROOT"}}},
+    ]):
+        latest[row["_id"]] = row["test"]
+    return latest
+
+
+async def _evaluate_backup_batch(assets, now, summary):
+    asset_ids = list({asset["asset_id"] for asset in assets})
+    latest_tests = await _latest_restore_tests(asset_ids)
+    risk_by_asset = {
+        doc["asset_id"]: doc.get("residual_risk", 50)
+        async for doc in db.assets.find({"asset_id": {"$in": asset_ids}}, {"asset_id": 1, "residual_risk": 1})
+    }
+
+    finding_ops, risk_ops = [], []
+
     for asset in assets:
         asset_id = asset["asset_id"]
         summary["assets_evaluated"] += 1
@@ -336,15 +361,12 @@ def run_recover_agent():
                 f"last success {minutes_since_backup}m ago" if minutes_since_backup else
                 "No successful backup found"
             )
-            _store_or_update_finding(db, asset_id, "rpo_breach", detail, summary)
+            finding_ops.append(_finding_op(asset_id, "rpo_breach", detail, now))
 
         # ------------------------------------------------
         # 2) RTO Evaluation
         # ------------------------------------------------
-        last_test = db.restore_tests.find_one(
-            {"asset_id": asset_id},
-            sort=[("test_completed_at", -1)]
-        )
+        last_test = latest_tests.get(asset_id)
 
         if last_test:
             test_duration = last_test.get("duration_minutes", 999999)
@@ -362,11 +384,14 @@ def run_recover_agent():
             if result == "fail":
                 type_ = "restore_failed"
                 detail = "Restore test failed"
-            else:
+            elif last_test:
                 type_ = "rto_breach"
                 detail = f"RTO target={rto_target}m, duration={test_duration}"
+            else:
+                type_ = "rto_breach"
+                detail = "No restore test found"
 
-            _store_or_update_finding(db, asset_id, type_, detail, summary)
+            finding_ops.append(_finding_op(asset_id, type_, detail, now))
 
         # ------------------------------------------------
         # 3) Resilience Score Calculation
@@ -394,25 +419,30 @@ def run_recover_agent():
         # ------------------------------------------------
         # 4) Residual Risk Update
         # ------------------------------------------------
-        asset_record = db.assets.find_one({"asset_id": asset_id}) or {}
-        prior_risk = asset_record.get("residual_risk", 50)
+        prior_risk = risk_by_asset.get(asset_id, 50)
 
         new_risk = round(prior_risk * (1 - score / 300))
+        risk_by_asset[asset_id] = new_risk  # a repeated asset_id compounds, as before
 
-        db.assets.update_one(
+        risk_ops.append(UpdateOne(
             {"asset_id": asset_id},
             {"$set": {"residual_risk": new_risk}},
             upsert=True
-        )
+        ))
 
-    return summary
+    # Ordered, so repeated (asset, type) keys upsert once and then update, like sequential calls
+    if finding_ops:
+        result = await db.resilience_findings.bulk_write(finding_ops, ordered=True)
+        opened = len(result.upserted_ids)
+        summary["findings_opened"] += opened
+        summary["findings_updated"] += len(finding_ops) - opened
+    if risk_ops:
+        await db.assets.bulk_write(risk_ops, ordered=True)
 
 
-def _store_or_update_finding(db, asset_id, type_, detail, summary):
-    """Upsert resilience findings."""
-    now = datetime.now(timezone.utc)
-
-    result = db.resilience_findings.update_one(
+def _finding_op(asset_id, type_, detail, now):
+    """Upsert resilience findings (one open finding per asset and type)."""
+    return UpdateOne(
         {
             "asset_id": asset_id,
             "type": type_,
@@ -431,8 +461,3 @@ def _store_or_update_finding(db, asset_id, type_, detail, summary):
         },
         upsert=True
     )
-
-    if result.upserted_id:
-        summary["findings_opened"] += 1
-    else:
-        summary["findings_updated"] += 1
\ No newline at end of file
@@ -1,18 +1,17 @@
+import asyncio
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Query
 from typing import Any, Dict, Optional
-from fastapi.temp_pydantic_v1_params import Query
 from pydantic import BaseModel
 from bson import ObjectId
-from pymongo import MongoClient
-from db.mongo import db
+from db.encoders import BSONResponse
+from db.mongo import db, get_sync_db
+from services.search import count_matches, text_search
 
 from agents.respond_agent import run_respond_agent, update_incident_status
 from scripts.setup_db_week6 import (
     ensure_respond_collections,
     seed_respond_sample_data,
-    MONGO_URI,
-    DB_NAME,
 )
 
 # -----------------------------------------------------
@@ -60,13 +59,10 @@ def ping_respond():
 # -----------------------------------------------------
 @router.get("/create")
 async def create_respond_tables():
-    client = MongoClient(MONGO_URI)
-    db_sync = client[DB_NAME]
-
-    ensure_respond_collections(db_sync)
-    seed_respond_sample_data(db_sync)
-
-    client.close()
+    # Setup helpers are sync: run them on the shared sync client, off the event loop
+    db_sync = get_sync_db()
+    await asyncio.to_thread(ensure_respond_collections, db_sync)
+    await asyncio.to_thread(seed_respond_sample_data, db_sync)
 
     return {
         "ok": True,
@@ -120,10 +116,13 @@ async def get_incidents(
     status: Optional[str] = None,
     severity: Optional[int] = None,
     sla_status: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    count: str = Query("exact", pattern="^(exact|estimated)$", description="estimated: cap filtered counts at SEARCH_COUNT_CAP"),
 ):
     """
-    Retrieve all incidents with optional filtering
+    Retrieve all incidents with optional filtering.
+    `search` is a ranked full-text search over title, summary and owner
+    (best match first); without it incidents are newest first.
     """
 
     query = {}
@@ -137,18 +136,18 @@ async def get_incidents(
     if sla_status:
         query["sla_status"] = sla_status
     
-    if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"summary": {"$regex": search, "$options": "i"}},
-            {"owner": {"$regex": search, "$options": "i"}}
-        ]
+    projection = None
+    sort = [("opened_at", -1)]
+    if search and search.strip():
+        text_filter, projection, score_sort = text_search(search)
+        query.update(text_filter)
+        sort = score_sort + sort
     
     # Get total count
-    total = await db.incidents.count_documents(query)
+    total, total_is_lower_bound = await count_matches(db.incidents, query, count)
     
     # Fetch incidents with pagination
-    cursor = await db.incidents.find(query).skip(skip).limit(limit).sort("opened_at", -1).to_list(length=total)
+    cursor = await db.incidents.find(query, projection).sort(sort).skip(skip).limit(limit).to_list(length=limit or None)
     
     # Convert MongoDB documents to Incident objects
     incidents = []
@@ -164,58 +163,71 @@ async def get_incidents(
     return {
         "data": incidents,
         "total": total,
+        "total_is_lower_bound": total_is_lower_bound,
         "page": skip // limit + 1 if limit > 0 else 1,
         "limit": limit
     }
         
 
+def _child_lookup(collection: str, as_field: str, sort: dict, skip: int = 0, limit: Optional[int] = None) -> dict:
+    """$lookup of an incident's rows in `collection`, as {items, total} when paginated."""
+    rows = [{"$match": {"$expr": {"$eq": ["$incident_id", "$$incident_id"]}}}, {"$sort": sort}]
+    if limit is None and not skip:
+        pipeline = rows
+    else:
+        page = [{"$skip": skip}] + ([{"$limit": limit}] if limit is not None else [])
+        pipeline = rows + [{"$facet": {"items": page, "total": [{"$count": "n"}]}}]
+    return {"$lookup": {"from": collection, "let": {"incident_id": "$_id"}, "pipeline": pipeline, "as": as_field}}
+
+
 @router.get("/getIncident/{incident_id}", response_model=dict)
-async def get_incident(incident_id: str):
+async def get_incident(
+    incident_id: str,
+    timeline_skip: int = Query(0, ge=0),
+    timeline_limit: Optional[int] = Query(None, ge=1, le=5000, description="Page the timeline (oldest first); all if unset"),
+    evidence_skip: int = Query(0, ge=0),
+    evidence_limit: Optional[int] = Query(None, ge=1, le=1000, description="Page the evidence; all if unset"),
+):
     """
-    Retrieve a single incident by ID
-    """        
-    # Fetch incident
-    incident = await db.incidents.find_one({"_id": ObjectId(incident_id)})
-    
+    Retrieve a single incident by ID, with its assets, detections, risk items,
+    tasks, evidence and timeline, in one aggregation.
+    """
+    try:
+        oid = ObjectId(incident_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid incident id")
+
+    paged_timeline = timeline_limit is not None or timeline_skip > 0
+    paged_evidence = evidence_limit is not None or evidence_skip > 0
+    pipeline = [
+        {"$match": {"_id": oid}},
+        # Incidents opened before asset_refs existed only have the primary asset
+        {"$set": {"asset_refs": {"$cond": [
+            {"$gt": [{"$size": {"$ifNull": ["$asset_refs", []]}}, 0]},
+            "$asset_refs",
+            ["$primary_asset_id"],
+        ]}}},
+        {"$lookup": {"from": "assets", "localField": "asset_refs", "foreignField": "_id", "as": "asset_refs"}},
+        {"$lookup": {"from": "detections", "localField": "detection_refs", "foreignField": "_id", "as": "detection_refs"}},
+        {"$lookup": {"from": "risk_items", "localField": "risk_item_refs", "foreignField": "_id", "as": "risk_item_refs"}},
+        _child_lookup("incident_tasks", "tasks", {"order": 1, "_id": 1}),
+        _child_lookup("incident_evidence", "evidence", {"submitted_at": 1, "_id": 1}, evidence_skip, evidence_limit),
+        _child_lookup("incident_timeline", "timelines", {"ts": 1, "_id": 1}, timeline_skip, timeline_limit),
+    ]
+    incident = await db.incidents.aggregate(pipeline).to_list(length=1)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
-    
-    # Convert ObjectId to string
-    incident["_id"] = str(incident["_id"])
-    incident["primary_asset_id"] = str(incident["primary_asset_id"])
-    if not incident.get("asset_refs"):
-        incident["asset_refs"] = []
-        incident["asset_refs"].append(incident["primary_asset_id"])
-
-    # Get related data
-    incident["asset_refs"] = await db.assets.find({"_id": {"$in": incident["asset_refs"]}}).to_list(length=None)
-    incident["detection_refs"] = await db.detections.find({"_id": {"$in": incident["detection_refs"]}}).to_list(length=None)
-    incident["risk_item_refs"] = await db.risk_items.find({"_id": {"$in": incident["risk_item_refs"]}}).to_list(length=None)
-    incident["tasks"] = await db.incident_tasks.find({"incident_id": ObjectId(incident_id)}).to_list(length=None)
-    incident["evidence"] = await db.incident_evidence.find({"incident_id": ObjectId(incident_id)}).to_list(length=None)
-    incident["timelines"] = await db.incident_timeline.find({"incident_id": ObjectId(incident_id)}).to_list(length=None)
-    
-    print(incident["evidence"])
-    # Clean related data ObjectIds
-    for asset in incident["asset_refs"]:
-        asset["_id"] = str(asset["_id"])
-    for detection in incident["detection_refs"]:
-        detection["_id"] = str(detection["_id"])
-        detection["asset_id"] = str(detection["asset_id"])
-    for risk in incident["risk_item_refs"]:
-        risk["_id"] = str(risk["_id"])
-        risk["asset_id"] = str(risk["asset_id"])
-    for task in incident["tasks"]:
-        task["_id"] = str(task["_id"])
-        task["incident_id"] = str(task["incident_id"])
-    for ev in incident["evidence"]:
-        ev["_id"] = str(ev["_id"])
-        ev["incident_id"] = str(ev["incident_id"])
-    for tl in incident["timelines"]:
-        tl["_id"] = str(tl["_id"])
-        tl["incident_id"] = str(tl["incident_id"])
-    
-    return incident
+    incident = incident[0]
+
+    # Unwrap the $facet pages: rows stay in the same fields, totals alongside
+    for field, paged in (("timelines", paged_timeline), ("evidence", paged_evidence)):
+        if paged:
+            facet = incident[field][0] if incident[field] else {"items": [], "total": []}
+            incident[field] = facet["items"]
+            incident[f"{field}_total"] = facet["total"][0]["n"] if facet["total"] else 0
+
+    # ObjectIds and datetimes are encoded by the shared BSON encoder
+    return BSONResponse(incident)
 
 @router.post("/incidents/{incident_id}/tasks")
 async def add_task(incident_id: str, task: dict):
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from agents.identify_agent import generate_asset_intel_links
 from db.seed_from_csv import main as seed_main
+from services.response_cache import response_cache
 
 router = APIRouter()
 
@@ -9,7 +10,8 @@ router = APIRouter()
 async def run_seed():
     try:
         await seed_main()
-        await generate_asset_intel_links()
+        await response_cache.invalidate("assets", "intel", "risk")
+        await generate_asset_intel_links(full=True)
         return {"status": "ok", "message": "Data imported successfully from CSV files."}
     except Exception as e:
         return {"status": "error", "detail": str(e)}
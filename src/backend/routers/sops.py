@@ -1,13 +1,9 @@
 #!/usr/bin/env python3
-import os
 from datetime import datetime
-from pymongo import MongoClient
+from db.mongo import get_sync_db
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-DB_NAME = os.getenv("DB_NAME", "smbsec")
-
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+# Sync code (called from sync routes, i.e. the thread pool). The shared pymongo
+# client is resolved per call with get_sync_db(): mongo.close() discards it.
 
 
 # =======================================================
@@ -236,6 +232,7 @@ def generate_sop(control):
 # =======================================================
 
 def run_sop_generation():
+    db = get_sync_db()
     controls = list(db.controls.find({"sop_id": {"$exists": False}}))
     results = []
 
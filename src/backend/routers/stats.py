@@ -1,10 +1,12 @@
 # src/backend/routers/stats.py
 from fastapi import APIRouter
 from db.mongo import db
+from services.response_cache import cached_response
 
 router = APIRouter()
 
 @router.get("/stats")
+@cached_response("assets", "intel", "risk")
 async def stats():
     """返回数据库中 assets、intel_events、risk_items 三个集合的数量。"""
     async def safe_count(collection_name: str) -> int:
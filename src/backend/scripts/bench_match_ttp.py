@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: detect_agent.match_ttp (Aho–Corasick) vs the old
+per-keyword substring scan, on synthetic intel summaries.
+
+Usage (from src/backend):
+  python -m scripts.bench_match_ttp [count]
+"""
+
+import random
+import sys
+import time
+
+from agents.detect_agent import TTP_KEYWORDS, match_ttp
+
+FILLER = (
+    "the a of threat actor observed activity network host campaign report "
+    "indicator related server traffic address multiple payload delivery command"
+).split()
+
+
+def legacy_match_ttp(text: str):
+    """Previous implementation: substring test for every keyword."""
+    text = text.lower()
+    return [ttp for keyword, ttps in TTP_KEYWORDS.items() for ttp in ttps if keyword in text]
+
+
+def synthetic_summaries(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    keywords = list(TTP_KEYWORDS)
+    out = []
+    for _ in range(count):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(8, 25))]
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        out.append(" ".join(words) + " 203.0.113.10")
+    return out
+
+
+def bench(fn, summaries) -> float:
+    start = time.perf_counter()
+    for s in summaries:
+        fn(s)
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    summaries = synthetic_summaries(count)
+
+    legacy = bench(legacy_match_ttp, summaries)
+    current = bench(match_ttp, summaries)
+
+    print(f"summaries:        {count}")
+    print(f"legacy substring: {legacy:.2f}s")
+    print(f"aho-corasick:     {current:.2f}s")
+    print(f"speedup:          {legacy / current:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Convert string / epoch timestamps to BSON dates.
+
+Older seeds and the detect pipeline stored intel_events.created_at as ISO
+strings while the scheduler wrote datetimes. Range filters on a field with
+mixed types cannot use its index, so this rewrites every non-date value in
+place (see db.dates.DATE_FIELDS). Idempotent; safe to run on a live DB.
+The API also runs it at startup; use this script to migrate without it.
+
+Usage (from src/backend):
+  python -m scripts.migrate_dates
+"""
+
+import asyncio
+
+from db.dates import migrate_date_fields
+from db.mongo import DB_NAME, MONGO_URL, close, db
+
+
+async def main():
+    print(f"Using DB: {DB_NAME} at {MONGO_URL}")
+    report = await migrate_date_fields(db)
+    for field, counts in report.items():
+        print(f"  {field}: {counts}")
+    close()
+    print("✅ Timestamp migration complete.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
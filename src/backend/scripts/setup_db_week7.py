@@ -15,33 +15,30 @@ Env (defaults):
   MONGO_URI=mongodb://localhost:27017
   DB_NAME=smbsec
 
-Usage:
-  python scripts/setup_db_week7.py
+Usage (from src/backend):
+  python -m scripts.setup_db_week7
 """
 
 from __future__ import annotations
 
-import os
 from datetime import datetime, timedelta
 from typing import List, Optional, Literal
 
 from bson import ObjectId
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING
 from pymongo.database import Database
 from pydantic import BaseModel, Field
 
+from db.mongo import DB_NAME, MONGO_URL, get_sync_db
+
 
 # ---------------------------------------------------------------------------
 # Mongo connection helpers
 # ---------------------------------------------------------------------------
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-DB_NAME = os.getenv("DB_NAME", "smbsec")
-
-
 def get_db() -> Database:
-    client = MongoClient(MONGO_URI)
-    return client[DB_NAME]
+    """Shared sync client from db.mongo (one pool per process, not one per call)."""
+    return get_sync_db()
 
 
 # ---------------------------------------------------------------------------
@@ -425,7 +422,7 @@ def seed_recover_data(db: Database) -> None:
 
 if __name__ == "__main__":
     db = get_db()
-    print(f"Using DB: {DB_NAME} at {MONGO_URI}")
+    print(f"Using DB: {DB_NAME} at {MONGO_URL}")
     ensure_recover_indexes(db)
     seed_recover_data(db)
     print("✅ Week 7 Recover / Resilience setup complete.")
\ No newline at end of file
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+TEAMS_WEBHOOK_URL = os.getenv("TEAMS_WEBHOOK_URL")
+ALERT_COALESCE_SECONDS = float(os.getenv("ALERT_COALESCE_SECONDS", "30"))
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", "3"))
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "1000"))
+ALERT_TIMEOUT_SECONDS = float(os.getenv("ALERT_TIMEOUT_SECONDS", "10"))
+
+
+def build_digest_card(key: str, alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One MessageCard summarizing several alerts for the same asset."""
+    urgent = any(a.get("urgent") for a in alerts)
+    key = alerts[0].get("label") or key
+    return {
+        "@type": "MessageCard",
+        "@context": "http://schema.org/extensions",
+        "themeColor": "d32f2f" if urgent else "f57c00",
+        "summary": f"{len(alerts)} new alerts for {key}",
+        "title": f"{'[URGENT] ' if urgent else ''}{len(alerts)} new alerts for {key}",
+        "sections": [{
+            "facts": [{"name": str(i), "value": a.get("title", "")} for i, a in enumerate(alerts, start=1)],
+            "markdown": True,
+        }],
+    }
+
+
+class AlertDispatcher:
+    """
+    Non-blocking webhook alerts.
+
+    - enqueue() puts an alert on a bounded asyncio queue and returns at once.
+    - A background worker buckets alerts by key (asset). The first alert for a
+      key opens a coalescing window; when it closes, one alert is sent as-is
+      and several are merged into a single digest card.
+    - Cards are posted through one pooled httpx.AsyncClient with retry and
+      exponential backoff on transport errors, 429 and 5xx.
+
+    Alert format: {"key": asset id, "label": asset name, "card": webhook JSON,
+                   "title": one-line text for digests, "urgent": bool}
+    """
+
+    def __init__(
+        self,
+        webhook_url: Optional[str] = TEAMS_WEBHOOK_URL,
+        window_seconds: float = ALERT_COALESCE_SECONDS,
+        max_retries: int = ALERT_MAX_RETRIES,
+        timeout: float = ALERT_TIMEOUT_SECONDS,
+        queue_size: int = ALERT_QUEUE_SIZE,
+        backoff_base: float = 0.5,
+    ):
+        self.webhook_url = webhook_url
+        self.window_seconds = window_seconds
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.backoff_base = backoff_base
+        self.stats = {"queued": 0, "dropped": 0, "sent": 0, "failed": 0, "coalesced": 0}
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._flushers: Dict[str, asyncio.Task] = {}  # key -> task waiting out its window
+        self._tasks: set = set()
+
+    async def start(self) -> None:
+        self._ensure_worker()
+
+    def _ensure_worker(self) -> None:
+        """Start the worker on the running loop (raises RuntimeError outside one)."""
+        if self._worker and not self._worker.done():
+            return
+        asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+        )
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Drain the queue, send everything still waiting in a window, close the client."""
+        if not self._worker:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        for task in list(self._flushers.values()):
+            task.cancel()
+        self._flushers.clear()
+        for key in list(self._pending):
+            await self._flush(key)
+        # Let sends that were already in flight finish
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._client.aclose()
+        self._worker = None
+        self._client = None
+
+    def enqueue(self, alert: Dict[str, Any]) -> bool:
+        """Queue an alert without waiting. Returns False if it could not be queued."""
+        if not self.webhook_url:
+            logger.warning("Alert dropped: TEAMS_WEBHOOK_URL is not set")
+            self.stats["dropped"] += 1
+            return False
+        try:
+            # Starts lazily if the app lifespan has not started the dispatcher
+            self._ensure_worker()
+            self._queue.put_nowait(alert)
+        except (RuntimeError, asyncio.QueueFull) as e:
+            logger.warning("Alert dropped: %s", str(e) or "queue full")
+            self.stats["dropped"] += 1
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            alert = await self._queue.get()
+            try:
+                key = str(alert.get("key") or "general")
+                if key in self._pending:
+                    self._pending[key].append(alert)
+                    self.stats["coalesced"] += 1
+                else:
+                    self._pending[key] = [alert]
+                    task = asyncio.create_task(self._flush_after(key))
+                    self._flushers[key] = task
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            finally:
+                self._queue.task_done()
+
+    async def _flush_after(self, key: str) -> None:
+        await asyncio.sleep(self.window_seconds)
+        self._flushers.pop(key, None)
+        await self._flush(key)
+
+    async def _flush(self, key: str) -> None:
+        alerts = self._pending.pop(key, [])
+        if not alerts:
+            return
+        card = alerts[0]["card"] if len(alerts) == 1 else build_digest_card(key, alerts)
+        if await self._post(card):
+            self.stats["sent"] += 1
+        else:
+            self.stats["failed"] += 1
+
+    async def _post(self, card: Dict[str, Any]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff_base * (2 ** attempt)
+            try:
+                response = await self._client.post(self.webhook_url, json=card)
+                if response.status_code < 300:
+                    return True
+                if response.status_code != 429 and response.status_code < 500:
+                    logger.error("Alert rejected: %s", response.status_code)
+                    return False
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = float(retry_after)
+                logger.warning("Alert send got %s (attempt %d)", response.status_code, attempt + 1)
+            except httpx.HTTPError as e:
+                logger.warning("Alert send error (attempt %d): %s", attempt + 1, e)
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+        return False
+
+
+# Global dispatcher instance
+alert_dispatcher = AlertDispatcher()
@@ -0,0 +1,204 @@
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List
+
+from fastapi.concurrency import run_in_threadpool
+from pymongo.errors import BulkWriteError
+
+from agents.identify_agent import crit_from_sens, generate_asset_intel_links, infer_type
+from db.mongo import db
+from services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+_READ_SIZE = 64 * 1024
+_DUP_PROJECTION = {"name": 1, "ip": 1, "hostname": 1, "_id": 0}
+
+
+# ---------------------------
+# Incremental parsers
+# ---------------------------
+def iter_csv_rows(fileobj) -> Iterator[Dict[str, Any]]:
+    """Yield CSV rows as dicts, reading the binary upload a line at a time."""
+    yield from csv.DictReader(io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline=""))
+
+
+def iter_json_rows(fileobj) -> Iterator[Any]:
+    """
+    Yield the items of a top-level JSON array (or of newline-delimited JSON)
+    while holding at most one item plus one read buffer in memory.
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig")
+    decoder = json.JSONDecoder()
+    buf, pos, eof, in_array = "", 0, False, None
+
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or (in_array and buf[pos] == ",")):
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                return
+            buf, pos = text.read(_READ_SIZE), 0
+            eof = not buf
+            continue
+
+        if in_array is None:
+            in_array = buf[pos] == "["
+            if in_array:
+                pos += 1
+                continue
+        if in_array and buf[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Item cut off by the read buffer: keep the tail and read more
+            more = text.read(_READ_SIZE)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield item
+        pos = end
+
+
+def _chunks(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Group rows into lists of `size`. If reading a row fails, the rows already
+    collected are yielded first and the error is raised on the next pull.
+    """
+    chunk = []
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    except Exception:
+        if chunk:
+            yield chunk
+        raise
+    if chunk:
+        yield chunk
+
+
+# ---------------------------
+# Chunked import
+# ---------------------------
+def _pair(asset: dict):
+    """(ip, hostname) duplicate key, or None when the row has neither."""
+    ip, hostname = asset.get("ip"), asset.get("hostname")
+    return (ip, hostname) if (ip or hostname) else None
+
+
+async def _existing_keys(assets: List[dict]) -> tuple[set, set]:
+    """Names and (ip, hostname) pairs already in the collection, with one query."""
+    names = list({a["name"] for a in assets})
+    pairs = [p for p in (_pair(a) for a in assets) if p]
+    query = {"name": {"$in": names}}
+    if pairs:
+        query = {"$or": [
+            query,
+            {"ip": {"$in": list({p[0] for p in pairs})}, "hostname": {"$in": list({p[1] for p in pairs})}},
+        ]}
+    known_names, known_pairs = set(), set()
+    async for doc in db["assets"].find(query, _DUP_PROJECTION):
+        known_names.add(doc.get("name"))
+        known_pairs.add((doc.get("ip"), doc.get("hostname")))
+    return known_names, known_pairs
+
+
+async def _import_chunk(rows: List[Any], first_row: int, dry_run: bool) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    result = {"rows": len(rows), "valid": 0, "inserted": 0, "duplicates": 0, "errors": []}
+
+    # 1) Validate and fill inferred fields
+    candidates = []  # (row number, asset)
+    for i, asset in enumerate(rows, start=first_row):
+        if not isinstance(asset, dict):
+            result["errors"].append({"row": i, "error": "Row is not an object"})
+            continue
+        if not asset.get("name"):
+            result["errors"].append({"row": i, "error": "Missing required fields: name"})
+            continue
+        if not asset.get("type"):
+            asset["type"] = infer_type(name=asset["name"], hostname=asset.get("hostname"), owner=asset.get("owner"))
+        if not asset.get("criticality"):
+            asset["criticality"] = crit_from_sens(asset.get("data_sensitivity"))
+        asset["created_at"] = now
+        asset["updated_at"] = now
+        candidates.append((i, asset))
+    if not candidates:
+        return result
+
+    # 2) Duplicates: against the collection (one query) and earlier rows of this chunk
+    known_names, known_pairs = await _existing_keys([a for _, a in candidates])
+    to_insert = []
+    for i, asset in candidates:
+        pair = _pair(asset)
+        if asset["name"] in known_names or (pair and pair in known_pairs):
+            result["duplicates"] += 1
+            continue
+        known_names.add(asset["name"])
+        if pair:
+            known_pairs.add(pair)
+        to_insert.append((i, asset))
+
+    result["valid"] = len(to_insert)
+    if dry_run or not to_insert:
+        return result
+
+    # 3) One unordered insert; rows that fail are reported, the rest still land
+    docs = [a for _, a in to_insert]
+    failed = set()
+    try:
+        await db["assets"].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            failed.add(err["index"])
+            result["errors"].append({"row": to_insert[err["index"]][0], "error": err.get("errmsg", "insert failed")})
+    inserted_ids = [doc["_id"] for idx, doc in enumerate(docs) if idx not in failed]
+    result["inserted"] = len(inserted_ids)
+
+    # 4) Link only what this chunk inserted
+    if inserted_ids:
+        await generate_asset_intel_links(asset_ids=inserted_ids)
+        await response_cache.invalidate("assets")
+    return result
+
+
+async def import_asset_rows(
+    rows: Iterable[Any], dry_run: bool = False, chunk_size: int = IMPORT_CHUNK_SIZE
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Import assets chunk by chunk and yield progress after each chunk:
+    {"chunk", "rows_processed", "inserted", "duplicates", "errors"} for that chunk.
+
+    Duplicates (same name, or same ip + hostname) are checked against the
+    collection and earlier rows of the same chunk. Earlier chunks are already
+    inserted, so they are caught by the collection check, except on dry runs.
+
+    Rows are parsed in a worker thread (reading the upload blocks). A parse
+    error is raised after the rows before it have been imported.
+    """
+    chunks = _chunks(rows, chunk_size)
+    processed, n = 0, 0
+    while True:
+        chunk = await run_in_threadpool(next, chunks, None)
+        if chunk is None:
+            return
+        n += 1
+        result = await _import_chunk(chunk, processed + 1, dry_run)
+        processed += len(chunk)
+        logger.info(
+            "Asset import chunk %d: %d rows, %d inserted, %d duplicates, %d errors",
+            n, len(chunk), result["inserted"], result["duplicates"], len(result["errors"]),
+        )
+        yield {"chunk": n, "rows_processed": processed, **result}
@@ -0,0 +1,147 @@
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import InsertOne, UpdateOne
+
+from db.bulk import BulkWriter
+from db.mongo import db
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS = "detection_rollups"
+
+
+# ---------------------------
+# Buckets
+# ---------------------------
+def hour_bucket(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+_BUCKETS = {"hour": hour_bucket, "day": day_bucket}
+
+
+def rollup_deltas(changes: Iterable[Dict[str, Any]]) -> Counter:
+    """
+    Count changes per (granularity, bucket, source, severity, asset_id).
+
+    Each change is {"source", "severity", "asset_id", "last_seen", "prev_last_seen"}
+    (prev_last_seen is None for a new detection). A detection counts in the
+    bucket of its last_seen, so a dedup hit that moves it to a later bucket is
+    -1 on the old bucket and +1 on the new one, matching what the original
+    $group over detections.last_seen returned.
+    """
+    deltas = Counter()
+    for c in changes:
+        dims = (c["source"], c["severity"], c["asset_id"])
+        for granularity, bucket in _BUCKETS.items():
+            new = bucket(c["last_seen"])
+            prev = c.get("prev_last_seen")
+            prev = bucket(prev) if prev is not None else None
+            if prev == new:
+                continue
+            deltas[(granularity, new, *dims)] += 1
+            if prev is not None:
+                deltas[(granularity, prev, *dims)] -= 1
+    return deltas
+
+
+def _key_doc(key: Tuple) -> Dict[str, Any]:
+    granularity, bucket, source, severity, asset_id = key
+    return {"granularity": granularity, "bucket": bucket, "source": source, "severity": severity, "asset_id": asset_id}
+
+
+# ---------------------------
+# Write path (detect run)
+# ---------------------------
+async def record_detection_changes(changes: List[Dict[str, Any]]) -> int:
+    """Apply a detect batch to the hourly and daily rollups; returns the number of buckets touched."""
+    deltas = {key: n for key, n in rollup_deltas(changes).items() if n}
+    if not deltas:
+        return 0
+    async with BulkWriter(db[ROLLUPS]) as writer:
+        for key, n in deltas.items():
+            await writer.add(UpdateOne(_key_doc(key), {"$inc": {"count": n}}, upsert=True))
+    return len(deltas)
+
+
+async def rebuild_detection_rollups() -> int:
+    """
+    Recompute every bucket from the detections collection (first start,
+    or after detections were edited outside the detect run).
+    """
+    hours = Counter()
+    async for row in db["detections"].aggregate([
+        {"$match": {"last_seen": {"$type": "date"}}},
+        {"$group": {
+            "_id": {
+                "y": {"$year": "$last_seen"}, "m": {"$month": "$last_seen"},
+                "d": {"$dayOfMonth": "$last_seen"}, "h": {"$hour": "$last_seen"},
+                "source": "$source", "severity": "$severity", "asset_id": "$asset_id",
+            },
+            "count": {"$sum": 1},
+        }},
+    ]):
+        k = row["_id"]
+        bucket = datetime(k["y"], k["m"], k["d"], k["h"])
+        hours[("hour", bucket, k.get("source"), k.get("severity"), k.get("asset_id"))] += row["count"]
+
+    buckets = Counter(hours)
+    for (_, bucket, *dims), n in hours.items():
+        buckets[("day", day_bucket(bucket), *dims)] += n
+
+    await db[ROLLUPS].delete_many({})
+    async with BulkWriter(db[ROLLUPS]) as writer:
+        for key, n in buckets.items():
+            await writer.add(InsertOne({**_key_doc(key), "count": n}))
+    logger.info("Rebuilt detection rollups: %d buckets", len(buckets))
+    return len(buckets)
+
+
+async def ensure_detection_rollups() -> None:
+    """Backfill on startup when detections exist but no rollups were written yet."""
+    if await db[ROLLUPS].find_one({}, {"_id": 1}):
+        return
+    if await db["detections"].find_one({}, {"_id": 1}):
+        await rebuild_detection_rollups()
+
+
+# ---------------------------
+# Read path (dashboard; the routes cache responses under the "detections" tag)
+# ---------------------------
+
+
+async def count_detections_since(since: datetime) -> int:
+    """
+    Detections whose last_seen falls in an hourly bucket from `since` on.
+    The bucket holding `since` is counted whole, so this can include up to
+    one extra hour of detections.
+    """
+    start = hour_bucket(since)
+    rows = await db[ROLLUPS].aggregate([
+        {"$match": {"granularity": "hour", "bucket": {"$gte": start}}},
+        {"$group": {"_id": None, "count": {"$sum": "$count"}}},
+    ]).to_list(length=1)
+    return rows[0]["count"] if rows else 0
+
+
+async def daily_detection_counts(since: datetime, until: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """[{"date": "YYYY-MM-DD", "count"}] per day from `since`, oldest first; empty days are omitted."""
+    start = day_bucket(since)
+    bucket_range = {"$gte": start}
+    if until is not None:
+        bucket_range["$lt"] = until
+
+    rows = await db[ROLLUPS].aggregate([
+        {"$match": {"granularity": "day", "bucket": bucket_range}},
+        {"$group": {"_id": "$bucket", "count": {"$sum": "$count"}}},
+        {"$match": {"count": {"$gt": 0}}},
+        {"$sort": {"_id": 1}},
+    ]).to_list(length=None)
+    return [{"date": r["_id"].strftime("%Y-%m-%d"), "count": r["count"]} for r in rows]
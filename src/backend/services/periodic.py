@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    Background job started and stopped from the app lifespan.
+
+    Subclasses implement tick(), which returns counters to add to stats, and
+    may override setup(), which runs once before the first tick. A failing
+    setup or tick is logged and counted, and the loop keeps going.
+    """
+
+    name = "Periodic task"
+
+    def __init__(self, enabled: bool, interval: float, counters: Iterable[str] = ()):
+        self.enabled = enabled
+        self.interval = interval
+        self.last_run: Optional[datetime] = None
+        self.stats = {"runs": 0, **{c: 0 for c in counters}, "errors": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    async def setup(self) -> None:
+        pass
+
+    async def tick(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        if not self.enabled or self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None,
+            "interval_seconds": self.interval,
+            "last_run": self.last_run,
+            **self.stats,
+        }
+
+    async def _run(self) -> None:
+        try:
+            await self.setup()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning("%s setup failed: %s", self.name, e)
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> Dict[str, int]:
+        try:
+            counts = await self.tick()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning("%s failed: %s", self.name, e)
+            return {}
+        self.last_run = datetime.utcnow()
+        self.stats["runs"] += 1
+        for key, n in counts.items():
+            self.stats[key] = self.stats.get(key, 0) + n
+        return counts
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import OperationFailure
+
+from agents.respond_agent import new_counters, respond_to_detections, run_respond_agent
+from db.mongo import db
+from services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+RESPOND_WORKER_ENABLED = os.getenv("RESPOND_WORKER_ENABLED", "false").lower() == "true"
+RESPOND_WORKER_QUEUE_SIZE = int(os.getenv("RESPOND_WORKER_QUEUE_SIZE", "1000"))
+RESPOND_WORKER_BATCH_SIZE = int(os.getenv("RESPOND_WORKER_BATCH_SIZE", "200"))
+# How long the consumer waits for more detections before correlating a partial batch
+RESPOND_WORKER_LINGER_MS = int(os.getenv("RESPOND_WORKER_LINGER_MS", "100"))
+RESPOND_WORKER_POLL_SECONDS = float(os.getenv("RESPOND_WORKER_POLL_SECONDS", "5"))
+
+_STATE_ID = "respond_worker"
+# Server codes for "no change streams here" (standalone / no oplog) and "token too old"
+_NO_CHANGE_STREAMS = {40573, 40324}
+_HISTORY_LOST = {286, 280}
+
+
+class RespondWorker:
+    """
+    Opens incidents as detections are inserted, instead of on /api/respond/run.
+
+    - A producer tails a change stream on detections (inserts only) and puts
+      each new detection on a bounded queue. A full queue blocks the
+      producer, so the stream is read no faster than incidents are written.
+    - A consumer takes up to RESPOND_WORKER_BATCH_SIZE detections (waiting at
+      most RESPOND_WORKER_LINGER_MS for a batch to fill) and runs the batch
+      correlator on them. After the batch is written it stores the resume
+      token of its last event in worker_state, so a restart resumes after the
+      last handled insert (at-least-once; handled detections are skipped).
+      If a batch fails, the consumer re-runs the catch-up until it succeeds
+      before taking more, so no later token is saved past unhandled rows.
+    - Without change streams (standalone server) it polls for
+      incident_handled == False every RESPOND_WORKER_POLL_SECONDS.
+    """
+
+    def __init__(self, enabled: bool = RESPOND_WORKER_ENABLED):
+        self.enabled = enabled
+        self.mode: Optional[str] = None  # "change_stream" | "polling"
+        self.stats = {"received": 0, "batches": 0, "incidents_opened": 0, "incidents_attached": 0, "errors": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        if not self.enabled or self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=RESPOND_WORKER_QUEUE_SIZE)
+        self._tasks = [asyncio.create_task(self._produce()), asyncio.create_task(self._consume())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.mode = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": bool(self._tasks),
+            "mode": self.mode,
+            "queued": self._queue.qsize() if self._queue else 0,
+            **self.stats,
+        }
+
+    # ---- producer ----
+    async def _produce(self) -> None:
+        while True:
+            try:
+                state = await db["worker_state"].find_one({"_id": _STATE_ID}) or {}
+                token = state.get("resume_token")
+                # Without a token, start the stream from before the catch-up so no insert falls in between
+                start_at = None if token else (await db.command("hello")).get("operationTime")
+                # Detections inserted while the worker was down
+                await self._catch_up()
+                await self._tail(token, start_at)
+            except OperationFailure as e:
+                if e.code in _NO_CHANGE_STREAMS:
+                    logger.info("Change streams unavailable (%s); respond worker is polling", e)
+                    await self._poll()
+                    return
+                if e.code in _HISTORY_LOST:
+                    # Start a fresh stream; the catch-up above covers the gap
+                    logger.warning("Respond worker resume token expired")
+                    await self._save_token(None)
+                    continue
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning("Respond worker change stream error, retrying: %s", e)
+                await asyncio.sleep(RESPOND_WORKER_POLL_SECONDS)
+
+    async def _tail(self, token, start_at) -> None:
+        async with db["detections"].watch(
+            [{"$match": {"operationType": "insert"}}],
+            resume_after=token,
+            start_at_operation_time=start_at,
+        ) as stream:
+            self.mode = "change_stream"
+            async for change in stream:
+                # Blocks while the queue is full (backpressure)
+                await self._queue.put((change["_id"], change["fullDocument"]))
+                self.stats["received"] += 1
+
+    async def _poll(self) -> None:
+        self.mode = "polling"
+        while True:
+            try:
+                await self._catch_up()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning("Respond worker poll failed: %s", e)
+            await asyncio.sleep(RESPOND_WORKER_POLL_SECONDS)
+
+    async def _catch_up(self) -> None:
+        # run_respond_agent stops at RESPOND_MAX_DETECTIONS; drain the whole backlog
+        while True:
+            counters = await run_respond_agent()
+            self._count(counters)
+            if not counters["detections_processed"]:
+                return
+
+    # ---- consumer ----
+    async def _consume(self) -> None:
+        while True:
+            token, first = await self._queue.get()
+            batch = [first]
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + RESPOND_WORKER_LINGER_MS / 1000
+            while len(batch) < RESPOND_WORKER_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    token, doc = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(doc)
+
+            try:
+                counters = new_counters()
+                await respond_to_detections(batch, counters)
+                self.stats["batches"] += 1
+                self._count(counters)
+                await self._save_token(token)
+                await response_cache.invalidate("detections")
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error("Respond worker batch of %d failed: %s", len(batch), e)
+                # The batch is still unhandled in the DB; handle it before any later token is saved
+                await self._recover()
+
+    async def _recover(self) -> None:
+        while True:
+            try:
+                await self._catch_up()
+                return
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning("Respond worker catch-up failed, retrying: %s", e)
+                await asyncio.sleep(RESPOND_WORKER_POLL_SECONDS)
+
+    def _count(self, counters: Dict[str, int]) -> None:
+        self.stats["incidents_opened"] += counters["incidents_opened"]
+        self.stats["incidents_attached"] += counters["incidents_attached"]
+
+    async def _save_token(self, token) -> None:
+        await db["worker_state"].update_one(
+            {"_id": _STATE_ID}, {"$set": {"resume_token": token}}, upsert=True
+        )
+
+
+# Global worker instance
+respond_worker = RespondWorker()
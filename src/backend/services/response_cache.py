@@ -0,0 +1,167 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Protocol, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() != "false"
+
+
+class CacheBackend(Protocol):
+    """Storage for cached responses; swap in a shared store (e.g. Redis) for multi-process deployments."""
+
+    async def get(self, key: str) -> Optional[Any]: ...
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None: ...
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        hit = self._data.get(key)
+        if hit is None:
+            return None
+        expires, value = hit
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+
+class ResponseCache:
+    """
+    Tag-invalidated cache for JSON route responses.
+
+    Each tag has a version kept in the backend. A response is stored under a
+    key that includes the current versions of its tags, so invalidate(tag)
+    only bumps the version: older entries are never read again and age out
+    of the LRU. Concurrent misses on the same key share one computation.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.enabled = RESPONSE_CACHE_ENABLED
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def _tag_versions(self, tags: Iterable[str]) -> str:
+        versions = []
+        for tag in sorted(tags):
+            versions.append(f"{tag}={await self.backend.get('tag:' + tag) or 0}")
+        return ",".join(versions)
+
+    async def invalidate(self, *tags: str) -> None:
+        """Drop every cached response carrying any of these tags."""
+        for tag in tags:
+            # A fresh timestamp keeps versions unique without a read-modify-write
+            await self.backend.set("tag:" + tag, time.time_ns())
+        self.stats["invalidations"] += 1
+
+    async def get_or_compute(
+        self, key: str, tags: Iterable[str], compute: Callable[[], Awaitable[Any]], ttl: Optional[float] = None
+    ) -> Tuple[str, bytes]:
+        """Return (etag, JSON body) for `key`, computing and storing it on a miss."""
+        full_key = f"{key}|{await self._tag_versions(tags)}"
+        entry = await self.backend.get(full_key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry
+
+        pending = self._inflight.get(full_key)
+        if pending is not None:
+            self.stats["hits"] += 1
+            return await asyncio.shield(pending)
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            body = json.dumps(jsonable_encoder(await compute()), separators=(",", ":")).encode()
+            entry = (f'"{hashlib.sha1(body).hexdigest()}"', body)
+            await self.backend.set(full_key, entry, ttl or self.ttl)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the error; mark it retrieved in case there are none
+            future.exception()
+            raise
+        finally:
+            del self._inflight[full_key]
+
+
+# Global cache instance
+response_cache = ResponseCache()
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [t.strip().removeprefix("W/") for t in header.split(",")]
+
+
+def cached_response(*tags: str, ttl: Optional[float] = None):
+    """
+    Cache a JSON route's response under `tags` (see ResponseCache.invalidate).
+
+    The key is the route plus its parameters. Responses carry an ETag, and a
+    GET with a matching If-None-Match gets a 304 without touching the DB.
+    """
+
+    def decorator(func):
+        sig = inspect.signature(func)
+        has_request = "request" in sig.parameters
+        if not has_request:
+            params = [*sig.parameters.values(),
+                      inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)]
+            sig = sig.replace(parameters=params)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            request: Request = kwargs["request"] if has_request else kwargs.pop("request")
+            if not response_cache.enabled:
+                return await func(*args, **kwargs)
+
+            params = {k: v for k, v in kwargs.items() if k != "request"}
+            key = f"{func.__module__}.{func.__qualname__}:" + json.dumps(
+                jsonable_encoder(params), sort_keys=True, separators=(",", ":")
+            )
+            etag, body = await response_cache.get_or_compute(key, tags, lambda: func(*args, **kwargs), ttl)
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if request.method in ("GET", "HEAD") and _etag_matches(request.headers.get("if-none-match"), etag):
+                response_cache.stats["not_modified"] += 1
+                return Response(status_code=304, headers=headers)
+            return Response(content=body, media_type="application/json", headers=headers)
+
+        wrapper.__signature__ = sig
+        return wrapper
+
+    return decorator
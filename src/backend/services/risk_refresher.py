@@ -0,0 +1,31 @@
+import os
+from typing import Dict
+
+from agents.identify_agent import refresh_asset_risk_summary
+from services.periodic import PeriodicTask
+
+RISK_REFRESH_ENABLED = os.getenv("RISK_REFRESH_ENABLED", "true").lower() != "false"
+RISK_REFRESH_INTERVAL_SECONDS = float(os.getenv("RISK_REFRESH_INTERVAL_SECONDS", "3600"))
+
+
+class RiskRefresher(PeriodicTask):
+    """
+    Recomputes every asset's risk summary on an interval.
+
+    Link writes only refresh the assets they touch, so without a periodic
+    full pass max_sev_7d / max_sev_30d / risk_score never drop as intel
+    leaves the 7- and 30-day windows. Runs once at startup, then every
+    RISK_REFRESH_INTERVAL_SECONDS.
+    """
+
+    name = "Asset risk refresh"
+
+    def __init__(self, enabled: bool = RISK_REFRESH_ENABLED, interval: float = RISK_REFRESH_INTERVAL_SECONDS):
+        super().__init__(enabled, interval, counters=("assets_refreshed",))
+
+    async def tick(self) -> Dict[str, int]:
+        return {"assets_refreshed": await refresh_asset_risk_summary()}
+
+
+# Global refresher instance
+risk_refresher = RiskRefresher()
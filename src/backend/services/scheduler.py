@@ -11,6 +11,7 @@ from apscheduler.executors.asyncio import AsyncIOExecutor
 from .osint.otx_client import OTXClient
 from ..db.models import IntelEvent
 from ..db import db
+from .response_cache import response_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -138,6 +139,7 @@ class SchedulerService:
                     logger.error(f"Failed to collect intelligence for {indicator}: {e}")
                     continue
             
+            await response_cache.invalidate("intel")
             logger.info(f"OTX intelligence collection completed. Collected {collected_count} events")
             
         except Exception as e:
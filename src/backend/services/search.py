@@ -0,0 +1,69 @@
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# "estimated" counts stop here and report the total as a lower bound
+SEARCH_COUNT_CAP = int(os.getenv("SEARCH_COUNT_CAP", "1000"))
+
+
+# ---------------------------
+# Full-text (incidents)
+# ---------------------------
+def text_search(search: str) -> Tuple[Dict[str, Any], Dict[str, Any], List[tuple]]:
+    """
+    (filter, projection, sort) for a ranked $text search.
+
+    Served by the collection's text index (see db/indexes.py): words are
+    stemmed and case-insensitive, "quoted phrases" and -excluded words work,
+    and results are ordered by textScore, best first.
+    """
+    score = {"$meta": "textScore"}
+    return {"$text": {"$search": search}}, {"score": score}, [("score", score)]
+
+
+# ---------------------------
+# Exact / prefix filters (detections)
+# ---------------------------
+def prefix_match(value: str, lower: bool = False, upper: bool = False) -> Dict[str, Any]:
+    """
+    Case-sensitive anchored regex. Unlike an unanchored or /i regex, a "^prefix"
+    regex is a bounded range scan on the field's index. Normalize the case to
+    how the field is stored with lower/upper.
+    """
+    value = value.strip()
+    if lower:
+        value = value.lower()
+    if upper:
+        value = value.upper()
+    return {"$regex": f"^{re.escape(value)}"}
+
+
+def id_match(value: str) -> Any:
+    """Match an id stored as an ObjectId or as its string form."""
+    value = value.strip()
+    try:
+        return {"$in": [ObjectId(value), value]}
+    except (InvalidId, TypeError):
+        return value
+
+
+# ---------------------------
+# Counts
+# ---------------------------
+async def count_matches(collection, query: Dict[str, Any], mode: str = "exact") -> Tuple[int, bool]:
+    """
+    (total, is_lower_bound) for `query`.
+
+    mode="estimated": an unfiltered count comes from collection metadata, and a
+    filtered one stops at SEARCH_COUNT_CAP, so paging a broad search does not
+    re-count every match on each page.
+    """
+    if mode != "estimated":
+        return await collection.count_documents(query), False
+    if not query:
+        return await collection.estimated_document_count(), False
+    total = await collection.count_documents(query, limit=SEARCH_COUNT_CAP)
+    return total, total >= SEARCH_COUNT_CAP
@@ -0,0 +1,40 @@
+import logging
+import os
+from typing import Dict
+
+from agents.respond_agent import backfill_sla_thresholds, sweep_sla_status
+from services.periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+SLA_SWEEP_ENABLED = os.getenv("SLA_SWEEP_ENABLED", "true").lower() != "false"
+SLA_SWEEP_INTERVAL_SECONDS = float(os.getenv("SLA_SWEEP_INTERVAL_SECONDS", "60"))
+
+
+class SLASweeper(PeriodicTask):
+    """
+    Keeps incidents.sla_status current between status changes.
+
+    compute_sla_status only runs when an incident moves phase, so without this
+    an untouched incident stays "ok" past its due time. On start the sweeper
+    backfills at_risk_at on older incidents; then every
+    SLA_SWEEP_INTERVAL_SECONDS it runs sweep_sla_status, so SLA dashboards can
+    filter on sla_status alone.
+    """
+
+    name = "SLA sweep"
+
+    def __init__(self, enabled: bool = SLA_SWEEP_ENABLED, interval: float = SLA_SWEEP_INTERVAL_SECONDS):
+        super().__init__(enabled, interval, counters=("at_risk", "breached"))
+
+    async def setup(self) -> None:
+        backfilled = await backfill_sla_thresholds()
+        if backfilled:
+            logger.info("Backfilled at_risk_at on %d incidents", backfilled)
+
+    async def tick(self) -> Dict[str, int]:
+        return await sweep_sla_status()
+
+
+# Global sweeper instance
+sla_sweeper = SLASweeper()
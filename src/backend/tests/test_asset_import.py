@@ -0,0 +1,34 @@
+import io
+
+import pytest
+
+from services import asset_import
+from services.asset_import import _chunks, iter_csv_rows, iter_json_rows
+
+
+def test_iter_json_rows_across_small_reads(monkeypatch):
+    monkeypatch.setattr(asset_import, "_READ_SIZE", 5)
+    data = b' [ {"name": "web,]01"}, {"tags": [1, 2]} ,3 ] '
+    assert list(iter_json_rows(io.BytesIO(data))) == [{"name": "web,]01"}, {"tags": [1, 2]}, 3]
+
+
+def test_iter_json_rows_ndjson():
+    data = b'{"name": "a"}\n{"name": "b"}\n'
+    assert [r["name"] for r in iter_json_rows(io.BytesIO(data))] == ["a", "b"]
+
+
+def test_iter_json_rows_invalid():
+    with pytest.raises(ValueError):
+        list(iter_json_rows(io.BytesIO(b'[{"name": ')))
+
+
+def test_iter_csv_rows_strips_bom():
+    rows = list(iter_csv_rows(io.BytesIO("\ufeffname,ip\nweb01,10.0.0.1\n".encode("utf-8"))))
+    assert rows == [{"name": "web01", "ip": "10.0.0.1"}]
+
+
+def test_chunks_yield_rows_before_a_parse_error():
+    chunks = _chunks(iter_json_rows(io.BytesIO(b'[{"name": "a"}, {"name": "b"}, {"name": ')), 10)
+    assert [r["name"] for r in next(chunks)] == ["a", "b"]
+    with pytest.raises(ValueError):
+        next(chunks)
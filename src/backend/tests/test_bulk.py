@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+
+from db.bulk import BulkWriter
+
+
+class _Result:
+    def __init__(self, n):
+        self.inserted_count = n
+        self.matched_count = 0
+        self.modified_count = 0
+        self.upserted_count = 0
+
+
+class _FakeCollection:
+    def __init__(self):
+        self.calls = []
+
+    async def bulk_write(self, ops, ordered=True):
+        self.calls.append((len(ops), ordered))
+        return _Result(len(ops))
+
+
+def test_bulk_writer_flushes_in_unordered_chunks():
+    col = _FakeCollection()
+
+    async def run():
+        async with BulkWriter(col, batch_size=3) as writer:
+            for i in range(7):
+                await writer.add(InsertOne({"_id": i}))
+        return writer
+
+    writer = asyncio.run(run())
+    assert col.calls == [(3, False), (3, False), (1, False)]
+    assert [b["inserted"] for b in writer.batches] == [3, 3, 1]
+    assert writer.totals()["inserted"] == 7
+
+
+class _FailingCollection:
+    name = "intel_events"
+
+    def __init__(self, code):
+        self.code = code
+
+    async def bulk_write(self, ops, ordered=True):
+        raise BulkWriteError({
+            "nInserted": len(ops) - 1,
+            "writeErrors": [{"index": 0, "code": self.code, "errmsg": "boom"}],
+        })
+
+
+def test_bulk_writer_counts_duplicates_and_raises_other_errors():
+    async def run(code):
+        writer = BulkWriter(_FailingCollection(code), batch_size=10)
+        await writer.add(InsertOne({"_id": 1}))
+        await writer.add(InsertOne({"_id": 2}))
+        await writer.flush()
+        return writer
+
+    writer = asyncio.run(run(11000))
+    assert writer.totals()["errors"] == 1 and writer.totals()["inserted"] == 1
+
+    with pytest.raises(BulkWriteError):
+        asyncio.run(run(121))
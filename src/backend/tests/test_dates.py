@@ -0,0 +1,30 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from db.dates import normalize_dates, time_range, to_utc_datetime
+
+
+def test_to_utc_datetime_formats():
+    expected = datetime(2025, 10, 2, 12, 0)
+    assert to_utc_datetime("2025-10-02T12:00:00Z") == expected
+    assert to_utc_datetime("2025-10-02T14:00:00+02:00") == expected
+    assert to_utc_datetime(datetime(2025, 10, 2, 12, tzinfo=timezone.utc)) == expected
+    assert to_utc_datetime(expected.replace(tzinfo=timezone.utc).timestamp()) == expected
+    assert to_utc_datetime(date(2025, 10, 2)) == datetime(2025, 10, 2)
+    assert to_utc_datetime("") is None
+    with pytest.raises(ValueError):
+        to_utc_datetime("yesterday")
+
+
+def test_normalize_dates_leaves_bad_values():
+    doc = normalize_dates({"created_at": "2025-10-02T12:00:00Z", "last_seen": "soon"}, ("created_at", "last_seen"))
+    assert doc == {"created_at": datetime(2025, 10, 2, 12, 0), "last_seen": "soon"}
+
+
+def test_time_range_is_a_plain_range_predicate():
+    since = datetime(2025, 10, 1)
+    assert time_range("created_at", since=since, until=since + timedelta(days=1)) == {
+        "created_at": {"$gte": since, "$lt": datetime(2025, 10, 2)}
+    }
+    assert time_range("created_at") == {}
@@ -0,0 +1,18 @@
+from agents.detect_agent import match_ttp
+
+
+def test_match_ttp_respects_word_boundaries():
+    assert "T1059.003" not in match_ttp("operator issued a command to the host")
+    assert match_ttp("attacker spawned cmd.exe") == ["T1059.003"]
+
+
+def test_match_ttp_dedups_and_keeps_keyword_order():
+    ttps = match_ttp("Brute force and password spray against RDP")
+    assert ttps == ["T1110", "T1021.001", "T1003", "T1555"]
+    assert len(ttps) == len(set(ttps))
+
+
+def test_match_ttp_multi_word_keywords():
+    assert "T1071" in match_ttp("Cobalt Strike command and control beacon")
+    assert "T1588.001" in match_ttp("Cobalt Strike command and control beacon")
+    assert match_ttp("nothing to see here") == []
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from services.detect_rollups import rollup_deltas
+
+
+def test_new_detection_counts_in_hour_and_day():
+    seen = datetime(2025, 10, 2, 13, 45)
+    deltas = rollup_deltas([{"source": "otx", "severity": 4, "asset_id": "a1", "last_seen": seen, "prev_last_seen": None}])
+    assert deltas == {
+        ("hour", datetime(2025, 10, 2, 13), "otx", 4, "a1"): 1,
+        ("day", datetime(2025, 10, 2), "otx", 4, "a1"): 1,
+    }
+
+
+def test_dedup_hit_moves_between_buckets():
+    change = {"source": "otx", "severity": 4, "asset_id": "a1"}
+    deltas = rollup_deltas([
+        # same hour: nothing changes
+        {**change, "prev_last_seen": datetime(2025, 10, 2, 13, 5), "last_seen": datetime(2025, 10, 2, 13, 50)},
+        # next hour, same day: moves only the hourly count
+        {**change, "prev_last_seen": datetime(2025, 10, 2, 13, 5), "last_seen": datetime(2025, 10, 2, 14, 1)},
+    ])
+    assert +deltas == {("hour", datetime(2025, 10, 2, 14), "otx", 4, "a1"): 1}
+    assert deltas[("hour", datetime(2025, 10, 2, 13), "otx", 4, "a1")] == -1
+    assert ("day", datetime(2025, 10, 2), "otx", 4, "a1") not in deltas
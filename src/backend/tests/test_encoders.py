@@ -0,0 +1,19 @@
+import json
+from datetime import datetime
+
+from bson import Decimal128, ObjectId
+
+from db.encoders import BSONResponse, dumps_bson
+
+
+def test_dumps_bson_nested_documents():
+    oid = ObjectId()
+    doc = {"_id": oid, "refs": [oid], "ts": datetime(2025, 10, 2, 12, 0), "score": Decimal128("1.5"), "n": 3}
+    assert json.loads(dumps_bson(doc)) == {
+        "_id": str(oid), "refs": [str(oid)], "ts": "2025-10-02T12:00:00", "score": "1.5", "n": 3,
+    }
+
+
+def test_bson_response_renders_raw_documents():
+    oid = ObjectId()
+    assert json.loads(BSONResponse({"_id": oid}).body) == {"_id": str(oid)}
@@ -0,0 +1,26 @@
+from agents.identify_agent import classify_assets, infer_type
+
+
+def test_infer_type_family_priority():
+    assert infer_type("web-server01") == "HW"
+    # leftmost keyword is "app" (SW), but "server" (HW) ranks higher
+    assert infer_type("appserver") == "HW"
+    assert infer_type("database-backup") == "Data"
+    assert infer_type("payroll") == "SW"
+
+
+def test_infer_type_email_and_hostname_first():
+    assert infer_type("web-server", owner="ops@acme.com") == "User"
+    assert infer_type("web-server", hostname="api.acme.local") == "Service"
+
+
+def test_classify_assets_diff():
+    diffs = classify_assets([
+        {"_id": 1, "name": "hr-team", "type": "User", "criticality": 3},
+        {"_id": 2, "name": "finance-db", "type": "", "data_sensitivity": "High"},
+    ])
+    assert diffs == [{
+        "_id": 2,
+        "name": "finance-db",
+        "changes": {"type": {"from": "", "to": "SW"}, "criticality": {"from": None, "to": 5}},
+    }]
@@ -0,0 +1,65 @@
+import asyncio
+
+from db.indexes import INDEXES, reconcile_indexes
+
+
+class _FakeCollection:
+    def __init__(self, existing=None):
+        self.existing = {"_id_": {"key": [("_id", 1)]}, **(existing or {})}
+        self.created = []
+
+    async def index_information(self):
+        return self.existing
+
+    async def create_indexes(self, models):
+        names = [m.document["name"] for m in models]
+        self.created.extend(names)
+        return names
+
+
+class _FakeDb(dict):
+    def __missing__(self, name):
+        self[name] = _FakeCollection()
+        return self[name]
+
+
+def test_reconcile_matches_by_keys_and_never_drops():
+    db = _FakeDb()
+    db["restore_tests"] = _FakeCollection({
+        "asset_last_test": {"key": [("asset_id", 1), ("test_completed_at", -1.0)]},
+    })
+    db["assets"] = _FakeCollection({
+        "ip_1": {"key": [("ip", 1)], "unique": True},
+        "owner_1": {"key": [("owner", 1)]},
+    })
+
+    report = asyncio.run(reconcile_indexes(db))
+
+    assert report["restore_tests"]["present"] == ["asset_last_test"]
+    assert db["restore_tests"].created == []
+    assert report["assets"]["conflicts"] == ["ip_1"]
+    assert report["assets"]["extra"] == ["owner_1"]
+    assert db["assets"].created == ["hostname_1", "asset_id_1"]
+    assert db["incidents"].created == [
+        "status_1_dedup_key.asset_id_1_dedup_key.indicator_1_dedup_key.source_1_opened_at_-1",
+        "opened_at_-1",
+        "incident_text",
+        "sla_status_1_status_1_at_risk_at_1",
+        "sla_status_1_status_1_sla_due_at_1",
+    ]
+    assert set(report) == set(INDEXES)
+
+
+def test_text_index_matches_server_key_pattern():
+    db = _FakeDb()
+    db["incidents"] = _FakeCollection({
+        "incident_text": {
+            "key": [("_fts", "text"), ("_ftsx", 1)],
+            "weights": {"title": 10, "owner": 5, "summary": 2},
+        },
+    })
+
+    report = asyncio.run(reconcile_indexes(db))
+
+    assert report["incidents"]["present"] == ["incident_text"]
+    assert "incident_text" not in db["incidents"].created
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from services.alerts.notifier import AlertDispatcher
+
+
+class _StubWebhook(BaseHTTPRequestHandler):
+    """Records posted cards; fails the first request with 503 to exercise retry."""
+
+    received = []
+    fail_first = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if _StubWebhook.fail_first:
+            _StubWebhook.fail_first = False
+            self.send_response(503)
+        else:
+            _StubWebhook.received.append(body)
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _alert(key, title):
+    return {"key": key, "title": title, "card": {"text": title}}
+
+
+def test_dispatcher_coalesces_per_asset_and_retries():
+    server = HTTPServer(("127.0.0.1", 0), _StubWebhook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    async def run():
+        dispatcher = AlertDispatcher(webhook_url=url, window_seconds=0.2, backoff_base=0.01)
+        await dispatcher.start()
+        for i in range(3):
+            assert dispatcher.enqueue(_alert("asset-a", f"a{i}"))
+        assert dispatcher.enqueue(_alert("asset-b", "b0"))
+        await asyncio.sleep(0.5)
+        await dispatcher.stop()
+        return dispatcher.stats
+
+    try:
+        stats = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    assert stats["sent"] == 2
+    assert stats["coalesced"] == 2
+    cards = {c.get("text") or c["summary"]: c for c in _StubWebhook.received}
+    assert "b0" in cards
+    digest = cards["3 new alerts for asset-a"]
+    assert [f["value"] for f in digest["sections"][0]["facts"]] == ["a0", "a1", "a2"]
+
+
+def test_dispatcher_without_webhook_drops():
+    dispatcher = AlertDispatcher(webhook_url=None)
+    assert dispatcher.enqueue(_alert("x", "y")) is False
+    assert dispatcher.stats["dropped"] == 1
@@ -0,0 +1,34 @@
+import asyncio
+
+from services.periodic import PeriodicTask
+
+
+class _Counter(PeriodicTask):
+    def __init__(self, results):
+        super().__init__(enabled=True, interval=0.01, counters=("done",))
+        self.results = results
+        self.setups = 0
+
+    async def setup(self):
+        self.setups += 1
+
+    async def tick(self):
+        result = self.results.pop(0) if self.results else {"done": 0}
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_periodic_task_counts_ticks_and_survives_errors():
+    task = _Counter([{"done": 2}, RuntimeError("db down"), {"done": 3}])
+
+    async def run():
+        await task.start()
+        await asyncio.sleep(0.1)
+        await task.stop()
+
+    asyncio.run(run())
+    status = task.status()
+    assert task.setups == 1
+    assert status["done"] == 5 and status["errors"] == 1
+    assert status["runs"] >= 2 and not status["running"]
@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from agents import respond_agent as ra
+from agents.respond_agent import compute_sla_status, correlate_detections, sla_at_risk_at, sla_transitions
+
+
+def test_correlate_same_key_in_batch_joins_one_new_incident():
+    asset = ObjectId()
+    open_id = ObjectId()
+    dets = [
+        {"_id": 1, "asset_id": asset, "indicator": "1.1.1.1", "source": "otx"},
+        {"_id": 2, "asset_id": asset, "indicator": "1.1.1.1", "source": "otx"},
+        {"_id": 3, "asset_id": asset, "indicator": "9.9.9.9", "source": "otx"},
+    ]
+    open_incidents = {(str(asset), "9.9.9.9", "otx"): {"_id": open_id}}
+
+    new_keys, attach = correlate_detections(dets, open_incidents)
+
+    assert [[d["_id"] for d in group] for group in new_keys.values()] == [[1, 2]]
+    assert {k: [d["_id"] for d in v] for k, v in attach.items()} == {open_id: [3]}
+
+
+def test_at_risk_at_is_where_compute_sla_status_turns_at_risk():
+    opened = datetime(2025, 1, 1)
+    due = opened + timedelta(hours=8)
+    at_risk_at = sla_at_risk_at(opened, due)
+
+    assert at_risk_at == opened + timedelta(hours=6)
+    assert compute_sla_status(at_risk_at, opened, due) == "ok"
+    assert compute_sla_status(at_risk_at + timedelta(seconds=1), opened, due) == "at_risk"
+
+
+def test_sla_transitions_breach_first_and_skip_closed():
+    now = datetime(2025, 1, 1)
+    (first, breach), (second, at_risk) = sla_transitions(now)
+
+    assert (first, second) == ("breached", "at_risk")
+    assert breach["sla_due_at"] == {"$lte": now}
+    assert at_risk == {"sla_status": "ok", "status": at_risk["status"], "at_risk_at": {"$lt": now}}
+    assert "Closed" not in at_risk["status"]["$in"]
+
+
+def test_alerts_are_queued_only_after_incidents_are_stored(monkeypatch):
+    queued = []
+
+    class _Col:
+        def __init__(self, fail=False):
+            self.fail = fail
+
+        async def insert_many(self, docs, ordered=True):
+            if self.fail:
+                raise RuntimeError("insert failed")
+
+        async def bulk_write(self, ops, ordered=True):
+            pass
+
+        async def update_many(self, *args, **kwargs):
+            pass
+
+    async def no_open_incidents(keys, now):
+        return {}
+
+    monkeypatch.setattr(ra, "_load_open_incidents", no_open_incidents)
+    monkeypatch.setattr(ra.alert_dispatcher, "enqueue", queued.append)
+    for name in ("incident_tasks_col", "incident_timeline_col", "detections_col"):
+        monkeypatch.setattr(ra, name, _Col())
+    det = {"_id": ObjectId(), "indicator": "1.1.1.1", "source": "otx", "severity": "P2"}
+
+    monkeypatch.setattr(ra, "incidents_col", _Col(fail=True))
+    with pytest.raises(RuntimeError):
+        asyncio.run(ra._respond_batch([det], ra.new_counters()))
+    assert queued == []
+
+    monkeypatch.setattr(ra, "incidents_col", _Col())
+    asyncio.run(ra._respond_batch([det], ra.new_counters()))
+    assert len(queued) == 1 and queued[0]["urgent"]
+
+
+def test_partial_insert_failure_still_writes_stored_incidents(monkeypatch):
+    queued, writes = [], {}
+
+    class _Col:
+        def __init__(self, name, fail_index=None):
+            self.name, self.fail_index = name, fail_index
+
+        async def insert_many(self, docs, ordered=True):
+            writes[self.name] = docs
+            if self.fail_index is not None:
+                raise BulkWriteError({"writeErrors": [{"index": self.fail_index, "code": 121}]})
+
+        async def bulk_write(self, ops, ordered=True):
+            writes["attach"] = ops
+
+        async def update_many(self, query, update):
+            writes["handled"] = query["_id"]["$in"]
+
+    async def open_incidents(keys, now):
+        return {(str(asset), "9.9.9.9", "otx"): {"_id": open_id}}
+
+    asset, open_id = ObjectId(), ObjectId()
+    dets = [
+        {"_id": ObjectId(), "asset_id": asset, "indicator": "1.1.1.1", "source": "otx", "severity": "P3"},
+        {"_id": ObjectId(), "asset_id": asset, "indicator": "2.2.2.2", "source": "otx", "severity": "P3"},
+        {"_id": ObjectId(), "asset_id": asset, "indicator": "9.9.9.9", "source": "otx", "severity": "P3"},
+    ]
+
+    class _Assets:
+        def find(self, query):
+            async def rows():
+                yield {"_id": asset, "owner": "it"}
+            return rows()
+
+    monkeypatch.setattr(ra, "_load_open_incidents", open_incidents)
+    monkeypatch.setattr(ra.alert_dispatcher, "enqueue", queued.append)
+    monkeypatch.setattr(ra, "db", type("_Db", (), {"assets": _Assets()})())
+    monkeypatch.setattr(ra, "incidents_col", _Col("incidents", fail_index=0))
+    monkeypatch.setattr(ra, "incident_tasks_col", _Col("tasks"))
+    monkeypatch.setattr(ra, "incident_timeline_col", _Col("timeline"))
+    monkeypatch.setattr(ra, "detections_col", _Col("detections"))
+
+    with pytest.raises(BulkWriteError):
+        asyncio.run(ra._respond_batch(dets, ra.new_counters()))
+
+    failed, stored = writes["incidents"]
+    assert {t["incident_id"] for t in writes["tasks"]} == {stored["_id"]}
+    assert {r["incident_id"] for r in writes["timeline"]} == {stored["_id"], open_id}
+    assert len(writes["attach"]) == 1
+    assert len(queued) == 1
+    # The failed incident's detection is left unhandled for the next run
+    assert writes["handled"] == [dets[1]["_id"], dets[2]["_id"]]
@@ -0,0 +1,80 @@
+import asyncio
+
+from services import respond_worker as rw
+
+
+def test_consumer_batches_queue_and_checkpoints_last_token(monkeypatch):
+    batches, tokens = [], []
+
+    async def fake_respond(detections, counters):
+        batches.append([d["_id"] for d in detections])
+        counters["incidents_opened"] += 1
+
+    monkeypatch.setattr(rw, "respond_to_detections", fake_respond)
+    monkeypatch.setattr(rw, "RESPOND_WORKER_BATCH_SIZE", 3)
+
+    async def run():
+        worker = rw.RespondWorker(enabled=True)
+
+        async def save_token(token):
+            tokens.append(token)
+
+        worker._save_token = save_token
+        worker._queue = asyncio.Queue(maxsize=10)
+        for i in range(5):
+            worker._queue.put_nowait((f"tok{i}", {"_id": i}))
+        consumer = asyncio.create_task(worker._consume())
+        await asyncio.sleep(0.3)
+        consumer.cancel()
+        return worker
+
+    worker = asyncio.run(run())
+    assert batches == [[0, 1, 2], [3, 4]]
+    assert tokens == ["tok2", "tok4"]
+    assert worker.stats["batches"] == 2
+
+
+def test_catch_up_drains_backlog_past_the_run_cap(monkeypatch):
+    passes = [5000, 5000, 3, 0]
+
+    async def fake_run():
+        counters = rw.new_counters()
+        counters["detections_processed"] = passes.pop(0)
+        return counters
+
+    monkeypatch.setattr(rw, "run_respond_agent", fake_run)
+    asyncio.run(rw.RespondWorker(enabled=True)._catch_up())
+    assert passes == []
+
+
+def test_failed_batch_is_caught_up_before_next_token(monkeypatch):
+    events = []
+
+    async def fake_respond(detections, counters):
+        if detections[0]["_id"] == 0:
+            raise RuntimeError("write failed")
+        events.append(("batch", [d["_id"] for d in detections]))
+
+    monkeypatch.setattr(rw, "respond_to_detections", fake_respond)
+    monkeypatch.setattr(rw, "RESPOND_WORKER_BATCH_SIZE", 1)
+
+    async def run():
+        worker = rw.RespondWorker(enabled=True)
+
+        async def save_token(token):
+            events.append(("token", token))
+
+        async def catch_up():
+            events.append(("catch_up",))
+
+        worker._save_token = save_token
+        worker._catch_up = catch_up
+        worker._queue = asyncio.Queue(maxsize=10)
+        for i in range(2):
+            worker._queue.put_nowait((f"tok{i}", {"_id": i}))
+        consumer = asyncio.create_task(worker._consume())
+        await asyncio.sleep(0.3)
+        consumer.cancel()
+
+    asyncio.run(run())
+    assert events == [("catch_up",), ("batch", [1]), ("token", "tok1")]
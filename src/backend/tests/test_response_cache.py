@@ -0,0 +1,67 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.response_cache import ResponseCache, cached_response, response_cache
+
+
+def test_invalidate_only_drops_tagged_entries():
+    cache = ResponseCache()
+    calls = []
+
+    async def compute(name):
+        calls.append(name)
+        return {"name": name}
+
+    async def run():
+        await cache.get_or_compute("a", ["detections"], lambda: compute("a"))
+        await cache.get_or_compute("b", ["controls"], lambda: compute("b"))
+        await cache.invalidate("detections")
+        await cache.get_or_compute("a", ["detections"], lambda: compute("a"))
+        await cache.get_or_compute("b", ["controls"], lambda: compute("b"))
+
+    asyncio.run(run())
+    assert calls == ["a", "b", "a"]
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResponseCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return [1, 2, 3]
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute("k", ["t"], compute) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert len({etag for etag, _ in results}) == 1
+
+
+def test_route_etag_and_304():
+    app = FastAPI()
+    calls = []
+
+    @app.get("/counts")
+    @cached_response("test-counts")
+    async def counts(days: int = 7):
+        calls.append(days)
+        return {"days": days}
+
+    client = TestClient(app)
+    first = client.get("/counts?days=3")
+    assert first.json() == {"days": 3}
+    etag = first.headers["etag"]
+
+    again = client.get("/counts?days=3", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert client.get("/counts?days=5").json() == {"days": 5}
+    assert calls == [3, 5]
+
+    asyncio.run(response_cache.invalidate("test-counts"))
+    assert client.get("/counts?days=3", headers={"If-None-Match": etag}).status_code == 304
+    assert calls == [3, 5, 3]
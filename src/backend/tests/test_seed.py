@@ -0,0 +1,11 @@
+from db.seed_from_csv import normalize_ints
+
+
+def test_normalize_ints_converts_numeric_csv_columns():
+    intel = normalize_ints({"indicator": "10.0.0.1", "severity": "2"})
+    asset = normalize_ints({"name": "web-01", "criticality": "4", "severity": "high"})
+
+    assert intel == {"indicator": "10.0.0.1", "severity": 2}
+    # A seeded "2" no longer outranks an OTX 5 under BSON ordering
+    assert max(intel["severity"], 5) == 5
+    assert asset == {"name": "web-01", "criticality": 4, "severity": "high"}
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from openai import AsyncOpenAI
+
+from agents.DS_agent import _llm_score_batch, _parse_severities, keyword_severity, summary_key
+
+
+class _StubDeepSeek(BaseHTTPRequestHandler):
+    """Answers /chat/completions with one severity per numbered line in the prompt."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][-1]["content"]
+        count = sum(1 for line in prompt.splitlines() if line[:1].isdigit())
+        reply = {
+            "id": "stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": json.dumps([4] * count)},
+            }],
+        }
+        data = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_keyword_fallback_is_deterministic():
+    assert keyword_severity("New ransomware campaign") == 5
+    assert keyword_severity("Pulse mentions suspicious scanning") == 2
+    assert keyword_severity("Command and control beacon") == 4
+    assert keyword_severity("nothing interesting") == 1
+    # word boundaries: "rat" must not match inside "generated"
+    assert keyword_severity("auto generated report") == 1
+
+
+def test_summary_key_ignores_case_and_spacing():
+    assert summary_key("Emotet  Botnet") == summary_key("emotet botnet")
+
+
+def test_parse_severities():
+    assert _parse_severities("[3, 5, 9]", 3) == [3, 5, 5]
+    assert _parse_severities("1\n2", 2) == [1, 2]
+    assert _parse_severities("[3]", 2) is None
+
+
+def test_llm_batch_against_stub_server():
+    server = HTTPServer(("127.0.0.1", 0), _StubDeepSeek)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        llm = AsyncOpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}")
+        scores = asyncio.run(_llm_score_batch(["a", "b", "c"], llm=llm))
+    finally:
+        server.shutdown()
+    assert scores == [4, 4, 4]